@@ -0,0 +1,18 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import EventOutbox
+
+
+@admin.register(EventOutbox)
+class EventOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'created_at', 'attempts', 'next_attempt_at', 'parked_at']
+    list_filter = ['event_type', ('parked_at', admin.EmptyFieldListFilter)]
+    readonly_fields = [
+        'id', 'event_type', 'payload', 'created_at', 'attempts', 'last_error', 'next_attempt_at', 'parked_at',
+    ]  # 只读，投递后删除
+    actions = ['requeue']
+
+    @admin.action(description='重新投递所选事件')
+    def requeue(self, request, queryset):
+        count = queryset.update(attempts=0, next_attempt_at=timezone.now(), parked_at=None)
+        self.message_user(request, f'已重新排队 {count} 个事件')
@@ -0,0 +1,146 @@
+"""
+进程内领域事件总线（事务发件箱）
+
+处理器按阶段订阅，每次以同一类型的一批事件调用，可以集合式处理：
+- IN_TRANSACTION：发布时在调用方的事务中同步执行，处理器抛出异常会使整个事务回滚
+  （扣库存、日汇总等必须与业务数据一致的副作用）
+- AFTER_COMMIT：事件与业务数据在同一事务中写入发件箱 sys_event_outbox，提交后投递
+  （预警等不应阻塞业务的副作用）；处理器与删除发件箱记录在同一事务中，每个事件恰好被处理一次。
+  整批处理失败时逐个事件重新投递，失败的事件记录次数与错误并按指数退避推迟，不阻塞同批其他事件；
+  失败 MAX_DISPATCH_ATTEMPTS 次后搁置，修复后在管理后台重新投递
+
+投递方式由 settings.EVENT_DISPATCH 决定：on_commit 在发布事件的事务提交后立即投递本进程待处理的事件；
+relay 只写入发件箱，由 python manage.py dispatch_events 批量投递，批次越大处理器的集合式处理越划算。
+进程在提交后、投递前退出时，遗留的事件同样由 dispatch_events 投递。
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .domain import EVENT_TYPES
+from .models import EventOutbox
+
+logger = logging.getLogger('vending.events')
+
+IN_TRANSACTION = 'in_transaction'
+AFTER_COMMIT = 'after_commit'
+
+DISPATCH_BATCH_SIZE = 500
+# 单个事件失败达到该次数后搁置；第 n 次失败后推迟 RETRY_DELAY_SECONDS * 2^(n-1) 秒
+MAX_DISPATCH_ATTEMPTS = 5
+RETRY_DELAY_SECONDS = 30
+
+
+def _by_type(events):
+    batches = defaultdict(list)
+    for e in events:
+        batches[type(e)].append(e)
+    return batches
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers = {IN_TRANSACTION: defaultdict(list), AFTER_COMMIT: defaultdict(list)}
+
+    def subscribe(self, event_type, handler, phase=IN_TRANSACTION, when=None):
+        """订阅事件；when 为无参函数，返回假时跳过该处理器（如按配置启用的处理器）"""
+        self._handlers[phase][event_type].append((handler, when))
+
+    def _active(self, phase, event_type):
+        return [handler for handler, when in self._handlers[phase][event_type] if when is None or when()]
+
+    def publish(self, events):
+        """发布一批事件，须在写入业务数据的同一事务中调用"""
+        events = list(events)
+        if not events:
+            return
+        batches = _by_type(events)
+        # 已在事务中时不另建保存点，处理器失败时由调用方的事务回滚
+        with transaction.atomic(savepoint=False):
+            for event_type, batch in batches.items():
+                for handler in self._active(IN_TRANSACTION, event_type):
+                    handler(batch)
+            # 没有提交后处理器的事件不写入发件箱
+            outbox = [
+                EventOutbox(event_type=event_type.__name__, payload=e.to_payload())
+                for event_type, batch in batches.items() if self._active(AFTER_COMMIT, event_type)
+                for e in batch
+            ]
+            if outbox:
+                EventOutbox.objects.bulk_create(outbox)
+                if settings.EVENT_DISPATCH == 'on_commit':
+                    transaction.on_commit(_dispatch_after_commit)
+
+    def deliver(self, events):
+        """执行一批事件的提交后处理器"""
+        for event_type, batch in _by_type(events).items():
+            for handler in self._active(AFTER_COMMIT, event_type):
+                handler(batch)
+
+
+bus = EventBus()
+
+
+def _deliver_rows(rows):
+    """投递发件箱记录并删除，失败时由调用方的保存点回滚"""
+    with transaction.atomic():
+        bus.deliver([EVENT_TYPES[event_type].from_payload(payload) for _, event_type, payload, _ in rows])
+        EventOutbox.objects.filter(pk__in=[pk for pk, _, _, _ in rows]).delete()
+
+
+def _record_failure(pk, attempts, error):
+    """记录一次投递失败：推迟下次投递，达到次数上限时搁置"""
+    attempts += 1
+    now = timezone.now()
+    parked = attempts >= MAX_DISPATCH_ATTEMPTS
+    EventOutbox.objects.filter(pk=pk).update(
+        attempts=attempts,
+        last_error=f'{type(error).__name__}: {error}',
+        next_attempt_at=now + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** (attempts - 1)),
+        parked_at=now if parked else None,
+    )
+    if parked:
+        logger.error('事件 %s 已失败 %s 次，停止投递', pk, attempts)
+
+
+def dispatch_pending(batch_size=DISPATCH_BATCH_SIZE):
+    """
+    投递一批到期的发件箱事件，返回 (投递条数, 失败条数)；多个进程同时投递时跳过彼此锁定的记录
+    整批失败时逐个重新投递，失败的事件单独记录，不影响同批其他事件
+    """
+    with transaction.atomic():
+        rows = EventOutbox.objects.filter(
+            parked_at__isnull=True, next_attempt_at__lte=timezone.now(),
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            rows = rows.select_for_update(skip_locked=True)
+        rows = list(rows.values_list('id', 'event_type', 'payload', 'attempts')[:batch_size])
+        if not rows:
+            return 0, 0
+        if len(rows) > 1:
+            try:
+                _deliver_rows(rows)
+                return len(rows), 0
+            except Exception:
+                logger.exception('整批投递 %s 个事件失败，逐个重新投递', len(rows))
+
+        delivered = failed = 0
+        for row in rows:
+            try:
+                _deliver_rows([row])
+                delivered += 1
+            except Exception as e:
+                logger.exception('事件 %s 投递失败', row[0])
+                _record_failure(row[0], row[3], e)
+                failed += 1
+    return delivered, failed
+
+
+def _dispatch_after_commit():
+    # 业务事务已提交，投递失败不影响本次请求，事件留在发件箱中等待重试
+    try:
+        dispatch_pending()
+    except Exception:
+        logger.exception('事件投递失败，留待 dispatch_events 重试')
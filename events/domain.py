@@ -0,0 +1,103 @@
+"""
+领域事件
+
+事件只携带主键与发生时的值，处理器不需要回查业务表即可处理；
+需要写入发件箱的事件按字段类型序列化为 JSON（Decimal 为字符串，时间为 ISO 格式）。
+"""
+from dataclasses import dataclass, fields
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, get_type_hints
+
+EVENT_TYPES = {}
+
+
+def event(cls):
+    """注册事件类型，发件箱按类名还原事件"""
+    cls = dataclass(frozen=True)(cls)
+    EVENT_TYPES[cls.__name__] = cls
+    return cls
+
+
+class DomainEvent:
+    """领域事件基类"""
+
+    def to_payload(self):
+        payload = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, Decimal):
+                value = str(value)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            payload[f.name] = value
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload):
+        hints = get_type_hints(cls)
+        values = {}
+        for f in fields(cls):
+            value = payload.get(f.name)
+            kind = hints[f.name]
+            if value is not None and kind in (Decimal, Optional[Decimal]):
+                value = Decimal(value)
+            elif value is not None and kind in (datetime, Optional[datetime]):
+                value = datetime.fromisoformat(value)
+            values[f.name] = value
+        return cls(**values)
+
+
+@event
+class TransactionCreated(DomainEvent):
+    """交易已写入；transaction_id 在不返回主键的批量写入（MySQL）中为空"""
+    transaction_id: Optional[int]
+    user_id: int
+    machine_id: int
+    product_id: int
+    amount: Decimal
+    cost_price: Decimal
+    created_at: datetime
+
+    @classmethod
+    def of(cls, t):
+        return cls(t.pk, t.user_id, t.machine_id, t.product_id, t.amount, t.cost_price, t.created_at)
+
+
+@event
+class RestockCreated(DomainEvent):
+    """补货记录已写入"""
+    restock_id: Optional[int]
+    staff_id: int
+    machine_id: int
+    product_id: int
+    quantity: int
+    unit_cost: Decimal
+    created_at: datetime
+
+    @property
+    def total_cost(self):
+        return self.quantity * self.unit_cost
+
+    @classmethod
+    def of(cls, r):
+        return cls(r.pk, r.staff_id, r.machine_id, r.product_id, r.quantity, r.unit_cost, r.created_at)
+
+
+@event
+class StockChanged(DomainEvent):
+    """货道行库存 (current_stock) 变化；分片货道从分片售出时货道行不变，不产生本事件"""
+    inventory_id: int
+    machine_id: int
+    product_id: int
+    old_stock: int
+    new_stock: int
+
+
+@event
+class MachineStatusChanged(DomainEvent):
+    """机器状态变化"""
+    machine_id: int
+    machine_code: str
+    old_status: str
+    new_status: str
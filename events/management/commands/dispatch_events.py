@@ -0,0 +1,38 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from events.bus import DISPATCH_BATCH_SIZE, dispatch_pending
+
+logger = logging.getLogger('vending.events')
+
+
+class Command(BaseCommand):
+    help = '投递事件发件箱 (sys_event_outbox) 中的事件；EVENT_DISPATCH=relay 时以 --loop 常驻运行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DISPATCH_BATCH_SIZE,
+                            help=f'每个事务投递的事件数，默认 {DISPATCH_BATCH_SIZE}')
+        parser.add_argument('--loop', action='store_true', help='持续运行，发件箱为空时等待 --interval 秒')
+        parser.add_argument('--interval', type=float, default=1.0, help='轮询间隔（秒），默认 1')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['interval'] <= 0:
+            raise CommandError('--batch-size 与 --interval 必须大于 0')
+        total = failures = 0
+        while True:
+            try:
+                delivered, failed = dispatch_pending(options['batch_size'])
+            except Exception:
+                # 常驻时数据库断开等错误只记录日志，等待后重试
+                if not options['loop']:
+                    raise
+                logger.exception('投递事件失败，%s 秒后重试', options['interval'])
+                delivered = failed = 0
+            total += delivered
+            failures += failed
+            if delivered or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'已投递 {total} 个事件，失败 {failures} 次'))
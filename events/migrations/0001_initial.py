@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=50, verbose_name='事件类型')),
+                ('payload', models.JSONField(verbose_name='事件内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='写入时间')),
+            ],
+            options={
+                'verbose_name': '事件发件箱',
+                'verbose_name_plural': '事件发件箱',
+                'db_table': 'sys_event_outbox',
+            },
+        ),
+    ]
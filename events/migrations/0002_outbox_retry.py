@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='失败次数'),
+        ),
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='last_error',
+            field=models.TextField(blank=True, default='', verbose_name='最近错误'),
+        ),
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次投递时间'),
+        ),
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='parked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='搁置时间'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoutbox',
+            index=models.Index(fields=['parked_at', 'next_attempt_at'], name='idx_outbox_pending'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils import timezone
+
+
+class EventOutbox(models.Model):
+    """
+    事件发件箱 - 需要在提交后处理的领域事件与业务数据在同一事务中写入，
+    提交后投递给处理器，处理成功的事件在处理器的同一事务中删除（见 events/bus.py）；
+    投递失败的事件记录次数与错误并推迟重试，失败次数达到上限后搁置，不再自动投递
+    """
+    event_type = models.CharField('事件类型', max_length=50)
+    payload = models.JSONField('事件内容')
+    created_at = models.DateTimeField('写入时间', auto_now_add=True)
+    attempts = models.PositiveIntegerField('失败次数', default=0)
+    last_error = models.TextField('最近错误', blank=True, default='')
+    next_attempt_at = models.DateTimeField('下次投递时间', default=timezone.now)
+    parked_at = models.DateTimeField('搁置时间', null=True, blank=True)
+
+    class Meta:
+        db_table = 'sys_event_outbox'
+        verbose_name = '事件发件箱'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['parked_at', 'next_attempt_at'], name='idx_outbox_pending'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} - {self.event_type}'
@@ -0,0 +1,112 @@
+import io
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .bus import AFTER_COMMIT, MAX_DISPATCH_ATTEMPTS, EventBus, dispatch_pending
+from .domain import StockChanged, TransactionCreated
+from .models import EventOutbox
+
+
+class EventBusTests(TestCase):
+    """事件总线：事务内处理器随业务事务回滚，提交后处理器经发件箱投递，失败的事件单独重试、多次失败后搁置"""
+
+    def setUp(self):
+        # 使用独立的总线，不触发各应用注册的处理器
+        self.bus = EventBus()
+        patcher = patch('events.bus.bus', self.bus)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.delivered = []
+        self.bus.subscribe(StockChanged, self.delivered.extend, phase=AFTER_COMMIT)
+
+    def event(self, new_stock=3):
+        return StockChanged(1, 1, 1, 5, new_stock)
+
+    def test_payload_roundtrip(self):
+        event = TransactionCreated(
+            None, 1, 2, 3, Decimal('2.50'), Decimal('1.00'), datetime(2025, 1, 1, 8, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(TransactionCreated.from_payload(event.to_payload()), event)
+
+    def test_in_transaction_batch(self):
+        batches = []
+        self.bus.subscribe(TransactionCreated, batches.append)
+        events = [
+            TransactionCreated(i, 1, 1, 1, Decimal('2'), Decimal('1'), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+            for i in range(3)
+        ]
+        self.bus.publish(events + [self.event()])
+        self.assertEqual(batches, [events])
+        # 没有提交后处理器的事件不写入发件箱
+        self.assertEqual(EventOutbox.objects.count(), 1)
+
+    def test_on_commit_dispatch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bus.publish([self.event(), self.event(2)])
+        self.assertEqual(self.delivered, [self.event(), self.event(2)])
+        self.assertFalse(EventOutbox.objects.exists())
+
+    @override_settings(EVENT_DISPATCH='relay')
+    def test_relay(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.bus.publish([self.event()])
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.delivered, [])
+        call_command('dispatch_events', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.delivered, [self.event()])
+        self.assertFalse(EventOutbox.objects.exists())
+
+    def test_failed_dispatch_is_retried(self):
+        def fail(events):
+            raise RuntimeError('boom')
+
+        self.bus.subscribe(StockChanged, fail, phase=AFTER_COMMIT)
+        with self.assertLogs('vending.events', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            self.bus.publish([self.event()])
+        row = EventOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.last_error, 'RuntimeError: boom')
+        # 推迟到期前不再投递
+        self.assertEqual(dispatch_pending(), (0, 0))
+
+        self.bus._handlers[AFTER_COMMIT][StockChanged].pop()
+        self.delivered.clear()
+        EventOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_pending(), (1, 0))
+        self.assertEqual(self.delivered, [self.event()])
+
+    @override_settings(EVENT_DISPATCH='relay')
+    def test_failing_event_is_isolated_and_parked(self):
+        def fail_on_empty(events):
+            if any(e.new_stock == 0 for e in events):
+                raise RuntimeError('boom')
+
+        # 先于记录投递的处理器执行
+        self.bus._handlers[AFTER_COMMIT][StockChanged].insert(0, (fail_on_empty, None))
+        self.bus.publish([self.event(0), self.event(2), self.event(1)])
+        # 整批失败后逐个投递，同批其他事件不受影响
+        with self.assertLogs('vending.events', 'ERROR'):
+            self.assertEqual(dispatch_pending(), (2, 1))
+        self.assertEqual(self.delivered, [self.event(2), self.event(1)])
+
+        for attempt in range(2, MAX_DISPATCH_ATTEMPTS + 1):
+            EventOutbox.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('vending.events', 'ERROR'):
+                self.assertEqual(dispatch_pending(), (0, 1))
+        row = EventOutbox.objects.get()
+        self.assertEqual(row.attempts, MAX_DISPATCH_ATTEMPTS)
+        self.assertIsNotNone(row.parked_at)
+        EventOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_pending(), (0, 0))
+
+    def test_loop_survives_errors(self):
+        stop = RuntimeError('stop')
+        with patch('events.management.commands.dispatch_events.dispatch_pending', side_effect=[OSError('gone'), (0, 0)]), \
+                patch('events.management.commands.dispatch_events.time.sleep', side_effect=[None, stop]), \
+                self.assertLogs('vending.events', 'ERROR'):
+            with self.assertRaises(RuntimeError) as cm:
+                call_command('dispatch_events', loop=True, stdout=io.StringIO())
+        self.assertIs(cm.exception, stop)
@@ -7,9 +7,26 @@ const api = axios.create({
     },
 });
 
-// 响应拦截器，处理错误
+export interface Pagination {
+    count?: number;
+    next: string | null;
+    previous: string | null;
+}
+
+// 响应拦截器：列表接口已分页，将 results 解包为 data，分页信息挂在 response.pagination 上
 api.interceptors.response.use(
-    (response) => response,
+    (response) => {
+        const data = response.data;
+        if (data && Array.isArray(data.results) && 'next' in data) {
+            (response as any).pagination = {
+                count: data.count,
+                next: data.next,
+                previous: data.previous,
+            } as Pagination;
+            response.data = data.results;
+        }
+        return response;
+    },
     (error) => {
         console.error('API Error:', error);
         return Promise.reject(error);
@@ -20,6 +37,7 @@ export const endpoints = {
     machines: 'machines/',
     products: 'products/',
     inventories: 'inventories/',
+    inventoryHeatmap: 'inventories/heatmap/',
     transactions: 'transactions/',
     restocks: 'restocks/',
     suppliers: 'suppliers/',
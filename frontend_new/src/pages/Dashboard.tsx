@@ -26,42 +26,36 @@ const Dashboard: React.FC = () => {
     useEffect(() => {
         const fetchStats = async () => {
             try {
-                const [machinesRes, productsRes, usersRes, inventoriesRes, transactionsRes] = await Promise.all([
+                const [machinesRes, productsRes, usersRes, heatmapRes, transactionsRes] = await Promise.all([
                     api.get(endpoints.machines),
                     api.get(endpoints.products),
                     api.get(endpoints.users),
-                    api.get(endpoints.inventories),
-                    api.get(endpoints.transactions),
+                    api.get(`${endpoints.inventoryHeatmap}?cells=0`),
+                    api.get(`${endpoints.transactions}statistics/?period=today`),
                 ]);
 
                 const machines = machinesRes.data;
                 const products = productsRes.data;
                 const users = usersRes.data;
-                const inventories = inventoriesRes.data;
-                const transactions = transactionsRes.data;
+                const heatmap = heatmapRes.data;
+                const todayStats = transactionsRes.data;
 
                 // 计算活跃机器（状态为normal的）
                 const activeMachines = machines.filter((m: any) => m.status === 'normal').length;
 
-                // 计算今日营收
-                const today = new Date().toISOString().split('T')[0];
-                const todayTransactions = transactions.filter((t: any) =>
-                    t.created_at && t.created_at.startsWith(today)
-                );
-                const todayRevenue = todayTransactions.reduce((sum: number, t: any) =>
-                    sum + parseFloat(t.amount || 0), 0
-                );
+                // 今日营收由后端统计，交易列表已分页不再全量拉取
+                const todayRevenue = todayStats.total_revenue;
 
-                // 计算低库存警报（库存小于5的商品数量）
-                const lowStockCount = inventories.filter((inv: any) => inv.current_stock < 5).length;
+                // 库存预警（低于缺货阈值或已售罄的货道数）由后端按区域汇总，不再拉取全部库存
+                const lowStockCount = heatmap.totals.low + heatmap.totals.empty;
 
                 setStats({
-                    totalMachines: machines.length,
+                    totalMachines: (machinesRes as any).pagination?.count ?? machines.length,
                     activeMachines,
                     todayRevenue,
                     lowStockCount,
-                    totalProducts: products.length,
-                    totalUsers: users.length,
+                    totalProducts: (productsRes as any).pagination?.count ?? products.length,
+                    totalUsers: (usersRes as any).pagination?.count ?? users.length,
                 });
             } catch (error) {
                 console.error('Failed to fetch dashboard stats', error);
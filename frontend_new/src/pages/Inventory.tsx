@@ -21,12 +21,22 @@ interface Machine {
 interface Product {
     id: number;
     name: string;
+    low_stock_threshold: number;
+}
+
+// 库存热力图（/api/inventories/heatmap/）：填充率与缺货/售罄统计由后端按总库存计算
+interface Heatmap {
+    machines: { id: number[] };
+    products: { id: number[] };
+    cells: (number | null)[][];
+    totals: { slots: number; fill: number; low: number; empty: number };
 }
 
 const Inventory: React.FC = () => {
     const [inventory, setInventory] = useState<InventoryItem[]>([]);
     const [machines, setMachines] = useState<Machine[]>([]);
     const [products, setProducts] = useState<Product[]>([]);
+    const [heatmap, setHeatmap] = useState<Heatmap | null>(null);
     const [loading, setLoading] = useState(false);
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [form] = Form.useForm();
@@ -36,14 +46,16 @@ const Inventory: React.FC = () => {
     const fetchData = async () => {
         setLoading(true);
         try {
-            const [invRes, machRes, prodRes] = await Promise.all([
+            const [invRes, machRes, prodRes, heatmapRes] = await Promise.all([
                 api.get(endpoints.inventories),
                 api.get(endpoints.machines),
-                api.get(endpoints.products)
+                api.get(endpoints.products),
+                api.get(endpoints.inventoryHeatmap)
             ]);
             setInventory(invRes.data);
             setMachines(machRes.data);
             setProducts(prodRes.data);
+            setHeatmap(heatmapRes.data);
         } catch (error) {
             message.error('获取数据失败');
         } finally {
@@ -55,6 +67,24 @@ const Inventory: React.FC = () => {
         fetchData();
     }, []);
 
+    // (机器, 商品) → 填充率，取自热力图矩阵
+    const fillOf = useMemo(() => {
+        const fills = new Map<string, number>();
+        if (!heatmap) return fills;
+        heatmap.machines.id.forEach((machineId, i) => {
+            heatmap.products.id.forEach((productId, j) => {
+                const fill = heatmap.cells[i][j];
+                if (fill !== null) fills.set(`${machineId}-${productId}`, fill);
+            });
+        });
+        return fills;
+    }, [heatmap]);
+
+    const thresholdOf = useMemo(
+        () => new Map(products.map(p => [p.id, p.low_stock_threshold])),
+        [products]
+    );
+
     const filteredInventory = useMemo(() => {
         if (!searchText.trim()) return inventory;
         const lower = searchText.toLowerCase();
@@ -110,9 +140,9 @@ const Inventory: React.FC = () => {
             render: (text: number, record: InventoryItem) => (
                 <div style={{ width: 150 }}>
                     <Progress
-                        percent={Math.round((text / record.max_capacity) * 100)}
+                        percent={fillOf.get(`${record.machine}-${record.product}`) ?? 0}
                         size="small"
-                        status={text < 5 ? 'exception' : 'active'}
+                        status={text < (thresholdOf.get(record.product) ?? 5) ? 'exception' : 'active'}
                         format={() => `${text} / ${record.max_capacity}`}
                     />
                 </div>
@@ -133,7 +163,14 @@ const Inventory: React.FC = () => {
     return (
         <div>
             <div className="flex justify-between items-center mb-4">
-                <h1 className="text-2xl font-bold">库存管理</h1>
+                <Space size="large">
+                    <h1 className="text-2xl font-bold">库存管理</h1>
+                    {heatmap && (
+                        <span className="text-gray-500">
+                            {heatmap.totals.slots} 个货道 · 平均填充率 {heatmap.totals.fill}% · 缺货 {heatmap.totals.low} · 售罄 {heatmap.totals.empty}
+                        </span>
+                    )}
+                </Space>
                 <Space>
                     <Input
                         placeholder="搜索机器/商品"
@@ -70,9 +70,9 @@ const MobilePurchase: React.FC = () => {
 
     const fetchInventory = async (machineId: number) => {
         try {
-            const res = await api.get(endpoints.inventories);
-            const machineInventory = res.data.filter((item: any) => item.machine === machineId);
-            setInventory(machineInventory);
+            // 只取本机货道（GET /api/machines/{id}/inventory/）
+            const res = await api.get(`${endpoints.machines}${machineId}/inventory/`);
+            setInventory(res.data.items);
         } catch (error) {
             console.error("Failed to fetch inventory", error);
         }
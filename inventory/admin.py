@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import BizInventory, LogTransaction, LogRestock
+from .models import BizInventory, BizInventoryShard, LogTransaction, LogTransactionArchive, LogRestock
+
+
+class BizInventoryShardInline(admin.TabularInline):
+    model = BizInventoryShard
+    extra = 0
+    readonly_fields = ['shard_no', 'stock']  # 只读，由 shard_inventory 命令分配
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(BizInventory)
@@ -7,6 +17,7 @@ class BizInventoryAdmin(admin.ModelAdmin):
     list_display = ['id', 'machine', 'product', 'current_stock', 'max_capacity']
     search_fields = ['machine__machine_code', 'product__name']
     list_filter = ['machine']
+    inlines = [BizInventoryShardInline]
 
 
 @admin.register(LogTransaction)
@@ -17,9 +28,23 @@ class LogTransactionAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
 
 
+@admin.register(LogTransactionArchive)
+class LogTransactionArchiveAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user_id', 'machine_id', 'product_id', 'amount', 'created_at']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['id', 'user_id', 'machine_id', 'product_id', 'amount', 'cost_price', 'created_at']  # 只读，由归档命令迁入
+
+
 @admin.register(LogRestock)
 class LogRestockAdmin(admin.ModelAdmin):
-    list_display = ['id', 'staff', 'machine', 'product', 'quantity', 'created_at']
+    list_display = ['id', 'staff', 'machine', 'product', 'quantity', 'unit_cost', 'total_cost', 'created_at']
     search_fields = ['staff__name', 'machine__machine_code', 'product__name']
     list_filter = ['machine', 'staff', 'created_at']
     date_hierarchy = 'created_at'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_total_cost()
+
+    @admin.display(description='总成本', ordering='total_cost')
+    def total_cost(self, obj):
+        return obj.total_cost
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from . import handlers  # noqa: F401  注册库存事件处理器
+        from .services import register_sqlite_functions, skip_triggers_in_events_mode
+        connection_created.connect(register_sqlite_functions)
+        connection_created.connect(skip_triggers_in_events_mode)
@@ -0,0 +1,88 @@
+"""
+交易流水冷数据归档
+
+log_transaction 只保留最近几个月的热数据，更早的整月由 archive_month 迁入
+log_transaction_archive（MySQL 上按月分区、压缩存储）。
+归档前先按日志重算该月的商品日汇总与日结统计，统计接口只读汇总表，归档后不受影响；
+rebuild / generate_daily_stats 会同时读取热表与归档表，重算归档月份结果不变。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from monitor.rollup import rebuild
+from monitor.services import generate_daily_stats
+from .models import LogTransaction, LogTransactionArchive
+
+# 每批迁移的行数（一次 INSERT ... SELECT + 一次 DELETE）
+ARCHIVE_BATCH_SIZE = 5000
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'machine_id', 'product_id', 'amount', 'cost_price', 'created_at')
+
+
+def month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _ensure_partition(year, month, end_dt):
+    """MySQL: 从 p_max 拆出 pYYYYMM 分区；已有更晚的分区时该月数据自然落在其中，无需拆分"""
+    name = f'p{year:04d}{month:02d}'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME <> 'p_max'",
+            [LogTransactionArchive._meta.db_table],
+        )
+        existing = [row[0] for row in cursor.fetchall()]
+        if any(p >= name for p in existing):
+            return
+        # 分区边界为数据库中存储的 UTC 时间
+        boundary = end_dt.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(
+            f"ALTER TABLE {LogTransactionArchive._meta.db_table} REORGANIZE PARTITION p_max INTO ("
+            f"PARTITION {name} VALUES LESS THAN ('{boundary}'), "
+            f"PARTITION p_max VALUES LESS THAN (MAXVALUE))"
+        )
+
+
+def archive_month(year, month, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    将本地时间 year-month 的交易整月迁入归档表，返回迁移行数
+    可重复执行：中断后再次运行会继续迁移剩余的行
+    """
+    start_dt = month_start(year, month)
+    end_dt = month_start(*next_month(year, month))
+    first_day, last_day = start_dt.date(), (end_dt - timedelta(days=1)).date()
+
+    # 先以日志为准重算汇总，之后热表中该月的数据即可删除
+    rebuild(first_day, last_day)
+    generate_daily_stats(first_day, last_day)
+
+    if connection.vendor == 'mysql':
+        _ensure_partition(year, month, end_dt)
+
+    source = LogTransaction._meta.db_table
+    target = LogTransactionArchive._meta.db_table
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    pending = LogTransaction.objects.filter(
+        created_at__gte=start_dt, created_at__lt=end_dt
+    ).order_by('id').values_list('id', flat=True)
+
+    moved = 0
+    while True:
+        ids = list(pending[:batch_size])
+        if not ids:
+            return moved
+        placeholders = ', '.join(['%s'] * len(ids))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source} "
+                    f"WHERE id IN ({placeholders})",
+                    ids,
+                )
+            LogTransaction.objects.filter(id__in=ids).delete()
+        moved += len(ids)
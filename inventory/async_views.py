@@ -0,0 +1,158 @@
+"""
+机器端异步接口 (ASGI)
+
+贩卖机高频调用的三个接口：购买、本机库存、心跳。
+以原生 async 视图运行，等待数据库时不占用工作线程；数据库访问用异步 ORM，
+必须在事务中执行的购买仍复用同步的 purchase 服务（sync_to_async）。
+同时访问数据库的请求数由信号量（每个事件循环一个）限制为 MACHINE_API_DB_CONCURRENCY，
+避免大量机器同时轮询时每个请求各占一条数据库连接。
+
+路由（见 vending_system/urls.py）:
+    POST /api/machine-api/<machine_id>/purchase/   {"user": 1, "product": 2}
+    GET  /api/machine-api/<machine_id>/inventory/
+    POST /api/machine-api/<machine_id>/heartbeat/  {"status": "normal"}（status 可选）
+"""
+import asyncio
+import json
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from users.models import AppUser
+from resources.cache import get_cached, invalidate
+from resources.models import BizMachine, BizProduct
+from events.bus import bus
+from events.domain import MachineStatusChanged
+from .models import BizInventory
+from .services import purchase, PurchaseError
+
+# 信号量绑定首次使用它的事件循环，按事件循环分别创建（测试、多个事件循环时不能共用一个）
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def _db_slot():
+    """当前事件循环的数据库并发信号量"""
+    loop = asyncio.get_running_loop()
+    slots = _db_slots.get(loop)
+    if slots is None:
+        slots = _db_slots[loop] = asyncio.Semaphore(getattr(settings, 'MACHINE_API_DB_CONCURRENCY', 20))
+    return slots
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _is_id(value):
+    # bool 是 int 的子类，true / false 不能当作 ID
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@csrf_exempt
+@require_POST
+async def machine_purchase(request, machine_id):
+    """机器端购买，金额取商品当前售价"""
+    data = _body(request)
+    if data is None:
+        return _error("请求体必须为 JSON 对象")
+    if not _is_id(data.get('user')) or not _is_id(data.get('product')):
+        return _error("user 与 product 必须为 ID")
+
+    async with _db_slot():
+        try:
+            machine = await sync_to_async(get_cached)(BizMachine, machine_id)
+            product = await sync_to_async(get_cached)(BizProduct, data['product'])
+            user = await AppUser.objects.aget(pk=data['user'])
+        except (BizMachine.DoesNotExist, BizProduct.DoesNotExist, AppUser.DoesNotExist) as e:
+            return _error(str(e), status=404)
+        try:
+            instance = await sync_to_async(purchase)(user, machine, product, product.sell_price)
+        except PurchaseError as e:
+            return _error(str(e))
+
+    return JsonResponse({
+        "id": instance.id,
+        "product": product.id,
+        "amount": str(instance.amount),
+        "created_at": instance.created_at.isoformat(),
+    }, status=201)
+
+
+@require_GET
+async def machine_inventory(request, machine_id):
+    """本机全部货道的库存与售价"""
+    async with _db_slot():
+        rows = [
+            row async for row in
+            BizInventory.objects.with_total_stock().filter(machine_id=machine_id).order_by('product_id').values(
+                'product_id', 'product__name', 'product__sell_price', 'total_stock', 'max_capacity',
+            )
+        ]
+        if not rows and not await BizMachine.objects.filter(pk=machine_id).aexists():
+            return _error("Machine not found", status=404)
+
+    return JsonResponse({
+        "machine": machine_id,
+        "items": [{
+            "product": row['product_id'],
+            "product_name": row['product__name'],
+            "sell_price": str(row['product__sell_price']),
+            "current_stock": row['total_stock'],
+            "max_capacity": row['max_capacity'],
+        } for row in rows],
+    })
+
+
+def _report_status(machine_id, changes):
+    """锁定机器行写入心跳与状态，状态变化时发布 MachineStatusChanged；机器不存在时返回 False"""
+    with transaction.atomic():
+        row = BizMachine.objects.select_for_update().filter(pk=machine_id).values_list('machine_code', 'status').first()
+        if row is None:
+            return False
+        BizMachine.objects.filter(pk=machine_id).update(**changes)
+        machine_code, previous = row
+        if previous != changes['status']:
+            bus.publish([MachineStatusChanged(machine_id, machine_code, previous, changes['status'])])
+    return True
+
+
+@csrf_exempt
+@require_POST
+async def machine_heartbeat(request, machine_id):
+    """
+    心跳：记录最后在线时间，可同时上报状态
+    状态变为 fault 时由触发器 monitor_machine_fault（事件模式下由 MachineStatusChanged 的处理器）生成故障预警
+    """
+    data = _body(request)
+    if data is None:
+        return _error("请求体必须为 JSON 对象")
+    changes = {'last_heartbeat': timezone.now()}
+    status = data.get('status')
+    if status is not None:
+        if status not in dict(BizMachine.STATUS_CHOICES):
+            return _error("status 只能为 normal 或 fault")
+        changes['status'] = status
+
+    async with _db_slot():
+        if status is None:
+            updated = await BizMachine.objects.filter(pk=machine_id).aupdate(**changes)
+        else:
+            updated = await sync_to_async(_report_status)(machine_id, changes)
+    if not updated:
+        return _error("Machine not found", status=404)
+    # 心跳时间不计入参考数据缓存版本（机器接口不返回，见 /api/machines/heartbeats/），仅状态上报时失效缓存
+    if status is not None:
+        await sync_to_async(invalidate)(BizMachine, machine_id)
+    return JsonResponse({"machine": machine_id, "server_time": changes['last_heartbeat'].isoformat()})
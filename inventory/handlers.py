@@ -0,0 +1,113 @@
+"""
+库存事件处理器 - 事件模式 (INVENTORY_SIDE_EFFECTS=events) 下取代触发器 after_transaction_insert / after_restock_insert
+
+每批事件按货道汇总后一次加锁、一条分组 UPDATE，批量写入与重放不再逐行执行触发器；
+货道行库存的变化以 StockChanged 事件发布，缺货/售罄预警由其处理器产生（见 monitor/handlers.py）。
+分片货道与触发器一致：单件售出优先扣减按交易号选定的分片、再库存最多的分片，分片全部为空才扣池，
+此时不锁货道行；同一批中多件售出则先把分片并回池再整体扣减。
+"""
+from collections import Counter, defaultdict
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from events.bus import bus
+from events.domain import RestockCreated, StockChanged, TransactionCreated
+from .models import BizInventory, BizInventoryShard
+from .services import STOCK_ERROR_MESSAGE, PurchaseError, events_mode
+from .sharding import collapse
+
+
+def _lock_slots(keys):
+    """按主键顺序锁定 (机器, 商品) 对应的货道，返回 {(machine_id, product_id): (pk, current_stock, max_capacity)}"""
+    rows = (
+        BizInventory.objects.select_for_update()
+        .filter(machine_id__in={m for m, _ in keys}, product_id__in={p for _, p in keys}).order_by('pk')
+        .values_list('pk', 'machine_id', 'product_id', 'current_stock', 'max_capacity')
+    )
+    return {(m, p): (pk, stock, cap) for pk, m, p, stock, cap in rows if (m, p) in keys}
+
+
+def _shard_ids(keys):
+    """{(machine_id, product_id): [分片主键（按分片号）]}，只含分片货道"""
+    shards = defaultdict(list)
+    for pk, m, p in (
+        BizInventoryShard.objects
+        .filter(inventory__machine_id__in={m for m, _ in keys}, inventory__product_id__in={p for _, p in keys})
+        .order_by('inventory_id', 'shard_no').values_list('pk', 'inventory__machine_id', 'inventory__product_id')
+    ):
+        if (m, p) in keys:
+            shards[(m, p)].append(pk)
+    return shards
+
+
+def _take_from_shard(shard_ids, transaction_id):
+    """从分片扣减一件：先按交易号选定的分片，再库存最多的分片；分片全部为空时返回 False"""
+    home = shard_ids[(transaction_id or 0) % len(shard_ids)]
+    if BizInventoryShard.objects.filter(pk=home, stock__gt=0).update(stock=F('stock') - 1):
+        return True
+    fullest = (
+        BizInventoryShard.objects.filter(pk__in=shard_ids, stock__gt=0)
+        .order_by('-stock').values_list('pk', flat=True).first()
+    )
+    return fullest is not None and bool(
+        BizInventoryShard.objects.filter(pk=fullest, stock__gt=0).update(stock=F('stock') - 1)
+    )
+
+
+def _set_stock(slots, targets):
+    """分组写回货道行库存并发布 StockChanged；targets: {(machine_id, product_id): 新库存}"""
+    changed = {key: stock for key, stock in targets.items() if stock != slots[key][1]}
+    if not changed:
+        return
+    BizInventory.objects.filter(pk__in=[slots[key][0] for key in changed]).update(current_stock=Case(
+        *[When(pk=slots[key][0], then=Value(stock)) for key, stock in changed.items()],
+        output_field=IntegerField(),
+    ))
+    bus.publish([
+        StockChanged(slots[key][0], key[0], key[1], slots[key][1], stock) for key, stock in changed.items()
+    ])
+
+
+def on_transactions_created(events):
+    """交易扣库存；任一货道库存不足时抛出 PurchaseError，整批交易随事务回滚"""
+    counts = Counter((e.machine_id, e.product_id) for e in events)
+    shards = _shard_ids(set(counts))
+    pool = Counter()
+    for e in events:
+        key = (e.machine_id, e.product_id)
+        if key in shards and counts[key] == 1 and _take_from_shard(shards[key], e.transaction_id):
+            continue
+        pool[key] += 1
+    if not pool:
+        return
+
+    slots = _lock_slots(set(pool))
+    collapsing = [slots[key][0] for key in pool if key in slots and key in shards]
+    if collapsing:
+        collapse(collapsing)
+        # 并回池后重新读取池库存
+        slots = _lock_slots(set(pool))
+    for key, count in pool.items():
+        if key not in slots or slots[key][1] < count:
+            raise PurchaseError(STOCK_ERROR_MESSAGE)
+    _set_stock(slots, {key: slots[key][1] - count for key, count in pool.items()})
+
+
+def on_restocks_created(events):
+    """补货加库存，不超过 最大容量 - 分片库存"""
+    quantities = Counter()
+    for e in events:
+        quantities[(e.machine_id, e.product_id)] += e.quantity
+    slots = _lock_slots(set(quantities))
+    if not slots:
+        return
+    shard_stock = dict(
+        BizInventoryShard.objects.filter(inventory_id__in=[pk for pk, _, _ in slots.values()])
+        .values('inventory_id').annotate(total=Sum('stock')).values_list('inventory_id', 'total')
+    )
+    _set_stock(slots, {
+        key: min(stock + quantities[key], cap - shard_stock.get(pk, 0))
+        for key, (pk, stock, cap) in slots.items()
+    })
+
+
+bus.subscribe(TransactionCreated, on_transactions_created, when=events_mode)
+bus.subscribe(RestockCreated, on_restocks_created, when=events_mode)
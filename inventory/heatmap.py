@@ -0,0 +1,106 @@
+"""
+库存热力图
+
+机器 × 商品 的填充率矩阵按数组编码输出，不逐货道输出 JSON 对象：
+    machines / products 为按主键排序的行、列表头（列式数组）
+    cells[i][j] 为第 i 台机器第 j 种商品的填充率，总库存 / 最大容量 的百分比向下取整，没有该货道为 null
+区域汇总（货道数、库存、容量、缺货、售罄）由一条 GROUP BY 查询在数据库中计算。
+库存均为总库存（分片货道 = 池 + 分片，见 BizInventory.objects.with_total_stock()）；
+缺货为 0 < 总库存 < 商品缺货阈值，售罄为总库存为 0，与预警触发器的判定一致。
+"""
+from django.db.models import Count, F, Q, Sum
+from resources.models import BizMachine, BizProduct
+from .models import BizInventory
+
+# 读取货道时每批行数，矩阵逐批填充，不缓存整个查询集
+HEATMAP_CHUNK_SIZE = 5000
+
+
+def _slots(region=None):
+    slots = BizInventory.objects.with_total_stock()
+    if region:
+        slots = slots.filter(machine__region_code=region)
+    return slots
+
+
+def _fill(stock, capacity):
+    return min(100, max(0, stock) * 100 // capacity) if capacity > 0 else 0
+
+
+def region_summaries(region=None, machine_counts=None):
+    """按区域汇总货道，返回按区域编号排序的列表；machine_counts 为 {区域: 机器数}，没有货道的区域也列出"""
+    rows = (
+        _slots(region).values('machine__region_code').annotate(
+            slots=Count('pk'),
+            stock=Sum('total_stock'),
+            capacity=Sum('max_capacity'),
+            low=Count('pk', filter=Q(total_stock__gt=0, total_stock__lt=F('product__low_stock_threshold'))),
+            empty=Count('pk', filter=Q(total_stock__lte=0)),
+        ).order_by('machine__region_code')
+    )
+    machine_counts = machine_counts or {}
+    summaries = {region_code: {
+        'region_code': region_code, 'machines': count,
+        'slots': 0, 'stock': 0, 'capacity': 0, 'fill': 0, 'low': 0, 'empty': 0,
+    } for region_code, count in machine_counts.items()}
+    for row in rows:
+        region_code = row['machine__region_code']
+        stock, capacity = row['stock'] or 0, row['capacity'] or 0
+        summaries[region_code] = {
+            'region_code': region_code,
+            'machines': machine_counts.get(region_code, 0),
+            'slots': row['slots'],
+            'stock': stock,
+            'capacity': capacity,
+            'fill': _fill(stock, capacity),
+            'low': row['low'],
+            'empty': row['empty'],
+        }
+    return [summaries[key] for key in sorted(summaries)]
+
+
+def build_heatmap(region=None, with_cells=True):
+    """返回热力图数据：machines、products、cells、regions 与 totals；with_cells 为假时只返回汇总"""
+    machines = BizMachine.objects.order_by('pk')
+    if region:
+        machines = machines.filter(region_code=region)
+    machine_rows = list(machines.values_list('pk', 'machine_code', 'region_code'))
+    machine_counts = {}
+    for _, _, region_code in machine_rows:
+        machine_counts[region_code] = machine_counts.get(region_code, 0) + 1
+    regions = region_summaries(region, machine_counts)
+    totals = {key: sum(r[key] for r in regions) for key in ('slots', 'stock', 'capacity', 'low', 'empty')}
+    totals['machines'] = len(machine_rows)
+    totals['fill'] = _fill(totals['stock'], totals['capacity'])
+    if not with_cells:
+        return {'regions': regions, 'totals': totals}
+
+    product_rows = list(BizProduct.objects.order_by('pk').values_list('pk', 'name'))
+
+    row_of = {pk: i for i, (pk, _, _) in enumerate(machine_rows)}
+    column_of = {pk: j for j, (pk, _) in enumerate(product_rows)}
+    cells = [[None] * len(product_rows) for _ in machine_rows]
+    slots = (
+        _slots(region).order_by()
+        .values_list('machine_id', 'product_id', 'total_stock', 'max_capacity')
+        .iterator(chunk_size=HEATMAP_CHUNK_SIZE)
+    )
+    for machine_id, product_id, stock, capacity in slots:
+        # 读取表头之后新增的机器 / 商品不在矩阵中
+        if machine_id in row_of and product_id in column_of:
+            cells[row_of[machine_id]][column_of[product_id]] = _fill(stock, capacity)
+
+    return {
+        'machines': {
+            'id': [pk for pk, _, _ in machine_rows],
+            'machine_code': [code for _, code, _ in machine_rows],
+            'region_code': [region_code for _, _, region_code in machine_rows],
+        },
+        'products': {
+            'id': [pk for pk, _ in product_rows],
+            'name': [name for _, name in product_rows],
+        },
+        'cells': cells,
+        'regions': regions,
+        'totals': totals,
+    }
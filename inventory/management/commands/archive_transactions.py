@@ -0,0 +1,51 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from inventory.archive import archive_month, next_month, ARCHIVE_BATCH_SIZE
+from inventory.models import LogTransaction
+
+
+class Command(BaseCommand):
+    help = '将冷数据月份的交易流水迁入归档表 log_transaction_archive，热表只保留最近几个月'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=3,
+                            help='热表保留的整月数（不含本月），默认 3')
+        parser.add_argument('--before', help='归档该月份之前的所有整月 YYYY-MM，优先于 --keep-months')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='每批迁移的行数')
+        parser.add_argument('--dry-run', action='store_true', help='只列出将要归档的月份')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = datetime.strptime(options['before'], '%Y-%m')
+            except ValueError:
+                raise CommandError('月份格式错误，应为 YYYY-MM')
+            cutoff = (cutoff.year, cutoff.month)
+        else:
+            if options['keep_months'] < 0:
+                raise CommandError('--keep-months 不能为负数')
+            today = timezone.localdate()
+            index = today.year * 12 + today.month - 1 - options['keep_months']
+            cutoff = (index // 12, index % 12 + 1)
+
+        oldest = LogTransaction.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is None:
+            self.stdout.write('没有交易数据')
+            return
+        oldest = timezone.localtime(oldest)
+        month = (oldest.year, oldest.month)
+
+        total = 0
+        while month < cutoff:
+            label = f'{month[0]:04d}-{month[1]:02d}'
+            if options['dry_run']:
+                self.stdout.write(f'将归档 {label}')
+            else:
+                moved = archive_month(*month, batch_size=options['batch_size'])
+                total += moved
+                self.stdout.write(f'{label}: 归档 {moved} 条')
+            month = next_month(*month)
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'归档完成，共 {total} 条'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from inventory.sharding import DEFAULT_SHARDS, HOT_SLOT_DAYS, hot_slots, rebalance, shard
+
+
+class Command(BaseCommand):
+    help = '热点货道库存分片：指定货道或按近期销量挑选热点货道分片；不指定货道时重新分配全部分片货道的库存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slot', type=int, action='append', default=[], help='货道 ID，可重复')
+        parser.add_argument('--hot', type=int, default=0, help='另外选取近期销量最高的 N 个货道')
+        parser.add_argument('--days', type=int, default=HOT_SLOT_DAYS, help=f'统计销量的天数，默认 {HOT_SLOT_DAYS}')
+        parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS,
+                            help=f'每个货道的分片数，默认 {DEFAULT_SHARDS}；0 表示取消分片')
+
+    def handle(self, *args, **options):
+        if options['shards'] < 0 or options['hot'] < 0 or options['days'] <= 0:
+            raise CommandError('--shards、--hot 不能为负，--days 必须大于 0')
+        slots = set(options['slot'])
+        if options['hot']:
+            slots.update(hot_slots(options['hot'], options['days']))
+
+        if not slots and not options['hot']:
+            count = rebalance()
+            self.stdout.write(self.style.SUCCESS(f'已重新分配 {count} 个分片货道的库存'))
+            return
+        count = shard(slots, options['shards'])
+        if options['shards']:
+            self.stdout.write(self.style.SUCCESS(f'已将 {count} 个货道设为 {options["shards"]} 个分片'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'已取消 {count} 个货道的分片'))
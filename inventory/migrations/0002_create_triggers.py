@@ -1,4 +1,5 @@
 from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
 
 
 class Migration(migrations.Migration):
@@ -11,7 +12,8 @@ class Migration(migrations.Migration):
 
     operations = [
         # 库存更新后触发 - 缺货预警（库存低于5时）
-        migrations.RunSQL(
+        VendorRunSQL(
+            'mysql',
             sql="""
             CREATE TRIGGER monitor_low_stock
             AFTER UPDATE ON biz_inventory
@@ -29,7 +31,8 @@ class Migration(migrations.Migration):
         ),
 
         # 库存为0时触发紧急预警
-        migrations.RunSQL(
+        VendorRunSQL(
+            'mysql',
             sql="""
             CREATE TRIGGER monitor_empty_stock
             AFTER UPDATE ON biz_inventory
@@ -47,7 +50,8 @@ class Migration(migrations.Migration):
         ),
 
         # 机器状态变更触发故障预警
-        migrations.RunSQL(
+        VendorRunSQL(
+            'mysql',
             sql="""
             CREATE TRIGGER monitor_machine_fault
             AFTER UPDATE ON biz_machine
@@ -65,7 +69,8 @@ class Migration(migrations.Migration):
         ),
 
         # 交易记录插入后自动扣减库存
-        migrations.RunSQL(
+        VendorRunSQL(
+            'mysql',
             sql="""
             CREATE TRIGGER after_transaction_insert
             AFTER INSERT ON log_transaction
@@ -80,7 +85,8 @@ class Migration(migrations.Migration):
         ),
 
         # 补货记录插入后自动增加库存
-        migrations.RunSQL(
+        VendorRunSQL(
+            'mysql',
             sql="""
             CREATE TRIGGER after_restock_insert
             AFTER INSERT ON log_restock
@@ -0,0 +1,46 @@
+from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
+
+
+class Migration(migrations.Migration):
+    """交易扣库存触发器增加库存校验：条件扣减，库存不足时拒绝插入交易记录"""
+
+    dependencies = [
+        ('inventory', '0004_remove_logrestock_total_cost'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                """
+                CREATE TRIGGER after_transaction_insert
+                AFTER INSERT ON log_transaction
+                FOR EACH ROW
+                BEGIN
+                    UPDATE biz_inventory
+                    SET current_stock = current_stock - 1
+                    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+                      AND current_stock > 0;
+                    IF ROW_COUNT() = 0 THEN
+                        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Inventory not sufficient';
+                    END IF;
+                END;
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                """
+                CREATE TRIGGER after_transaction_insert
+                AFTER INSERT ON log_transaction
+                FOR EACH ROW
+                BEGIN
+                    UPDATE biz_inventory
+                    SET current_stock = current_stock - 1
+                    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+                END;
+                """,
+            ],
+        ),
+    ]
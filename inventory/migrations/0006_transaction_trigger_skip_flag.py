@@ -0,0 +1,55 @@
+from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
+
+
+class Migration(migrations.Migration):
+    """
+    交易扣库存触发器支持会话级跳过：
+    批量写入时设置 @skip_inventory_trigger = 1，由应用层汇总后一次性扣减库存
+    """
+
+    dependencies = [
+        ('inventory', '0005_guard_transaction_stock'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                """
+                CREATE TRIGGER after_transaction_insert
+                AFTER INSERT ON log_transaction
+                FOR EACH ROW
+                BEGIN
+                    IF @skip_inventory_trigger IS NULL THEN
+                        UPDATE biz_inventory
+                        SET current_stock = current_stock - 1
+                        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+                          AND current_stock > 0;
+                        IF ROW_COUNT() = 0 THEN
+                            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Inventory not sufficient';
+                        END IF;
+                    END IF;
+                END;
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                """
+                CREATE TRIGGER after_transaction_insert
+                AFTER INSERT ON log_transaction
+                FOR EACH ROW
+                BEGIN
+                    UPDATE biz_inventory
+                    SET current_stock = current_stock - 1
+                    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+                      AND current_stock > 0;
+                    IF ROW_COUNT() = 0 THEN
+                        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Inventory not sufficient';
+                    END IF;
+                END;
+                """,
+            ],
+        ),
+    ]
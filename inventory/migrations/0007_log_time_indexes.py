@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_transaction_trigger_skip_flag'),
+        ('resources', '0001_initial'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logrestock',
+            index=models.Index(fields=['created_at'], name='log_restock_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logrestock',
+            index=models.Index(fields=['machine', 'created_at'], name='log_restock_mach_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logrestock',
+            index=models.Index(fields=['product', 'created_at'], name='log_restock_prod_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logtransaction',
+            index=models.Index(fields=['created_at'], name='log_txn_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logtransaction',
+            index=models.Index(fields=['machine', 'created_at'], name='log_txn_machine_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logtransaction',
+            index=models.Index(fields=['product', 'created_at'], name='log_txn_product_created_idx'),
+        ),
+    ]
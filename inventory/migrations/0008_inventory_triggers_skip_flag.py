@@ -0,0 +1,81 @@
+from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
+
+
+RESTOCK_TRIGGER = """
+CREATE TRIGGER after_restock_insert
+AFTER INSERT ON log_restock
+FOR EACH ROW
+BEGIN
+    {guard_begin}
+    UPDATE biz_inventory
+    SET current_stock = LEAST(current_stock + NEW.quantity, max_capacity)
+    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+    {guard_end}
+END;
+"""
+
+LOW_STOCK_TRIGGER = """
+CREATE TRIGGER monitor_low_stock
+AFTER UPDATE ON biz_inventory
+FOR EACH ROW
+BEGIN
+    IF {guard}NEW.current_stock < 5 AND OLD.current_stock >= 5 THEN
+        INSERT INTO log_alert (machine_id, alert_type, message, created_at)
+        VALUES (NEW.machine_id, 'low_stock',
+                CONCAT('缺货预警: 商品ID ', NEW.product_id, ' 库存仅剩 ', NEW.current_stock),
+                NOW());
+    END IF;
+END;
+"""
+
+EMPTY_STOCK_TRIGGER = """
+CREATE TRIGGER monitor_empty_stock
+AFTER UPDATE ON biz_inventory
+FOR EACH ROW
+BEGIN
+    IF {guard}NEW.current_stock = 0 AND OLD.current_stock > 0 THEN
+        INSERT INTO log_alert (machine_id, alert_type, message, created_at)
+        VALUES (NEW.machine_id, 'low_stock',
+                CONCAT('紧急预警: 商品ID ', NEW.product_id, ' 已售罄!'),
+                NOW());
+    END IF;
+END;
+"""
+
+GUARD = '@skip_inventory_trigger IS NULL AND '
+
+
+class Migration(migrations.Migration):
+    """
+    补货加库存与缺货/售罄预警触发器也支持 @skip_inventory_trigger：
+    批量导入历史数据时跳过逐行触发，导入后由应用层统一对账
+    """
+
+    dependencies = [
+        ('inventory', '0007_log_time_indexes'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                RESTOCK_TRIGGER.format(
+                    guard_begin='IF @skip_inventory_trigger IS NULL THEN', guard_end='END IF;'
+                ),
+                "DROP TRIGGER IF EXISTS monitor_low_stock;",
+                LOW_STOCK_TRIGGER.format(guard=GUARD),
+                "DROP TRIGGER IF EXISTS monitor_empty_stock;",
+                EMPTY_STOCK_TRIGGER.format(guard=GUARD),
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                RESTOCK_TRIGGER.format(guard_begin='', guard_end=''),
+                "DROP TRIGGER IF EXISTS monitor_low_stock;",
+                LOW_STOCK_TRIGGER.format(guard=''),
+                "DROP TRIGGER IF EXISTS monitor_empty_stock;",
+                EMPTY_STOCK_TRIGGER.format(guard=''),
+            ],
+        ),
+    ]
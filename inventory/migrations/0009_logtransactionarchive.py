@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+def partition_archive(apps, schema_editor):
+    """
+    MySQL: 归档表按 created_at 月度 RANGE 分区并压缩存储。
+    分区表的唯一键必须包含分区列，故主键改为 (id, created_at)；
+    初始只有 p_max 一个分区，archive_transactions 归档新月份时再拆分出 pYYYYMM。
+    热表 log_transaction 带外键，MySQL 分区表不支持外键，因此不分区，只靠归档控制大小。
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE log_transaction_archive "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), ROW_FORMAT=COMPRESSED"
+    )
+    schema_editor.execute(
+        "ALTER TABLE log_transaction_archive "
+        "PARTITION BY RANGE COLUMNS (created_at) (PARTITION p_max VALUES LESS THAN (MAXVALUE))"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_inventory_triggers_skip_flag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogTransactionArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField(verbose_name='用户ID')),
+                ('machine_id', models.BigIntegerField(verbose_name='机器ID')),
+                ('product_id', models.BigIntegerField(verbose_name='商品ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='成交金额')),
+                ('cost_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='成本价')),
+                ('created_at', models.DateTimeField(verbose_name='交易时间')),
+            ],
+            options={
+                'verbose_name': '交易流水归档',
+                'verbose_name_plural': '交易流水归档',
+                'db_table': 'log_transaction_archive',
+                'indexes': [models.Index(fields=['created_at'], name='log_txn_arch_created_idx')],
+            },
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from vending_system.db.operations import VendorRunSQL
+
+
+# 所属机器的版本号加一，并写入 NEW.version（版本行不存在时创建）
+BUMP_VERSION = """
+    INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+    VALUES (NEW.machine_id, 1, 0)
+    ON DUPLICATE KEY UPDATE version = version + 1;
+    SELECT version INTO new_version FROM biz_inventory_version WHERE machine_id = NEW.machine_id;
+    SET NEW.version = new_version;
+"""
+
+# 货道被删除（或移到其他机器）时，原机器版本号加一并要求客户端全量同步
+RESET_VERSION = """
+    INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+    VALUES (OLD.machine_id, 1, 1)
+    ON DUPLICATE KEY UPDATE reset_version = version + 1, version = version + 1;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_logtransactionarchive'),
+        ('resources', '0002_bizmachine_last_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BizInventoryVersion',
+            fields=[
+                ('machine', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='inventory_version', serialize=False, to='resources.bizmachine', verbose_name='机器')),
+                ('version', models.BigIntegerField(default=0, verbose_name='版本号')),
+                ('reset_version', models.BigIntegerField(default=0, verbose_name='全量同步版本号')),
+            ],
+            options={
+                'verbose_name': '库存版本号',
+                'verbose_name_plural': '库存版本号',
+                'db_table': 'biz_inventory_version',
+            },
+        ),
+        migrations.AddField(
+            model_name='bizinventory',
+            name='version',
+            field=models.BigIntegerField(default=0, verbose_name='版本号'),
+        ),
+        migrations.AddIndex(
+            model_name='bizinventory',
+            index=models.Index(fields=['machine', 'version'], name='biz_inv_machine_version_idx'),
+        ),
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                # 已有货道按当前状态初始化为版本 1（须在创建触发器之前）
+                "UPDATE biz_inventory SET version = 1;",
+                """
+                INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+                SELECT DISTINCT machine_id, 1, 0 FROM biz_inventory;
+                """,
+                "DROP TRIGGER IF EXISTS before_inventory_insert;",
+                f"""
+                CREATE TRIGGER before_inventory_insert
+                BEFORE INSERT ON biz_inventory
+                FOR EACH ROW
+                BEGIN
+                    DECLARE new_version BIGINT;
+                    {BUMP_VERSION}
+                END;
+                """,
+                "DROP TRIGGER IF EXISTS before_inventory_update;",
+                f"""
+                CREATE TRIGGER before_inventory_update
+                BEFORE UPDATE ON biz_inventory
+                FOR EACH ROW
+                BEGIN
+                    DECLARE new_version BIGINT;
+                    IF NEW.current_stock <> OLD.current_stock
+                       OR NEW.max_capacity <> OLD.max_capacity
+                       OR NEW.product_id <> OLD.product_id
+                       OR NEW.machine_id <> OLD.machine_id THEN
+                        IF NEW.machine_id <> OLD.machine_id THEN
+                            {RESET_VERSION}
+                        END IF;
+                        {BUMP_VERSION}
+                    ELSE
+                        -- 版本号只由触发器维护，忽略应用写入的旧值
+                        SET NEW.version = OLD.version;
+                    END IF;
+                END;
+                """,
+                "DROP TRIGGER IF EXISTS after_inventory_delete;",
+                f"""
+                CREATE TRIGGER after_inventory_delete
+                AFTER DELETE ON biz_inventory
+                FOR EACH ROW
+                BEGIN
+                    {RESET_VERSION}
+                END;
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS before_inventory_insert;",
+                "DROP TRIGGER IF EXISTS before_inventory_update;",
+                "DROP TRIGGER IF EXISTS after_inventory_delete;",
+            ],
+        ),
+    ]
@@ -0,0 +1,318 @@
+from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
+
+# 与 MySQL 版本一致（见 monitor 0006）
+ALERT_COALESCE_MINUTES = 30
+
+
+# ---------------------------------------------------------------- SQLite
+# - 没有会话变量：跳过标志由连接上注册的函数 skip_inventory_trigger() 提供（见 inventory/services.py）
+# - 没有存储过程：record_alert 展开为 先累加窗口内最近一条、再在窗口内无记录时插入 两条语句
+# - BEFORE 触发器不能修改 NEW：版本号在 AFTER 触发器中回写；回写只改 version 列，
+#   不会再次触发按列声明的预警触发器（recursive_triggers 默认关闭，也不会触发自身）
+# - 时间与 Django 写入的格式一致（UTC 文本）
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+SQLITE_WINDOW = f"strftime('%Y-%m-%d %H:%M:%f', 'now', '-{ALERT_COALESCE_MINUTES} minutes')"
+SQLITE_NOT_SKIPPED = 'skip_inventory_trigger() IS NULL'
+
+
+def sqlite_record_alert(machine, product, alert_type, message):
+    match = f"""
+        machine_id = {machine} AND product_id IS {product} AND alert_type = '{alert_type}'
+        AND last_seen_at >= {SQLITE_WINDOW}
+    """
+    return f"""
+        UPDATE log_alert
+        SET occurrence_count = occurrence_count + 1, last_seen_at = {SQLITE_NOW}, message = {message}
+        WHERE id = (SELECT id FROM log_alert WHERE {match} ORDER BY last_seen_at DESC LIMIT 1);
+        INSERT INTO log_alert (machine_id, product_id, alert_type, message, occurrence_count, created_at, last_seen_at)
+        SELECT {machine}, {product}, '{alert_type}', {message}, 1, {SQLITE_NOW}, {SQLITE_NOW}
+        WHERE NOT EXISTS (SELECT 1 FROM log_alert WHERE {match});
+    """
+
+
+SQLITE_INVENTORY_CHANGED = """
+    (NEW.current_stock <> OLD.current_stock OR NEW.max_capacity <> OLD.max_capacity
+     OR NEW.product_id <> OLD.product_id OR NEW.machine_id <> OLD.machine_id)
+"""
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER after_transaction_insert
+    AFTER INSERT ON log_transaction
+    FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED}
+    BEGIN
+        SELECT RAISE(ABORT, 'Inventory not sufficient')
+        WHERE NOT EXISTS (
+            SELECT 1 FROM biz_inventory
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id AND current_stock > 0
+        );
+        UPDATE biz_inventory
+        SET current_stock = current_stock - 1
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER after_restock_insert
+    AFTER INSERT ON log_restock
+    FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED}
+    BEGIN
+        UPDATE biz_inventory
+        SET current_stock = MIN(current_stock + NEW.quantity, max_capacity)
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER monitor_low_stock
+    AFTER UPDATE OF current_stock ON biz_inventory
+    FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED}
+        AND NEW.current_stock < OLD.current_stock
+        AND NEW.current_stock < (SELECT low_stock_threshold FROM biz_product WHERE id = NEW.product_id)
+        AND OLD.current_stock >= (SELECT low_stock_threshold FROM biz_product WHERE id = NEW.product_id)
+    BEGIN
+        {sqlite_record_alert('NEW.machine_id', 'NEW.product_id', 'low_stock',
+                             "'缺货预警: 商品ID ' || NEW.product_id || ' 库存仅剩 ' || NEW.current_stock")}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER monitor_empty_stock
+    AFTER UPDATE OF current_stock ON biz_inventory
+    FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED} AND NEW.current_stock = 0 AND OLD.current_stock > 0
+    BEGIN
+        {sqlite_record_alert('NEW.machine_id', 'NEW.product_id', 'low_stock',
+                             "'紧急预警: 商品ID ' || NEW.product_id || ' 已售罄!'")}
+    END;
+    """,
+    f"""
+    CREATE TRIGGER monitor_machine_fault
+    AFTER UPDATE OF status ON biz_machine
+    FOR EACH ROW WHEN NEW.status = 'fault' AND OLD.status = 'normal'
+    BEGIN
+        {sqlite_record_alert('NEW.id', 'NULL', 'fault',
+                             "'故障预警: 机器 ' || NEW.machine_code || ' 发生故障'")}
+    END;
+    """,
+    """
+    CREATE TRIGGER after_inventory_insert
+    AFTER INSERT ON biz_inventory
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        VALUES (NEW.machine_id, 1, 0)
+        ON CONFLICT (machine_id) DO UPDATE SET version = version + 1;
+        UPDATE biz_inventory
+        SET version = (SELECT version FROM biz_inventory_version WHERE machine_id = NEW.machine_id)
+        WHERE id = NEW.id;
+    END;
+    """,
+    f"""
+    CREATE TRIGGER after_inventory_update
+    AFTER UPDATE ON biz_inventory
+    FOR EACH ROW WHEN {SQLITE_INVENTORY_CHANGED} OR NEW.version <> OLD.version
+    BEGIN
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        SELECT OLD.machine_id, 1, 1 WHERE NEW.machine_id <> OLD.machine_id
+        ON CONFLICT (machine_id) DO UPDATE SET reset_version = version + 1, version = version + 1;
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        SELECT NEW.machine_id, 1, 0 WHERE {SQLITE_INVENTORY_CHANGED}
+        ON CONFLICT (machine_id) DO UPDATE SET version = version + 1;
+        -- 版本号只由触发器维护，忽略应用写入的旧值
+        UPDATE biz_inventory
+        SET version = CASE WHEN {SQLITE_INVENTORY_CHANGED}
+            THEN (SELECT version FROM biz_inventory_version WHERE machine_id = NEW.machine_id)
+            ELSE OLD.version END
+        WHERE id = NEW.id;
+    END;
+    """,
+    """
+    CREATE TRIGGER after_inventory_delete
+    AFTER DELETE ON biz_inventory
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        VALUES (OLD.machine_id, 1, 1)
+        ON CONFLICT (machine_id) DO UPDATE SET reset_version = version + 1, version = version + 1;
+    END;
+    """,
+]
+
+SQLITE_TRIGGER_NAMES = [
+    'after_transaction_insert', 'after_restock_insert', 'monitor_low_stock', 'monitor_empty_stock',
+    'monitor_machine_fault', 'after_inventory_insert', 'after_inventory_update', 'after_inventory_delete',
+]
+
+
+# ---------------------------------------------------------------- PostgreSQL
+# - 跳过标志为自定义配置项 vending.skip_inventory_trigger（set_config，见 inventory/services.py）
+# - record_alert 为 PL/pgSQL 函数，各触发器函数命名为 trg_<触发器名>
+
+PG_NOT_SKIPPED = "COALESCE(current_setting('vending.skip_inventory_trigger', true), '') = ''"
+
+PG_BUMP_VERSION = """
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        VALUES (NEW.machine_id, 1, 0)
+        ON CONFLICT (machine_id) DO UPDATE SET version = biz_inventory_version.version + 1
+        RETURNING version INTO NEW.version;
+"""
+
+PG_RESET_VERSION = """
+        INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+        VALUES (OLD.machine_id, 1, 1)
+        ON CONFLICT (machine_id) DO UPDATE
+        SET reset_version = biz_inventory_version.version + 1, version = biz_inventory_version.version + 1;
+"""
+
+
+def pg_trigger(name, timing, table, body, declare=''):
+    """触发器函数 + 触发器"""
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION trg_{name}() RETURNS trigger AS $$
+        {declare}
+        BEGIN
+        {body}
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"DROP TRIGGER IF EXISTS {name} ON {table};",
+        f"CREATE TRIGGER {name} {timing} ON {table} FOR EACH ROW EXECUTE FUNCTION trg_{name}();",
+    ]
+
+
+PG_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION record_alert(
+        p_machine BIGINT, p_product BIGINT, p_type VARCHAR, p_message VARCHAR
+    ) RETURNS void AS $$
+    BEGIN
+        UPDATE log_alert
+        SET occurrence_count = occurrence_count + 1, last_seen_at = NOW(), message = p_message
+        WHERE id = (
+            SELECT id FROM log_alert
+            WHERE machine_id = p_machine AND product_id IS NOT DISTINCT FROM p_product AND alert_type = p_type
+              AND last_seen_at >= NOW() - INTERVAL '{ALERT_COALESCE_MINUTES} minutes'
+            ORDER BY last_seen_at DESC
+            LIMIT 1
+        );
+        IF NOT FOUND THEN
+            INSERT INTO log_alert (machine_id, product_id, alert_type, message, occurrence_count, created_at, last_seen_at)
+            VALUES (p_machine, p_product, p_type, p_message, 1, NOW(), NOW());
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    *pg_trigger('after_transaction_insert', 'AFTER INSERT', 'log_transaction', f"""
+        IF {PG_NOT_SKIPPED} THEN
+            UPDATE biz_inventory
+            SET current_stock = current_stock - 1
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id AND current_stock > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Inventory not sufficient';
+            END IF;
+        END IF;
+        RETURN NULL;
+    """),
+    *pg_trigger('after_restock_insert', 'AFTER INSERT', 'log_restock', f"""
+        IF {PG_NOT_SKIPPED} THEN
+            UPDATE biz_inventory
+            SET current_stock = LEAST(current_stock + NEW.quantity, max_capacity)
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+        END IF;
+        RETURN NULL;
+    """),
+    *pg_trigger('monitor_low_stock', 'AFTER UPDATE', 'biz_inventory', f"""
+        IF {PG_NOT_SKIPPED} AND NEW.current_stock < OLD.current_stock THEN
+            SELECT low_stock_threshold INTO threshold FROM biz_product WHERE id = NEW.product_id;
+            IF NEW.current_stock < threshold AND OLD.current_stock >= threshold THEN
+                PERFORM record_alert(NEW.machine_id, NEW.product_id, 'low_stock',
+                    '缺货预警: 商品ID ' || NEW.product_id || ' 库存仅剩 ' || NEW.current_stock);
+            END IF;
+        END IF;
+        RETURN NULL;
+    """, declare='DECLARE threshold INT;'),
+    *pg_trigger('monitor_empty_stock', 'AFTER UPDATE', 'biz_inventory', f"""
+        IF {PG_NOT_SKIPPED} AND NEW.current_stock = 0 AND OLD.current_stock > 0 THEN
+            PERFORM record_alert(NEW.machine_id, NEW.product_id, 'low_stock',
+                '紧急预警: 商品ID ' || NEW.product_id || ' 已售罄!');
+        END IF;
+        RETURN NULL;
+    """),
+    *pg_trigger('monitor_machine_fault', 'AFTER UPDATE', 'biz_machine', """
+        IF NEW.status = 'fault' AND OLD.status = 'normal' THEN
+            PERFORM record_alert(NEW.id, NULL, 'fault', '故障预警: 机器 ' || NEW.machine_code || ' 发生故障');
+        END IF;
+        RETURN NULL;
+    """),
+    *pg_trigger('before_inventory_insert', 'BEFORE INSERT', 'biz_inventory', f"""
+        {PG_BUMP_VERSION}
+        RETURN NEW;
+    """),
+    *pg_trigger('before_inventory_update', 'BEFORE UPDATE', 'biz_inventory', f"""
+        IF NEW.current_stock <> OLD.current_stock
+           OR NEW.max_capacity <> OLD.max_capacity
+           OR NEW.product_id <> OLD.product_id
+           OR NEW.machine_id <> OLD.machine_id THEN
+            IF NEW.machine_id <> OLD.machine_id THEN
+                {PG_RESET_VERSION}
+            END IF;
+            {PG_BUMP_VERSION}
+        ELSE
+            -- 版本号只由触发器维护，忽略应用写入的旧值
+            NEW.version := OLD.version;
+        END IF;
+        RETURN NEW;
+    """),
+    *pg_trigger('after_inventory_delete', 'AFTER DELETE', 'biz_inventory', f"""
+        {PG_RESET_VERSION}
+        RETURN NULL;
+    """),
+]
+
+PG_TRIGGER_TABLES = [
+    ('after_transaction_insert', 'log_transaction'), ('after_restock_insert', 'log_restock'),
+    ('monitor_low_stock', 'biz_inventory'), ('monitor_empty_stock', 'biz_inventory'),
+    ('monitor_machine_fault', 'biz_machine'), ('before_inventory_insert', 'biz_inventory'),
+    ('before_inventory_update', 'biz_inventory'), ('after_inventory_delete', 'biz_inventory'),
+]
+
+# 已有货道按当前状态初始化为版本 1（须在创建触发器之前，同 0010）
+INIT_VERSIONS = [
+    "UPDATE biz_inventory SET version = 1;",
+    """
+    INSERT INTO biz_inventory_version (machine_id, version, reset_version)
+    SELECT DISTINCT machine_id, 1, 0 FROM biz_inventory;
+    """,
+]
+
+
+class Migration(migrations.Migration):
+    """
+    SQLite / PostgreSQL 版本的触发器，与 MySQL 版本（0006、0008、0010 与 monitor 0006）行为一致：
+    交易扣库存（库存不足时报错）、补货加库存、缺货/售罄/故障预警（按窗口合并）、库存版本号，
+    以及批量导入时的跳过标志。MySQL 上本迁移不执行任何操作。
+
+    注意：SQLite 上 Django 修改表结构时会重建表，表上的触发器随之删除，
+    之后修改 biz_inventory / log_transaction / log_restock / biz_machine 的迁移需重新创建对应触发器。
+    """
+
+    dependencies = [
+        ('inventory', '0010_inventory_version'),
+        ('monitor', '0006_alert_coalescing'),
+        ('resources', '0003_bizproduct_low_stock_threshold'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'sqlite',
+            sql=INIT_VERSIONS + SQLITE_TRIGGERS,
+            reverse_sql=[f"DROP TRIGGER IF EXISTS {name};" for name in SQLITE_TRIGGER_NAMES],
+        ),
+        VendorRunSQL(
+            'postgresql',
+            sql=INIT_VERSIONS + PG_TRIGGERS,
+            reverse_sql=[f"DROP TRIGGER IF EXISTS {name} ON {table};" for name, table in PG_TRIGGER_TABLES]
+            + [f"DROP FUNCTION IF EXISTS trg_{name}();" for name, _ in PG_TRIGGER_TABLES]
+            + ["DROP FUNCTION IF EXISTS record_alert(BIGINT, BIGINT, VARCHAR, VARCHAR);"],
+        ),
+    ]
@@ -0,0 +1,250 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:00
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from vending_system.db.operations import VendorRunSQL
+
+# 回滚时恢复上一版触发器定义
+_restock = importlib.import_module('inventory.migrations.0008_inventory_triggers_skip_flag')
+_portable = importlib.import_module('inventory.migrations.0011_portable_triggers')
+
+
+def _previous(statements, marker):
+    return [sql for sql in statements if marker in sql]
+
+
+# 分片货道的总库存上限：补货只补到 容量 - 分片库存
+SHARD_STOCK = """(
+    SELECT COALESCE(SUM(stock), 0) FROM biz_inventory_shard WHERE inventory_id = biz_inventory.id
+)"""
+
+# ---------------------------------------------------------------- MySQL
+# 先扣本笔交易对应的分片（交易号 mod 分片数），为空时取库存最多的分片；
+# 分片全部为空（或货道未分片）时才扣减货道行，库存不足时报错
+MYSQL_TRANSACTION_TRIGGER = """
+CREATE TRIGGER after_transaction_insert
+AFTER INSERT ON log_transaction
+FOR EACH ROW
+BEGIN
+    DECLARE inv_id BIGINT;
+    DECLARE shards INT DEFAULT 0;
+    DECLARE taken INT DEFAULT 0;
+    IF @skip_inventory_trigger IS NULL THEN
+        SELECT id INTO inv_id FROM biz_inventory
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+        SELECT COUNT(*) INTO shards FROM biz_inventory_shard WHERE inventory_id = inv_id;
+        IF shards > 0 THEN
+            UPDATE biz_inventory_shard SET stock = stock - 1
+            WHERE inventory_id = inv_id AND shard_no = NEW.id MOD shards AND stock > 0;
+            SET taken = ROW_COUNT();
+            IF taken = 0 THEN
+                UPDATE biz_inventory_shard SET stock = stock - 1
+                WHERE inventory_id = inv_id AND stock > 0
+                ORDER BY stock DESC
+                LIMIT 1;
+                SET taken = ROW_COUNT();
+            END IF;
+        END IF;
+        IF taken = 0 THEN
+            UPDATE biz_inventory
+            SET current_stock = current_stock - 1
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+              AND current_stock > 0;
+            IF ROW_COUNT() = 0 THEN
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Inventory not sufficient';
+            END IF;
+        END IF;
+    END IF;
+END;
+"""
+
+MYSQL_PREVIOUS_TRANSACTION_TRIGGER = """
+CREATE TRIGGER after_transaction_insert
+AFTER INSERT ON log_transaction
+FOR EACH ROW
+BEGIN
+    IF @skip_inventory_trigger IS NULL THEN
+        UPDATE biz_inventory
+        SET current_stock = current_stock - 1
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+          AND current_stock > 0;
+        IF ROW_COUNT() = 0 THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Inventory not sufficient';
+        END IF;
+    END IF;
+END;
+"""
+
+MYSQL_RESTOCK_TRIGGER = f"""
+CREATE TRIGGER after_restock_insert
+AFTER INSERT ON log_restock
+FOR EACH ROW
+BEGIN
+    IF @skip_inventory_trigger IS NULL THEN
+        UPDATE biz_inventory
+        SET current_stock = LEAST(current_stock + NEW.quantity, max_capacity - {SHARD_STOCK})
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+    END IF;
+END;
+"""
+
+# ---------------------------------------------------------------- SQLite
+# 没有变量与 ROW_COUNT()：先判断总库存，分片全部为空时扣货道行，否则扣一个分片（两者只会执行其一）
+SQLITE_NOT_SKIPPED = _portable.SQLITE_NOT_SKIPPED
+
+SQLITE_SLOT_SHARDS = """
+    SELECT s.id FROM biz_inventory_shard s JOIN biz_inventory i ON i.id = s.inventory_id
+    WHERE i.machine_id = NEW.machine_id AND i.product_id = NEW.product_id AND s.stock > 0
+"""
+
+SQLITE_TRANSACTION_TRIGGER = f"""
+CREATE TRIGGER after_transaction_insert
+AFTER INSERT ON log_transaction
+FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED}
+BEGIN
+    SELECT RAISE(ABORT, 'Inventory not sufficient')
+    WHERE NOT EXISTS (
+        SELECT 1 FROM biz_inventory
+        WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id AND current_stock > 0
+    ) AND NOT EXISTS ({SQLITE_SLOT_SHARDS});
+    UPDATE biz_inventory
+    SET current_stock = current_stock - 1
+    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id
+      AND NOT EXISTS (SELECT 1 FROM biz_inventory_shard WHERE inventory_id = biz_inventory.id AND stock > 0);
+    UPDATE biz_inventory_shard
+    SET stock = stock - 1
+    WHERE id = (
+        {SQLITE_SLOT_SHARDS}
+        ORDER BY s.shard_no = NEW.id % (SELECT COUNT(*) FROM biz_inventory_shard WHERE inventory_id = i.id) DESC,
+                 s.stock DESC
+        LIMIT 1
+    );
+END;
+"""
+
+SQLITE_RESTOCK_TRIGGER = f"""
+CREATE TRIGGER after_restock_insert
+AFTER INSERT ON log_restock
+FOR EACH ROW WHEN {SQLITE_NOT_SKIPPED}
+BEGIN
+    UPDATE biz_inventory
+    SET current_stock = MIN(current_stock + NEW.quantity, max_capacity - {SHARD_STOCK})
+    WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+END;
+"""
+
+# ---------------------------------------------------------------- PostgreSQL
+PG_NOT_SKIPPED = _portable.PG_NOT_SKIPPED
+
+PG_TRIGGERS = [
+    *_portable.pg_trigger('after_transaction_insert', 'AFTER INSERT', 'log_transaction', f"""
+        IF {PG_NOT_SKIPPED} THEN
+            SELECT id INTO inv_id FROM biz_inventory
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+            SELECT COUNT(*) INTO shards FROM biz_inventory_shard WHERE inventory_id = inv_id;
+            IF shards > 0 THEN
+                UPDATE biz_inventory_shard SET stock = stock - 1
+                WHERE inventory_id = inv_id AND shard_no = NEW.id % shards AND stock > 0;
+                IF NOT FOUND THEN
+                    UPDATE biz_inventory_shard SET stock = stock - 1
+                    WHERE id = (
+                        SELECT id FROM biz_inventory_shard
+                        WHERE inventory_id = inv_id AND stock > 0
+                        ORDER BY stock DESC
+                        LIMIT 1
+                        FOR UPDATE
+                    ) AND stock > 0;
+                END IF;
+                IF FOUND THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            UPDATE biz_inventory
+            SET current_stock = current_stock - 1
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id AND current_stock > 0;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Inventory not sufficient';
+            END IF;
+        END IF;
+        RETURN NULL;
+    """, declare='DECLARE inv_id BIGINT; shards INT;'),
+    *_portable.pg_trigger('after_restock_insert', 'AFTER INSERT', 'log_restock', f"""
+        IF {PG_NOT_SKIPPED} THEN
+            UPDATE biz_inventory
+            SET current_stock = LEAST(current_stock + NEW.quantity, max_capacity - {SHARD_STOCK})
+            WHERE machine_id = NEW.machine_id AND product_id = NEW.product_id;
+        END IF;
+        RETURN NULL;
+    """),
+]
+
+
+class Migration(migrations.Migration):
+    """
+    热点货道库存分片 (biz_inventory_shard)：交易扣库存触发器优先扣减分片，
+    补货触发器按 容量 - 分片库存 封顶。未分片的货道行为不变。
+    """
+
+    dependencies = [
+        ('inventory', '0011_portable_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BizInventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard_no', models.PositiveSmallIntegerField(verbose_name='分片号')),
+                ('stock', models.IntegerField(default=0, verbose_name='分片库存')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='inventory.bizinventory', verbose_name='货道')),
+            ],
+            options={
+                'verbose_name': '库存分片',
+                'verbose_name_plural': '库存分片',
+                'db_table': 'biz_inventory_shard',
+                'unique_together': {('inventory', 'shard_no')},
+            },
+        ),
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                MYSQL_TRANSACTION_TRIGGER,
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                MYSQL_RESTOCK_TRIGGER,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                MYSQL_PREVIOUS_TRANSACTION_TRIGGER,
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                _restock.RESTOCK_TRIGGER.format(
+                    guard_begin='IF @skip_inventory_trigger IS NULL THEN', guard_end='END IF;'
+                ),
+            ],
+        ),
+        VendorRunSQL(
+            'sqlite',
+            sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                SQLITE_TRANSACTION_TRIGGER,
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                SQLITE_RESTOCK_TRIGGER,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS after_transaction_insert;",
+                *_previous(_portable.SQLITE_TRIGGERS, 'CREATE TRIGGER after_transaction_insert'),
+                "DROP TRIGGER IF EXISTS after_restock_insert;",
+                *_previous(_portable.SQLITE_TRIGGERS, 'CREATE TRIGGER after_restock_insert'),
+            ],
+        ),
+        VendorRunSQL(
+            'postgresql',
+            sql=PG_TRIGGERS,
+            reverse_sql=[
+                *_previous(_portable.PG_TRIGGERS, 'CREATE OR REPLACE FUNCTION trg_after_transaction_insert()'),
+                *_previous(_portable.PG_TRIGGERS, 'CREATE OR REPLACE FUNCTION trg_after_restock_insert()'),
+            ],
+        ),
+    ]
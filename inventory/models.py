@@ -1,8 +1,23 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from resources.models import BizMachine, BizProduct
 from users.models import AppUser, SysStaff
 
 
+class BizInventoryQuerySet(models.QuerySet):
+    """货道查询集：分片货道的库存 = 池 (current_stock) + 各分片库存"""
+
+    def with_total_stock(self):
+        """为每个货道注解 total_stock"""
+        shard_stock = (
+            BizInventoryShard.objects.filter(inventory=models.OuterRef('pk'))
+            .order_by().values('inventory').annotate(total=models.Sum('stock')).values('total')
+        )
+        return self.annotate(
+            total_stock=models.F('current_stock') + Coalesce(models.Subquery(shard_stock), 0)
+        )
+
+
 class BizInventory(models.Model):
     """库存表 - 核心表，触发器监控对象"""
     machine = models.ForeignKey(
@@ -17,19 +32,81 @@ class BizInventory(models.Model):
         verbose_name='商品',
         related_name='inventories'
     )
+    # 分片货道上为尚未分配到分片的库存，总库存见 with_total_stock()（见 BizInventoryShard）
     current_stock = models.IntegerField('当前库存', default=0)
     max_capacity = models.IntegerField('最大容量', default=20)
+    # 最近一次变更时所属机器的库存版本号（触发器维护，见 BizInventoryVersion）
+    version = models.BigIntegerField('版本号', default=0)
+
+    objects = BizInventoryQuerySet.as_manager()
 
     class Meta:
         db_table = 'biz_inventory'
         verbose_name = '库存'
         verbose_name_plural = verbose_name
         unique_together = ['machine', 'product']  # 联合唯一索引
+        indexes = [
+            models.Index(fields=['machine', 'version'], name='biz_inv_machine_version_idx'),
+        ]
 
     def __str__(self):
         return f'{self.machine.machine_code} - {self.product.name}: {self.current_stock}'
 
 
+class BizInventoryShard(models.Model):
+    """
+    货道库存分片 - 热点货道的一部分库存预先分配到若干分片行（见 inventory/sharding.py、迁移 0012）
+    售出时触发器按交易号扣减其中一个分片，不更新货道行，同一货道的并发购买不再争用一行锁；
+    分片全部为空后才扣减货道行上的池，缺货/售罄预警仍由货道行上的触发器按总库存产生。
+    分片库存的变化不递增机器库存版本号，按版本号增量同步时分片货道每次都返回（见 BizMachineViewSet.inventory）。
+    """
+    inventory = models.ForeignKey(
+        BizInventory,
+        on_delete=models.CASCADE,
+        verbose_name='货道',
+        related_name='shards'
+    )
+    shard_no = models.PositiveSmallIntegerField('分片号')
+    stock = models.IntegerField('分片库存', default=0)
+
+    class Meta:
+        db_table = 'biz_inventory_shard'
+        verbose_name = '库存分片'
+        verbose_name_plural = verbose_name
+        unique_together = ['inventory', 'shard_no']
+
+    def __str__(self):
+        return f'{self.inventory_id}#{self.shard_no}: {self.stock}'
+
+
+class BizInventoryVersion(models.Model):
+    """
+    机器库存版本号 - 该机器任一货道新增、库存/容量变更或删除时加一（触发器维护，见迁移 0010）
+    版本号的递增持有本行的行锁直到事务提交，同一机器的版本号顺序与提交顺序一致，
+    客户端按 ?since=<版本号> 增量同步不会漏掉变更。
+    reset_version 记录最近一次删除货道时的版本号，早于它的客户端需全量同步。
+    """
+    # 不建外键约束：删除机器级联删除货道时，触发器可能在机器删除前重新写入本行
+    machine = models.OneToOneField(
+        BizMachine,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_constraint=False,
+        verbose_name='机器',
+        related_name='inventory_version'
+    )
+    version = models.BigIntegerField('版本号', default=0)
+    reset_version = models.BigIntegerField('全量同步版本号', default=0)
+
+    class Meta:
+        db_table = 'biz_inventory_version'
+        verbose_name = '库存版本号'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return f'{self.machine_id}: {self.version}'
+
+
 class LogTransaction(models.Model):
     """交易流水"""
     user = models.ForeignKey(
@@ -63,11 +140,57 @@ class LogTransaction(models.Model):
         db_table = 'log_transaction'
         verbose_name = '交易流水'
         verbose_name_plural = verbose_name
+        # 统计与分页均按时间范围查询，并常按机器/商品分组
+        indexes = [
+            models.Index(fields=['created_at'], name='log_txn_created_idx'),
+            models.Index(fields=['machine', 'created_at'], name='log_txn_machine_created_idx'),
+            models.Index(fields=['product', 'created_at'], name='log_txn_product_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.product.name} - {self.amount}'
 
 
+class LogTransactionArchive(models.Model):
+    """
+    交易流水归档 - 冷数据，由 archive_transactions 命令按整月从 log_transaction 迁入
+    列与 log_transaction 一致但不带外键；MySQL 上按月 RANGE 分区并压缩存储（见迁移 0009）
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField('用户ID')
+    machine_id = models.BigIntegerField('机器ID')
+    product_id = models.BigIntegerField('商品ID')
+    amount = models.DecimalField('成交金额', max_digits=10, decimal_places=2)
+    cost_price = models.DecimalField('成本价', max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField('交易时间')
+
+    class Meta:
+        db_table = 'log_transaction_archive'
+        verbose_name = '交易流水归档'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['created_at'], name='log_txn_arch_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} - {self.amount}'
+
+
+# 补货总成本的数据库表达式：数量 × 单位成本
+RESTOCK_TOTAL_COST = models.ExpressionWrapper(
+    models.F('quantity') * models.F('unit_cost'),
+    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+class LogRestockQuerySet(models.QuerySet):
+    """补货记录查询集：总成本在数据库中计算，无需把记录逐条取回 Python"""
+
+    def with_total_cost(self):
+        """为每条记录注解 total_cost"""
+        return self.annotate(total_cost=RESTOCK_TOTAL_COST)
+
+
 class LogRestock(models.Model):
     """补货记录"""
     staff = models.ForeignKey(
@@ -92,15 +215,28 @@ class LogRestock(models.Model):
     unit_cost = models.DecimalField('单位成本', max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField('补货时间', auto_now_add=True)
 
+    objects = LogRestockQuerySet.as_manager()
+
     @property
     def total_cost(self):
-        """计算总成本 = 数量 × 单位成本"""
+        """计算总成本 = 数量 × 单位成本（经 with_total_cost() 注解时直接使用数据库结果）"""
+        if '_total_cost' in self.__dict__:
+            return self._total_cost
         return self.quantity * self.unit_cost
 
+    @total_cost.setter
+    def total_cost(self, value):
+        self._total_cost = value
+
     class Meta:
         db_table = 'log_restock'
         verbose_name = '补货记录'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['created_at'], name='log_restock_created_idx'),
+            models.Index(fields=['machine', 'created_at'], name='log_restock_mach_created_idx'),
+            models.Index(fields=['product', 'created_at'], name='log_restock_prod_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.staff.name} - {self.machine.machine_code} - {self.product.name}'
@@ -0,0 +1,111 @@
+"""
+补货计划
+
+按 (机器, 商品) 估计日销速度，结合当前库存预测售罄时间，按运维区域输出排序后的补货清单。
+
+销速度只读商品日汇总 (stat_product_daily)，一条 GROUP BY 查询同时得到近 PLAN_RECENT_DAYS 天
+与近 PLAN_WINDOW_DAYS 天的销量，不扫描交易日志：
+    日销速度 = 近期日均 × PLAN_RECENT_WEIGHT + 长期日均 × (1 - PLAN_RECENT_WEIGHT)
+售罄天数 = 当前库存 / 日销速度；售罄天数不超过 horizon 天或库存低于预警阈值的货道需要补货，
+补到 cover 天的预计销量（至少到预警阈值，至多到最大容量）。
+清单先按售罄时间、再按日销速度排序，已售罄的排在最前。
+
+汇总只记录成交，售罄期间没有销量，长期缺货货道的速度会被低估，近期权重用于减小这种影响。
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from users.models import SysStaff
+from monitor.models import StatProductDaily
+from .models import BizInventory
+
+PLAN_WINDOW_DAYS = 28
+PLAN_RECENT_DAYS = 7
+PLAN_RECENT_WEIGHT = 0.6
+DEFAULT_HORIZON_DAYS = 2
+DEFAULT_COVER_DAYS = 7
+
+
+def sales_velocity(today, region=None):
+    """{(machine_id, product_id): 日销速度}，统计截至昨天的完整日"""
+    window_start = today - timedelta(days=PLAN_WINDOW_DAYS)
+    recent_start = today - timedelta(days=PLAN_RECENT_DAYS)
+    rows = StatProductDaily.objects.filter(date__gte=window_start, date__lt=today)
+    if region:
+        rows = rows.filter(machine__region_code=region)
+    rows = rows.values('machine_id', 'product_id').annotate(
+        total=Sum('order_count'),
+        recent=Sum('order_count', filter=Q(date__gte=recent_start)),
+    ).values_list('machine_id', 'product_id', 'total', 'recent')
+
+    velocity = {}
+    for machine_id, product_id, total, recent in rows:
+        rate = (
+            (recent or 0) / PLAN_RECENT_DAYS * PLAN_RECENT_WEIGHT
+            + (total or 0) / PLAN_WINDOW_DAYS * (1 - PLAN_RECENT_WEIGHT)
+        )
+        if rate > 0:
+            velocity[(machine_id, product_id)] = rate
+    return velocity
+
+
+def plan_restock(region=None, horizon_days=DEFAULT_HORIZON_DAYS, cover_days=DEFAULT_COVER_DAYS, now=None):
+    """返回按区域分组的补货清单（区域按编号排序）"""
+    now = now or timezone.now()
+    velocity = sales_velocity(timezone.localdate(now), region)
+
+    slots = BizInventory.objects.with_total_stock().filter(total_stock__lt=F('max_capacity'))
+    if region:
+        slots = slots.filter(machine__region_code=region)
+    slots = slots.values_list(
+        'machine_id', 'machine__machine_code', 'machine__location', 'machine__region_code',
+        'product_id', 'product__name', 'product__low_stock_threshold',
+        'total_stock', 'max_capacity',
+    )
+
+    items = defaultdict(list)
+    for (machine_id, machine_code, location, region_code, product_id, product_name,
+         threshold, stock, capacity) in slots:
+        rate = velocity.get((machine_id, product_id), 0)
+        days_left = stock / rate if rate else None
+        if stock >= threshold and (days_left is None or days_left > horizon_days):
+            continue
+        target = min(capacity, max(math.ceil(rate * cover_days), threshold))
+        if target <= stock:
+            continue
+        items[region_code].append({
+            'machine': machine_id,
+            'machine_code': machine_code,
+            'location': location,
+            'product': product_id,
+            'product_name': product_name,
+            'current_stock': stock,
+            'max_capacity': capacity,
+            'daily_velocity': round(rate, 2),
+            'days_to_stockout': round(days_left, 1) if days_left is not None else None,
+            'stockout_at': (now + timedelta(days=days_left)).isoformat() if days_left is not None else None,
+            'suggested_quantity': target - stock,
+        })
+
+    staff = defaultdict(list)
+    for s in SysStaff.objects.filter(region_code__in=list(items)).order_by('staff_id'):
+        staff[s.region_code].append({'id': s.id, 'staff_id': s.staff_id, 'name': s.name, 'phone': s.phone})
+
+    plan = []
+    for region_code in sorted(items):
+        ranked = sorted(
+            items[region_code],
+            key=lambda i: (i['days_to_stockout'] if i['days_to_stockout'] is not None else math.inf,
+                           -i['daily_velocity']),
+        )
+        for rank, item in enumerate(ranked, 1):
+            item['rank'] = rank
+        plan.append({
+            'region_code': region_code,
+            'staff': staff[region_code],
+            'total_quantity': sum(i['suggested_quantity'] for i in ranked),
+            'items': ranked,
+        })
+    return plan
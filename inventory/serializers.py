@@ -1,16 +1,48 @@
+from decimal import Decimal
+from django.db import transaction
 from rest_framework import serializers
+from vending_system.serializers import SparseModelSerializer
+from resources.models import BizMachine, BizProduct
+from resources.serializers import CachedPrimaryKeyRelatedField
 from .models import BizInventory, LogTransaction, LogRestock
+from .services import publish_stock_changed
+from .sharding import collapse
 
-class BizInventorySerializer(serializers.ModelSerializer):
+class BizInventorySerializer(SparseModelSerializer):
+    machine = CachedPrimaryKeyRelatedField(queryset=BizMachine.objects.all())
+    product = CachedPrimaryKeyRelatedField(queryset=BizProduct.objects.all())
     machine_code = serializers.CharField(source='machine.machine_code', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     
     class Meta:
         model = BizInventory
         fields = '__all__'
+        read_only_fields = ['version']
 
-class LogTransactionSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # current_stock 输出总库存（分片货道 = 池 + 分片）
+        data = super().to_representation(instance)
+        total = getattr(instance, 'total_stock', None)
+        if total is not None and 'current_stock' in data:
+            data['current_stock'] = total
+        return data
+
+    def update(self, instance, validated_data):
+        if 'current_stock' not in validated_data:
+            return super().update(instance, validated_data)
+        # 直接设置库存时先把分片库存并回池，设置的值即为总库存
+        with transaction.atomic():
+            collapse([instance.pk])
+            old_stock = BizInventory.objects.filter(pk=instance.pk).values_list('current_stock', flat=True).get()
+            instance = super().update(instance, validated_data)
+            publish_stock_changed(instance, old_stock)
+        instance.total_stock = instance.current_stock
+        return instance
+
+class LogTransactionSerializer(SparseModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
+    machine = CachedPrimaryKeyRelatedField(queryset=BizMachine.objects.all())
+    product = CachedPrimaryKeyRelatedField(queryset=BizProduct.objects.all())
     machine_code = serializers.CharField(source='machine.machine_code', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     profit = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -19,8 +51,10 @@ class LogTransactionSerializer(serializers.ModelSerializer):
         model = LogTransaction
         fields = '__all__'
 
-class LogRestockSerializer(serializers.ModelSerializer):
+class LogRestockSerializer(SparseModelSerializer):
     staff_name = serializers.CharField(source='staff.name', read_only=True)
+    machine = CachedPrimaryKeyRelatedField(queryset=BizMachine.objects.all())
+    product = CachedPrimaryKeyRelatedField(queryset=BizProduct.objects.all())
     machine_code = serializers.CharField(source='machine.machine_code', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
     total_cost = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -29,3 +63,11 @@ class LogRestockSerializer(serializers.ModelSerializer):
         model = LogRestock
         fields = '__all__'
 
+
+
+class BulkPurchaseItemSerializer(serializers.Serializer):
+    """批量购买条目，仅做字段校验，存在性与库存/余额由服务层集合式判定"""
+    user = serializers.IntegerField()
+    machine = serializers.IntegerField()
+    product = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
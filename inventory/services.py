@@ -0,0 +1,293 @@
+"""
+购买服务 - 交易热路径
+
+一次购买分两个事务，用户行的锁不会持有到等待库存行（users/ledger.py）：
+1. 预扣：短事务中锁定用户行、确认当前余额足够并追加交易号为空的消费流水，立即提交
+2. INSERT log_transaction，由触发器 after_transaction_insert 执行
+   UPDATE biz_inventory ... WHERE current_stock > 0，库存不足时报错使插入失败
+   （MySQL SIGNAL；SQLite / PostgreSQL 版本见迁移 0011，以错误消息识别）；
+   同一事务中为预扣关联交易号，随后以一条 upsert 累加商品日汇总（见 monitor/rollup.py）
+第 2 步失败时追加冲正流水退回预扣，不会出现扣款而无交易；进程在两步之间退出时由 compact_balances 冲正。
+扣款前先检查库存，明显售罄时直接拒绝。
+热点货道可分片（inventory/sharding.py），触发器优先扣减分片行，不再争用同一货道行。
+
+批量购买（离线补传）则在一个事务中集合式校验后 bulk_create，并按行汇总后分组更新库存、批量追加流水。
+
+写入交易 / 补货后发布领域事件（events/），日汇总由事件处理器在同一事务中累加（monitor/handlers.py）。
+INVENTORY_SIDE_EFFECTS=events 时连接始终跳过库存触发器，扣库存、加库存改由 inventory/handlers.py 处理，
+库存不足时同样抛出 PurchaseError。
+"""
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+from django.db.models import F, Case, When, Value, IntegerField
+from users import ledger
+from users.models import AppUserLedger
+from resources.models import BizProduct
+from events.bus import bus
+from events.domain import RestockCreated, StockChanged, TransactionCreated
+from .models import BizInventory, BizInventoryShard, LogTransaction, LogRestock
+from .sharding import collapse, rebalance
+
+# MySQL SIGNAL 抛出的用户自定义错误码 (ER_SIGNAL_EXCEPTION)
+MYSQL_SIGNAL_ERROR = 1644
+# 触发器库存不足时的错误消息（各数据库一致）
+STOCK_ERROR_MESSAGE = 'Inventory not sufficient'
+
+# 批量写入 / 分组更新的单批行数
+BULK_BATCH_SIZE = 500
+
+
+# 各数据库设置 / 清除跳过标志的语句（SQLite 为连接上的标志，见 register_sqlite_functions）
+SKIP_FLAG_SQL = {
+    'mysql': ("SET @skip_inventory_trigger = 1", "SET @skip_inventory_trigger = NULL"),
+    'postgresql': (
+        "SELECT set_config('vending.skip_inventory_trigger', '1', false)",
+        "SELECT set_config('vending.skip_inventory_trigger', '', false)",
+    ),
+}
+
+
+class PurchaseError(Exception):
+    """购买失败：余额不足或库存不足"""
+
+
+def events_mode():
+    """库存副作用由领域事件处理器完成（INVENTORY_SIDE_EFFECTS=events），触发器不再生效"""
+    return settings.INVENTORY_SIDE_EFFECTS == 'events'
+
+
+def purchase(user, machine, product, amount):
+    """
+    执行一次购买，返回新建的 LogTransaction
+    先提交预扣，写入交易与扣库存在另一事务中，失败时冲正预扣；余额或库存不足时抛出 PurchaseError
+    """
+    in_stock = BizInventory.objects.with_total_stock().filter(machine=machine, product=product, total_stock__gt=0)
+    if not in_stock.exists():
+        raise PurchaseError("Inventory not sufficient")
+    try:
+        entry = ledger.reserve(user.pk, amount)
+    except ledger.InsufficientBalance as e:
+        raise PurchaseError("Insufficient balance") from e
+    try:
+        with transaction.atomic():
+            instance = LogTransaction.objects.create(
+                user=user,
+                machine=machine,
+                product=product,
+                amount=amount,
+                cost_price=product.cost_price,
+            )
+            ledger.link(entry.pk, instance.pk)
+            bus.publish([TransactionCreated.of(instance)])
+    except Exception as e:
+        # 交易未写入，退回预扣（已被 release_stale 冲正时不重复）
+        ledger.release(entry.pk)
+        if isinstance(e, DatabaseError) and _is_stock_error(e):
+            raise PurchaseError("Inventory not sufficient") from e
+        if isinstance(e, ledger.ReservationReleased):
+            raise PurchaseError("Purchase timed out") from e
+        raise
+    return instance
+
+
+def _is_stock_error(error):
+    """触发器因库存不足拒绝插入"""
+    if connection.vendor == 'mysql':
+        return bool(error.args) and error.args[0] == MYSQL_SIGNAL_ERROR
+    return STOCK_ERROR_MESSAGE in str(error)
+
+
+def restock(staff, machine, product, quantity):
+    """
+    执行一次补货，返回新建的 LogRestock
+    单位成本取商品当前进价；库存由触发器 after_restock_insert（事件模式下由 RestockCreated 的处理器）增加，
+    不超过最大容量；分片货道补进池的库存随即分到分片，之后的售出仍扣减分片
+    """
+    with transaction.atomic():
+        instance = LogRestock.objects.create(
+            staff=staff,
+            machine=machine,
+            product=product,
+            quantity=quantity,
+            unit_cost=product.cost_price,
+        )
+        bus.publish([RestockCreated.of(instance)])
+        sharded = (
+            BizInventoryShard.objects.filter(inventory__machine=machine, inventory__product=product)
+            .values_list('inventory_id', flat=True).first()
+        )
+        if sharded is not None:
+            rebalance([sharded])
+        return instance
+
+
+def publish_stock_changed(inventory, old_stock):
+    """直接修改货道行库存（退货、删除补货记录、手工设置）后发布 StockChanged，事件模式下由其处理器产生预警"""
+    if inventory.current_stock != old_stock:
+        bus.publish([StockChanged(
+            inventory.pk, inventory.machine_id, inventory.product_id, old_stock, inventory.current_stock,
+        )])
+
+
+@contextmanager
+def inventory_trigger_skipped():
+    """
+    在当前连接上跳过库存相关触发器（交易扣库存、补货加库存、缺货/售罄预警，见迁移 0006、0008、0011），
+    调用方负责自行汇总更新库存。
+    - MySQL: 会话变量 @skip_inventory_trigger
+    - PostgreSQL: 配置项 vending.skip_inventory_trigger
+    - SQLite: 连接上的标志，触发器经 skip_inventory_trigger() 函数读取
+    事件模式下连接上的标志始终设置（见 skip_triggers_in_events_mode），退出时不复位。
+    """
+    if events_mode():
+        yield
+        return
+    if connection.vendor == 'sqlite':
+        connection.skip_inventory_trigger = True
+        try:
+            yield
+        finally:
+            connection.skip_inventory_trigger = False
+        return
+
+    if connection.vendor not in SKIP_FLAG_SQL:
+        yield
+        return
+    enable, disable = SKIP_FLAG_SQL[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(enable)
+    try:
+        yield
+    finally:
+        # 会话变量不随事务回滚且连接可能被复用，事务出错时也必须复位，故绕过 Django 的事务状态检查
+        # （PostgreSQL 的配置项随事务回滚撤销，事务已中止时复位失败可忽略）
+        try:
+            with connection.connection.cursor() as cursor:
+                cursor.execute(disable)
+        except Exception:
+            if connection.vendor == 'mysql' or not connection.in_atomic_block:
+                raise
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    """connection_created 信号：为 SQLite 连接注册触发器使用的 skip_inventory_trigger()"""
+    if connection.vendor != 'sqlite':
+        return
+    connection.skip_inventory_trigger = False
+    connection.connection.create_function(
+        'skip_inventory_trigger', 0, lambda: 1 if connection.skip_inventory_trigger else None
+    )
+
+
+def skip_triggers_in_events_mode(sender, connection, **kwargs):
+    """connection_created 信号：事件模式下新连接始终跳过库存触发器（含故障预警，见 monitor 迁移 0007）"""
+    if not events_mode():
+        return
+    if connection.vendor == 'sqlite':
+        connection.skip_inventory_trigger = True
+    elif connection.vendor in SKIP_FLAG_SQL:
+        with connection.cursor() as cursor:
+            cursor.execute(SKIP_FLAG_SQL[connection.vendor][0])
+
+
+def _apply_deltas(model, field, deltas, output_field):
+    """按主键分组扣减：UPDATE ... SET field = field - CASE id WHEN ... END WHERE id IN (...)"""
+    pks = list(deltas)
+    for start in range(0, len(pks), BULK_BATCH_SIZE):
+        chunk = pks[start:start + BULK_BATCH_SIZE]
+        delta = Case(
+            *[When(pk=pk, then=Value(deltas[pk])) for pk in chunk],
+            output_field=output_field,
+        )
+        model.objects.filter(pk__in=chunk).update(**{field: F(field) - delta})
+
+
+def bulk_purchase(items):
+    """
+    批量购买，按顺序逐条判定，返回与 items 等长的结果列表
+
+    items 为已通过字段校验的字典列表：{'user', 'machine', 'product', 'amount'}（均为主键 / Decimal）
+    1. 一次性锁定涉及的用户与库存行（与退货相同的 用户 → 库存 加锁顺序），分片货道先把分片库存并回池
+    2. 在内存中按顺序扣减库存与余额，不足的条目被拒绝
+    3. bulk_create 写入通过的交易（跳过逐行触发器）与消费流水，再分组更新库存，
+       并以一批 TransactionCreated 事件累加日汇总（事件模式下库存也由处理器分组扣减）
+    """
+    user_ids = {item['user'] for item in items}
+    machine_ids = {item['machine'] for item in items}
+    product_ids = {item['product'] for item in items}
+    results = []
+
+    with transaction.atomic():
+        balances = ledger.lock_balances(user_ids)
+        # 分片货道先于其他货道加锁，并发的批量购买之间加锁顺序一致
+        collapse(
+            BizInventoryShard.objects.filter(
+                inventory__machine_id__in=machine_ids, inventory__product_id__in=product_ids
+            ).values_list('inventory_id', flat=True).distinct()
+        )
+        inventories = {
+            (machine_id, product_id): (pk, stock)
+            for pk, machine_id, product_id, stock in (
+                BizInventory.objects.select_for_update()
+                .filter(machine_id__in=machine_ids, product_id__in=product_ids).order_by('pk')
+                .values_list('pk', 'machine_id', 'product_id', 'current_stock')
+            )
+        }
+        cost_prices = dict(
+            BizProduct.objects.filter(pk__in=product_ids).values_list('pk', 'cost_price')
+        )
+        stocks = {pk: stock for pk, stock in inventories.values()}
+        stock_deltas = {}
+        accepted = []
+
+        for index, item in enumerate(items):
+            inventory = inventories.get((item['machine'], item['product']))
+            amount = item['amount']
+            if item['user'] not in balances:
+                error = "User not found"
+            elif inventory is None:
+                error = "Inventory record not found"
+            elif stocks[inventory[0]] <= 0:
+                error = "Inventory not sufficient"
+            elif balances[item['user']] < amount:
+                error = "Insufficient balance"
+            else:
+                error = None
+
+            if error:
+                results.append({'index': index, 'status': 'rejected', 'error': error})
+                continue
+
+            inventory_id = inventory[0]
+            stocks[inventory_id] -= 1
+            stock_deltas[inventory_id] = stock_deltas.get(inventory_id, 0) + 1
+            balances[item['user']] -= amount
+            accepted.append(LogTransaction(
+                user_id=item['user'],
+                machine_id=item['machine'],
+                product_id=item['product'],
+                amount=amount,
+                cost_price=cost_prices[item['product']],
+            ))
+            results.append({'index': index, 'status': 'accepted'})
+
+        with inventory_trigger_skipped():
+            LogTransaction.objects.bulk_create(accepted, batch_size=BULK_BATCH_SIZE)
+
+        # 支持 RETURNING 的后端会回填主键，流水可关联到交易
+        AppUserLedger.objects.bulk_create([
+            AppUserLedger(user_id=t.user_id, amount=-t.amount, kind='purchase', transaction_id=t.pk)
+            for t in accepted
+        ], batch_size=BULK_BATCH_SIZE)
+        if not events_mode():
+            _apply_deltas(BizInventory, 'current_stock', stock_deltas, IntegerField())
+        bus.publish([TransactionCreated.of(t) for t in accepted])
+
+    created = iter(accepted)
+    for result in results:
+        if result['status'] == 'accepted':
+            pk = next(created).pk
+            if pk is not None:
+                result['id'] = pk
+    return results
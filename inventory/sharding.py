@@ -0,0 +1,124 @@
+"""
+热点货道库存分片（预分配 / escrow）
+
+分片货道的库存分两部分：货道行上的池 (current_stock) 与若干分片行 (biz_inventory_shard)，
+总库存 = 池 + 分片库存（读取见 BizInventory.objects.with_total_stock()）。
+- 售出：触发器 after_transaction_insert 扣减一个分片，不更新货道行（见迁移 0012）；
+  分片全部为空后才扣池
+- 分配 rebalance()：把池中超出预留量的部分平均分到各分片，预留量 = 缺货阈值 + 分片数。
+  分片有库存时池不低于阈值，库存跌破阈值与售罄都发生在池上，
+  货道行上的缺货/售罄预警触发器仍按总库存判断（多留的分片数件为与售出并发时的余量）
+  补货 restock() 只加到池，写入后随即对该货道执行 rebalance()，补进的库存分到分片
+- 回收 collapse()：把分片库存并回池，批量购买、手工改库存等需要精确扣减的路径先回收
+
+应用层加锁顺序为 货道 → 分片；触发器只在分片全部为空时才锁货道行。
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+from monitor.models import StatProductDaily
+from resources.models import BizProduct
+from .models import BizInventory, BizInventoryShard
+
+DEFAULT_SHARDS = 4
+# 按近几天的销量挑选热点货道
+HOT_SLOT_DAYS = 7
+
+
+def hot_slots(limit, days=HOT_SLOT_DAYS):
+    """近 days 天销量最高的 limit 个货道的主键"""
+    since = timezone.localdate() - timedelta(days=days)
+    top = list(
+        StatProductDaily.objects.filter(date__gte=since)
+        .values('machine_id', 'product_id').annotate(orders=Sum('order_count'))
+        .filter(orders__gt=0).order_by('-orders')
+        .values_list('machine_id', 'product_id')[:limit]
+    )
+    if not top:
+        return []
+    match = Q()
+    for machine_id, product_id in top:
+        match |= Q(machine_id=machine_id, product_id=product_id)
+    return list(BizInventory.objects.filter(match).values_list('pk', flat=True))
+
+
+def _redistribute(inventory_ids, allot):
+    """
+    锁定货道与其分片，按 allot(总库存, 缺货阈值, 分片数) 决定分到分片的数量并写回；
+    须在事务中调用，返回处理的货道数
+    """
+    slots = {
+        pk: (stock, product_id) for pk, stock, product_id in
+        BizInventory.objects.select_for_update().filter(pk__in=inventory_ids).order_by('pk')
+        .values_list('pk', 'current_stock', 'product_id')
+    }
+    shards = {}
+    for shard_id, inventory_id, stock in (
+        BizInventoryShard.objects.select_for_update().filter(inventory_id__in=list(slots))
+        .order_by('inventory_id', 'shard_no').values_list('pk', 'inventory_id', 'stock')
+    ):
+        shards.setdefault(inventory_id, []).append((shard_id, stock))
+    if not shards:
+        return 0
+    thresholds = dict(
+        BizProduct.objects.filter(pk__in={slots[pk][1] for pk in shards})
+        .values_list('pk', 'low_stock_threshold')
+    )
+
+    pool_updates, shard_updates = {}, {}
+    for inventory_id, rows in shards.items():
+        pool, product_id = slots[inventory_id]
+        total = pool + sum(stock for _, stock in rows)
+        allotted = max(0, min(total, allot(total, thresholds[product_id], len(rows))))
+        share, extra = divmod(allotted, len(rows))
+        for index, (shard_id, stock) in enumerate(rows):
+            target = share + (1 if index < extra else 0)
+            if target != stock:
+                shard_updates[shard_id] = target
+        if total - allotted != pool:
+            pool_updates[inventory_id] = total - allotted
+
+    if shard_updates:
+        BizInventoryShard.objects.filter(pk__in=list(shard_updates)).update(stock=Case(
+            *[When(pk=pk, then=Value(stock)) for pk, stock in shard_updates.items()],
+            output_field=IntegerField(),
+        ))
+    if pool_updates:
+        BizInventory.objects.filter(pk__in=list(pool_updates)).update(current_stock=Case(
+            *[When(pk=pk, then=Value(stock)) for pk, stock in pool_updates.items()],
+            output_field=IntegerField(),
+        ))
+    return len(shards)
+
+
+def collapse(inventory_ids):
+    """把分片库存全部并回池（分片行保留，下次分配时重新分出），须在事务中调用"""
+    return _redistribute(inventory_ids, lambda total, threshold, count: 0)
+
+
+def rebalance(inventory_ids=None):
+    """按预留量重新分配分片货道的库存，inventory_ids 为空时处理全部分片货道，返回处理的货道数"""
+    if inventory_ids is None:
+        inventory_ids = BizInventoryShard.objects.values_list('inventory_id', flat=True).distinct()
+    with transaction.atomic():
+        return _redistribute(
+            list(inventory_ids), lambda total, threshold, count: total - threshold - count
+        )
+
+
+def shard(inventory_ids, shards=DEFAULT_SHARDS):
+    """把货道设为 shards 个分片（0 表示取消分片）并重新分配库存，返回处理的货道数"""
+    with transaction.atomic():
+        ids = list(
+            BizInventory.objects.select_for_update().filter(pk__in=inventory_ids)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        collapse(ids)
+        BizInventoryShard.objects.filter(inventory_id__in=ids, shard_no__gte=shards).delete()
+        BizInventoryShard.objects.bulk_create(
+            [BizInventoryShard(inventory_id=pk, shard_no=n) for pk in ids for n in range(shards)],
+            ignore_conflicts=True,
+        )
+        rebalance(ids)
+    return len(ids)
@@ -1,3 +1,710 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from vending_system.pagination import StandardPagination
+from vending_system.testing import make_fleet, has_trigger, QueryBudgetMixin, ExplainMixin, EventSideEffectsMixin
+from .archive import archive_month
+from .async_views import _db_slot
+from .models import (
+    BizInventory, BizInventoryShard, BizInventoryVersion, LogTransaction, LogTransactionArchive, LogRestock
+)
+from .services import purchase, restock, bulk_purchase, inventory_trigger_skipped, PurchaseError
+from .sharding import shard, rebalance
+from .views import LogTransactionViewSet
+from resources.models import BizMachine, BizProduct
+from users import ledger
+from users.models import AppUser, AppUserLedger
+from monitor.models import LogAlert, StatDaily, StatProductDaily
+from monitor.handlers import apply_alert_window
+from monitor.rollup import rebuild
+from events.models import EventOutbox
+from monitor.services import generate_daily_stats
 
-# Create your tests here.
+
+class ListQueryCountTests(QueryBudgetMixin, TestCase):
+    """库存 / 交易 / 补货列表的查询次数不随行数增长"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+
+    def add_transactions(self, n=20):
+        for _ in range(n):
+            LogTransaction.objects.create(
+                user=self.fleet.user, machine=self.fleet.machine,
+                product=self.fleet.product, amount=self.fleet.product.sell_price,
+            )
+
+    def add_restocks(self, n=20):
+        for _ in range(n):
+            LogRestock.objects.create(
+                staff=self.fleet.staff, machine=self.fleet.machine,
+                product=self.fleet.product, quantity=1,
+            )
+
+    def add_inventories(self, n=20):
+        for i in range(n):
+            product = BizProduct.objects.create(
+                name=f'商品{i}', cost_price=1, sell_price=2, supplier=self.fleet.supplier
+            )
+            BizInventory.objects.create(machine=self.fleet.machine, product=product)
+
+    def test_transaction_list(self):
+        self.add_transactions(1)
+        self.assertQueryBudget('/api/transactions/', self.add_transactions, max_queries=1)
+
+    def test_restock_list(self):
+        self.add_restocks(1)
+        self.assertQueryBudget('/api/restocks/', self.add_restocks, max_queries=1)
+
+    def test_inventory_list(self):
+        # 页码分页额外一次 COUNT
+        self.assertQueryBudget('/api/inventories/', self.add_inventories, max_queries=2)
+
+    def test_cursor_order(self):
+        # 同一时刻的交易按 id 倒序，翻页期间插入的新交易不影响后续页
+        self.add_transactions(5)
+        LogTransaction.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+        expected = list(LogTransaction.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        client = APIClient()
+        page = client.get('/api/transactions/?page_size=2').json()
+        ids = [row['id'] for row in page['results']]
+        self.add_transactions(1)
+        while page['next']:
+            page = client.get(page['next']).json()
+            ids += [row['id'] for row in page['results']]
+        self.assertEqual(ids, expected)
+
+        # 从末页沿 previous 回翻，顺序一致
+        back = []
+        while page['previous']:
+            back = [row['id'] for row in page['results']] + back
+            page = client.get(page['previous']).json()
+        back = [row['id'] for row in page['results']] + back
+        self.assertEqual(back[-len(expected):], expected)
+        self.assertEqual(client.get('/api/transactions/?cursor=bad').status_code, 404)
+
+    def test_page_limits(self):
+        self.add_inventories(5)
+        client = APIClient()
+        page = client.get('/api/inventories/?page_size=2&page=3').json()
+        self.assertEqual((page['count'], len(page['results'])), (6, 2))
+        self.assertIsNone(page['next'])
+        with patch.object(StandardPagination, 'max_page_size', 4):
+            page = client.get('/api/inventories/?page_size=1000').json()
+        self.assertEqual(len(page['results']), 4)
+        self.assertEqual(client.get('/api/inventories/?page=9').status_code, 404)
+
+    def test_sparse_fields(self):
+        self.add_transactions(2)
+        client = APIClient()
+        rows = client.get('/api/transactions/?fields=id,amount,unknown').json()['results']
+        self.assertEqual([set(row) for row in rows], [{'id', 'amount'}] * 2)
+        row = client.get('/api/transactions/?fields=').json()['results'][0]
+        self.assertIn('product_name', row)
+        # 写操作不受 fields 影响
+        response = client.post('/api/transactions/?fields=id', {
+            'user': self.fleet.user.id, 'machine': self.fleet.machine.id,
+            'product': self.fleet.product.id, 'amount': '2.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('amount', response.json())
+
+
+class StatisticsPlanTests(ExplainMixin, TestCase):
+    """财务/补货统计按日期范围查询，必须可走索引"""
+
+    def setUp(self):
+        make_fleet()
+
+    def test_transaction_statistics(self):
+        self.assertNoFullScan('/api/transactions/statistics/?period=week', ['stat_product_daily'])
+
+    def test_restock_cost_statistics(self):
+        self.assertNoFullScan('/api/restocks/cost_statistics/?period=week', ['stat_product_daily'])
+
+
+class LogIndexPlanTests(ExplainMixin, TestCase):
+    """日志表的分页、导出、归档查询走 created_at 及 (machine / product, created_at) 索引"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        for _ in range(2):
+            LogTransaction.objects.create(
+                user=self.fleet.user, machine=self.fleet.machine,
+                product=self.fleet.product, amount=self.fleet.product.sell_price,
+            )
+            LogRestock.objects.create(
+                staff=self.fleet.staff, machine=self.fleet.machine, product=self.fleet.product, quantity=1, unit_cost=1,
+            )
+
+    def queries(self, url):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return ctx.captured_queries, response
+
+    def test_cursor_pages(self):
+        for url, table, index in (
+            ('/api/transactions/', 'log_transaction', 'log_txn_created_idx'),
+            ('/api/restocks/', 'log_restock', 'log_restock_created_idx'),
+        ):
+            queries, response = self.queries(f'{url}?page_size=1')
+            self.assertUsesIndex(queries, table, index)
+            # 后续页按游标做范围查询
+            queries, _ = self.queries(response.json()['next'])
+            self.assertUsesIndex(queries, table, index)
+
+    def test_export_filters(self):
+        machine, product = self.fleet.machine.id, self.fleet.product.id
+        for url, table, index in (
+            (f'/api/transactions/export/?machine={machine}&start_date=2025-01-01',
+             'log_transaction', 'log_txn_machine_created_idx'),
+            (f'/api/transactions/export/?product={product}', 'log_transaction', 'log_txn_product_created_idx'),
+            (f'/api/restocks/export/?machine={machine}', 'log_restock', 'log_restock_mach_created_idx'),
+            (f'/api/restocks/export/?product={product}&start_date=2025-01-01',
+             'log_restock', 'log_restock_prod_created_idx'),
+            ('/api/transactions/export/?start_date=2025-01-01', 'log_transaction', 'log_txn_created_idx'),
+        ):
+            with patch.object(LogTransactionViewSet, 'export_chunk_size', 1):
+                queries, _ = self.queries(url)
+            self.assertUsesIndex(queries, table, index)
+
+    def test_archive_month(self):
+        today = timezone.localdate()
+        with CaptureQueriesContext(connection) as ctx:
+            archive_month(today.year, today.month)
+        self.assertUsesIndex(ctx.captured_queries, 'log_transaction', 'log_txn_created_idx')
+
+
+class ExportTests(TestCase):
+    """流式导出分批读取，结果完整且按时间升序"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        for _ in range(5):
+            LogTransaction.objects.create(
+                user=self.fleet.user, machine=self.fleet.machine,
+                product=self.fleet.product, amount=self.fleet.product.sell_price,
+            )
+
+    def read(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_csv_chunks(self):
+        # 批大小 2，5 行需跨 3 批
+        with patch.object(LogTransactionViewSet, 'export_chunk_size', 2), \
+                CaptureQueriesContext(connection) as queries:
+            lines = self.read('/api/transactions/export/').splitlines()
+        self.assertEqual(sum('LIMIT 2' in q['sql'] for q in queries.captured_queries), 3)
+        self.assertEqual(lines[0].split(','), [
+            'created_at', 'id', 'user', 'machine_code', 'product_name', 'amount', 'cost_price'
+        ])
+        ids = [int(line.split(',')[1]) for line in lines[1:]]
+        self.assertEqual(ids, sorted(LogTransaction.objects.values_list('id', flat=True)))
+
+    def test_ndjson_filters(self):
+        rows = self.read(f'/api/restocks/export/?output=ndjson&machine={self.fleet.machine.id}')
+        self.assertEqual(rows, '')
+        LogRestock.objects.create(
+            staff=self.fleet.staff, machine=self.fleet.machine, product=self.fleet.product, quantity=3, unit_cost=1,
+        )
+        rows = self.read(f'/api/restocks/export/?output=ndjson&machine={self.fleet.machine.id}')
+        row = json.loads(rows)
+        self.assertEqual(row['quantity'], 3)
+        self.assertEqual(Decimal(row['total_cost']), 3)
+
+    def test_bad_params(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/transactions/export/?output=xml').status_code, 400)
+        self.assertEqual(client.get('/api/transactions/export/?start_date=2025-13-01').status_code, 400)
+
+
+class BulkPurchaseApiTests(TestCase):
+    """批量补传接口：逐条结果按提交顺序返回"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.client = APIClient()
+
+    def item(self, **overrides):
+        item = {'user': self.fleet.user.id, 'machine': self.fleet.machine.id,
+                'product': self.fleet.product.id, 'amount': '3.50'}
+        item.update(overrides)
+        return item
+
+    def post(self, items):
+        return self.client.post('/api/transactions/bulk/', {'items': items}, format='json')
+
+    def test_mixed_results(self):
+        response = self.post([
+            self.item(),
+            self.item(amount='0'),
+            self.item(user=self.fleet.user.id + 999),
+            self.item(amount='-1'),
+            self.item(),
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['rejected']), (2, 3))
+        self.assertEqual([r['index'] for r in body['results']], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            [r['status'] for r in body['results']],
+            ['accepted', 'rejected', 'rejected', 'rejected', 'accepted'],
+        )
+        self.assertIn('amount', body['results'][1]['error'])
+        self.assertEqual(body['results'][2]['error'], 'User not found')
+        self.assertEqual(LogTransaction.objects.count(), 2)
+        self.assertEqual(ledger.current_balance(self.fleet.user.id), Decimal('9993.00'))
+
+    def test_too_many_items(self):
+        with patch('inventory.views.MAX_BULK_ITEMS', 2):
+            response = self.post([self.item()] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LogTransaction.objects.exists())
+
+    def test_items_not_list(self):
+        for body in ({'items': self.item()}, {'items': 'x'}, {}):
+            response = self.client.post('/api/transactions/bulk/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    """整月归档后交易移入归档表，汇总与重算结果不变"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.day = date(2025, 1, 15)
+        created_at = timezone.make_aware(datetime(2025, 1, 15, 12))
+        for _ in range(3):
+            txn = LogTransaction.objects.create(
+                user=self.fleet.user, machine=self.fleet.machine, product=self.fleet.product,
+                amount=Decimal('2.00'), cost_price=Decimal('1.00'),
+            )
+            LogTransaction.objects.filter(pk=txn.pk).update(created_at=created_at)
+        # 本月交易不归档
+        LogTransaction.objects.create(
+            user=self.fleet.user, machine=self.fleet.machine, product=self.fleet.product, amount=Decimal('2.00'),
+        )
+
+    def revenue(self):
+        return StatProductDaily.objects.get(date=self.day).revenue
+
+    def test_archive_month(self):
+        self.assertEqual(archive_month(2025, 1, batch_size=2), 3)
+        self.assertEqual(LogTransaction.objects.count(), 1)
+        self.assertEqual(LogTransactionArchive.objects.count(), 3)
+        self.assertEqual(self.revenue(), Decimal('6.00'))
+        self.assertEqual(StatDaily.objects.get(date=self.day).order_count, 3)
+
+        # 重算已归档月份，汇总不丢失
+        rebuild(self.day, self.day)
+        generate_daily_stats(self.day, self.day)
+        self.assertEqual(self.revenue(), Decimal('6.00'))
+        self.assertEqual(StatDaily.objects.get(date=self.day).total_revenue, Decimal('6.00'))
+
+    def test_rerun_is_noop(self):
+        archive_month(2025, 1)
+        self.assertEqual(archive_month(2025, 1), 0)
+        self.assertEqual(LogTransactionArchive.objects.count(), 3)
+
+
+class MachineApiTests(TestCase):
+    """机器端异步接口：购买、本机库存、心跳"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.base = f'/api/machine-api/{self.fleet.machine.id}'
+
+    async def test_purchase(self):
+        response = await self.async_client.post(
+            f'{self.base}/purchase/', {'user': self.fleet.user.id, 'product': self.fleet.product.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['amount'], '2.00')
+        self.assertEqual(await LogTransaction.objects.acount(), 1)
+
+    async def test_purchase_rejected(self):
+        await AppUser.objects.filter(pk=self.fleet.user.id).aupdate(balance=0)
+        response = await self.async_client.post(
+            f'{self.base}/purchase/', {'user': self.fleet.user.id, 'product': self.fleet.product.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Insufficient balance')
+        # true 不是合法的 ID
+        response = await self.async_client.post(
+            f'{self.base}/purchase/', {'user': True, 'product': self.fleet.product.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_inventory(self):
+        response = await self.async_client.get(f'{self.base}/inventory/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'][0]['current_stock'], self.fleet.inventory.current_stock)
+        response = await self.async_client.get('/api/machine-api/0/inventory/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_db_slot_per_loop(self):
+        async def slot():
+            async with _db_slot():
+                return _db_slot()
+
+        # 每个事件循环使用各自的信号量
+        self.assertIsNot(asyncio.run(slot()), asyncio.run(slot()))
+
+    async def test_heartbeat(self):
+        response = await self.async_client.post(
+            f'{self.base}/heartbeat/', {'status': 'fault'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        machine = await BizMachine.objects.aget(pk=self.fleet.machine.id)
+        self.assertEqual(machine.status, 'fault')
+        self.assertIsNotNone(machine.last_heartbeat)
+
+
+class RestockPlanTests(TestCase):
+    """补货计划：按日汇总估计销速，预测售罄并按区域排序"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        fleet = self.fleet
+        self.slow = BizProduct.objects.create(
+            name='慢销商品', cost_price=Decimal('1.00'), sell_price=Decimal('2.00'), supplier=fleet.supplier,
+        )
+        self.idle = BizProduct.objects.create(
+            name='滞销商品', cost_price=Decimal('1.00'), sell_price=Decimal('2.00'), supplier=fleet.supplier,
+        )
+        BizInventory.objects.filter(pk=fleet.inventory.pk).update(current_stock=5, max_capacity=50)
+        BizInventory.objects.create(machine=fleet.machine, product=self.slow, current_stock=40, max_capacity=50)
+        BizInventory.objects.create(machine=fleet.machine, product=self.idle, current_stock=2, max_capacity=50)
+        today = timezone.localdate()
+        for days_ago in range(1, 29):
+            day = today - timedelta(days=days_ago)
+            StatProductDaily.objects.create(date=day, machine=fleet.machine, product=fleet.product, order_count=10)
+            StatProductDaily.objects.create(date=day, machine=fleet.machine, product=self.slow, order_count=1)
+
+    def test_plan(self):
+        response = APIClient().get('/api/restocks/plan/', {'staff': self.fleet.staff.id})
+        self.assertEqual(response.status_code, 200)
+        [region] = response.data['regions']
+        self.assertEqual(region['region_code'], 'A')
+        self.assertEqual(region['staff'][0]['staff_id'], 'T001')
+        items = region['items']
+        # 慢销商品 40 天后才售罄，不在计划内；滞销但低于阈值的排在最后
+        self.assertEqual([i['product'] for i in items], [self.fleet.product.id, self.idle.id])
+        self.assertEqual(items[0]['daily_velocity'], 10)
+        self.assertEqual(items[0]['days_to_stockout'], 0.5)
+        self.assertEqual(items[0]['suggested_quantity'], 45)  # 7 天销量 70，封顶到容量 50
+        self.assertIsNone(items[1]['stockout_at'])
+        self.assertEqual(items[1]['suggested_quantity'], 3)   # 补到预警阈值 5
+        self.assertEqual(region['total_quantity'], 48)
+
+    def test_bad_params(self):
+        self.assertEqual(APIClient().get('/api/restocks/plan/', {'cover': 'x'}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/restocks/plan/', {'region': 'Z'}).data['regions'], [])
+
+
+class HeatmapTests(TestCase):
+    """库存热力图：数组编码的填充率矩阵与区域汇总，查询次数不随机器数增长"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        fleet = self.fleet
+        BizInventory.objects.filter(pk=fleet.inventory.pk).update(current_stock=0, max_capacity=20)
+        self.other = BizProduct.objects.create(
+            name='商品B', cost_price=Decimal('1.00'), sell_price=Decimal('2.00'), supplier=fleet.supplier,
+        )
+        self.slot = BizInventory.objects.create(
+            machine=fleet.machine, product=self.other, current_stock=15, max_capacity=20,
+        )
+        self.machine_b = BizMachine.objects.create(machine_code='VM-T002', location='测试楼', region_code='B')
+        BizInventory.objects.create(machine=self.machine_b, product=self.other, current_stock=3, max_capacity=10)
+
+    def test_heatmap(self):
+        # 分片库存计入总库存：池 7 + 分片 8
+        shard([self.slot.pk], 2)
+        response = APIClient().get('/api/inventories/heatmap/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['machines']['machine_code'], ['VM-T001', 'VM-T002'])
+        self.assertEqual(data['products']['id'], [self.fleet.product.id, self.other.id])
+        self.assertEqual(data['cells'], [[0, 75], [None, 30]])
+        self.assertEqual(
+            [(r['region_code'], r['machines'], r['slots'], r['stock'], r['low'], r['empty']) for r in data['regions']],
+            [('A', 1, 2, 15, 0, 1), ('B', 1, 1, 3, 1, 0)],
+        )
+        self.assertEqual((data['totals']['slots'], data['totals']['fill']), (3, 36))
+
+    def test_region_filter(self):
+        data = APIClient().get('/api/inventories/heatmap/', {'region_code': 'B'}).data
+        self.assertEqual(data['machines']['id'], [self.machine_b.id])
+        self.assertEqual(data['cells'], [[None, 30]])
+        self.assertEqual([r['region_code'] for r in data['regions']], ['B'])
+        data = APIClient().get('/api/inventories/heatmap/', {'cells': '0'}).data
+        self.assertNotIn('cells', data)
+        self.assertEqual(data['totals']['empty'], 1)
+
+    def test_query_count(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as before:
+            client.get('/api/inventories/heatmap/')
+        for i in range(5):
+            machine = BizMachine.objects.create(machine_code=f'VM-X{i}', location='测试楼', region_code='C')
+            BizInventory.objects.create(machine=machine, product=self.other, current_stock=1)
+        with CaptureQueriesContext(connection) as after:
+            client.get('/api/inventories/heatmap/')
+        self.assertEqual(len(before), len(after))
+        self.assertLessEqual(len(after), 4)
+
+
+class TriggerTests(TestCase):
+    """触发器行为（MySQL 与迁移 0011 的 SQLite / PostgreSQL 版本一致），测试库未安装触发器时跳过"""
+
+    def setUp(self):
+        if not has_trigger('after_transaction_insert'):
+            self.skipTest('测试库未安装触发器')
+        self.fleet = make_fleet()
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=6, max_capacity=10)
+
+    def stock(self):
+        return BizInventory.objects.get(pk=self.fleet.inventory.pk).current_stock
+
+    def buy(self):
+        fleet = self.fleet
+        return purchase(fleet.user, fleet.machine, fleet.product, fleet.product.sell_price)
+
+    def test_purchase_and_restock(self):
+        txn = self.buy()
+        self.assertEqual(self.stock(), 5)
+        entry = AppUserLedger.objects.get()
+        self.assertEqual((entry.amount, entry.transaction_id), (-txn.amount, txn.id))
+        restock(self.fleet.staff, self.fleet.machine, self.fleet.product, 100)
+        self.assertEqual(self.stock(), 10)  # 不超过最大容量
+
+    def test_insufficient_stock(self):
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=0)
+        with self.assertRaises(PurchaseError):
+            self.buy()
+        self.assertEqual(LogTransaction.objects.count(), 0)
+
+    def test_stock_error_releases_reservation(self):
+        # 预扣之后、写入交易之前货道被买空：预扣被冲正
+        reserve = ledger.reserve
+
+        def sold_out(user_id, amount):
+            entry = reserve(user_id, amount)
+            BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=0)
+            return entry
+
+        with patch('users.ledger.reserve', sold_out), self.assertRaisesMessage(PurchaseError, 'Inventory'):
+            self.buy()
+        self.assertFalse(LogTransaction.objects.exists())
+        self.assertEqual(
+            sorted(AppUserLedger.objects.values_list('kind', 'transaction_id')),
+            [('purchase', AppUserLedger.RELEASED_TRANSACTION_ID), ('reversal', None)],
+        )
+        self.assertEqual(ledger.current_balance(self.fleet.user.pk), self.fleet.user.balance)
+
+    def test_alerts_coalesce(self):
+        for _ in range(6):
+            self.buy()
+        # 低于阈值 5 与售罄在合并窗口内合并为一条
+        alert = LogAlert.objects.get()
+        self.assertEqual((alert.alert_type, alert.product_id), ('low_stock', self.fleet.product.id))
+        self.assertEqual(alert.occurrence_count, 2)
+        self.assertIn('已售罄', alert.message)
+
+        BizMachine.objects.filter(pk=self.fleet.machine.pk).update(status='fault')
+        self.assertTrue(LogAlert.objects.filter(alert_type='fault', product=None).exists())
+
+    def test_alert_window_setting(self):
+        # 40 分钟前的同类报警：默认窗口 30 分钟时新建，窗口设为 60 分钟时合并
+        old = LogAlert.objects.create(
+            machine=self.fleet.machine, product=self.fleet.product, alert_type='low_stock', message='旧',
+            last_seen_at=timezone.now() - timedelta(minutes=40),
+        )
+        inventory = BizInventory.objects.filter(pk=self.fleet.inventory.pk)
+        inventory.update(current_stock=3)
+        self.assertEqual(LogAlert.objects.count(), 2)
+
+        LogAlert.objects.exclude(pk=old.pk).delete()
+        inventory.update(current_stock=6)
+        with override_settings(ALERT_COALESCE_MINUTES=60):
+            apply_alert_window(None, connection)
+            inventory.update(current_stock=3)
+        apply_alert_window(None, connection)
+        self.assertEqual(LogAlert.objects.get().occurrence_count, 2)
+
+    def test_skip_flag(self):
+        with inventory_trigger_skipped():
+            LogTransaction.objects.create(
+                user=self.fleet.user, machine=self.fleet.machine, product=self.fleet.product, amount=2,
+            )
+        self.assertEqual(self.stock(), 6)
+        self.buy()
+        self.assertEqual(self.stock(), 5)
+
+    def test_sharded_slot(self):
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=20, max_capacity=30)
+        shard([self.fleet.inventory.pk], 2)
+        version = BizInventoryVersion.objects.get(machine=self.fleet.machine).version
+        # 预留 阈值 5 + 分片数 2，其余 13 件在分片上，售出时货道行不变
+        for _ in range(13):
+            self.buy()
+        self.assertEqual(self.stock(), 7)
+        self.assertFalse(BizInventoryShard.objects.filter(stock__gt=0).exists())
+        self.assertEqual(BizInventoryVersion.objects.get(machine=self.fleet.machine).version, version)
+        self.assertFalse(LogAlert.objects.exists())
+
+        # 分片为空后扣池，按总库存产生缺货预警
+        for _ in range(3):
+            self.buy()
+        self.assertEqual(self.stock(), 4)
+        self.assertIn('库存仅剩 4', LogAlert.objects.get().message)
+
+        # 补货封顶按 容量 - 分片库存
+        rebalance()
+        restock(self.fleet.staff, self.fleet.machine, self.fleet.product, 100)
+        self.assertEqual(BizInventory.objects.with_total_stock().get(pk=self.fleet.inventory.pk).total_stock, 30)
+
+    def test_version(self):
+        version = BizInventoryVersion.objects.get(machine=self.fleet.machine).version
+        self.buy()
+        inventory = BizInventory.objects.get(pk=self.fleet.inventory.pk)
+        self.assertEqual(inventory.version, version + 1)
+        # 应用写入的旧版本号被忽略
+        BizInventory.objects.filter(pk=inventory.pk).update(version=0)
+        self.assertEqual(BizInventory.objects.get(pk=inventory.pk).version, version + 1)
+        inventory.delete()
+        row = BizInventoryVersion.objects.get(machine=self.fleet.machine)
+        self.assertEqual(row.reset_version, row.version)
+
+
+class ShardingTests(TestCase):
+    """货道分片：分配与回收不改变总库存，接口读取总库存"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=30, max_capacity=40)
+
+    def total(self):
+        return BizInventory.objects.with_total_stock().get(pk=self.fleet.inventory.pk).total_stock
+
+    def test_shard_and_collapse(self):
+        self.assertEqual(shard([self.fleet.inventory.pk], 3), 1)
+        stocks = list(BizInventoryShard.objects.order_by('shard_no').values_list('stock', flat=True))
+        self.assertEqual(stocks, [8, 7, 7])  # 30 - 阈值 5 - 分片数 3 = 22
+        self.assertEqual(BizInventory.objects.get(pk=self.fleet.inventory.pk).current_stock, 8)
+        self.assertEqual(self.total(), 30)
+
+        client = APIClient()
+        url = f'/api/inventories/{self.fleet.inventory.pk}/'
+        self.assertEqual(client.get(url).json()['current_stock'], 30)
+        # 直接设置库存时分片库存并回池
+        response = client.patch(url, {'current_stock': 12}, format='json')
+        self.assertEqual(response.json()['current_stock'], 12)
+        self.assertEqual(self.total(), 12)
+        self.assertFalse(BizInventoryShard.objects.filter(stock__gt=0).exists())
+
+        shard([self.fleet.inventory.pk], 0)
+        self.assertFalse(BizInventoryShard.objects.exists())
+        self.assertEqual(BizInventory.objects.get(pk=self.fleet.inventory.pk).current_stock, 12)
+
+    def test_restock_refills_shards(self):
+        if not has_trigger('after_restock_insert'):
+            self.skipTest('测试库未安装触发器')
+        fleet = self.fleet
+        shard([fleet.inventory.pk], 3)
+        BizInventoryShard.objects.update(stock=0)
+        # 池 8 + 补货 20，再分出 28 - 阈值 5 - 分片数 3 = 20 到分片
+        restock(fleet.staff, fleet.machine, fleet.product, 20)
+        self.assertEqual(sum(BizInventoryShard.objects.values_list('stock', flat=True)), 20)
+        self.assertEqual(BizInventory.objects.get(pk=fleet.inventory.pk).current_stock, 8)
+        # 补货后的售出扣减分片，不更新货道行
+        purchase(fleet.user, fleet.machine, fleet.product, fleet.product.sell_price)
+        self.assertEqual(BizInventory.objects.get(pk=fleet.inventory.pk).current_stock, 8)
+        self.assertEqual(self.total(), 27)
+
+
+class EventSideEffectsTests(EventSideEffectsMixin, TestCase):
+    """事件模式：触发器不生效，库存、日汇总与预警由领域事件处理器完成，结果与触发器一致"""
+
+    def setUp(self):
+        super().setUp()
+        self.fleet = make_fleet()
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=6, max_capacity=10)
+
+    def stock(self):
+        return BizInventory.objects.get(pk=self.fleet.inventory.pk).current_stock
+
+    def buy(self):
+        fleet = self.fleet
+        with self.captureOnCommitCallbacks(execute=True):
+            return purchase(fleet.user, fleet.machine, fleet.product, fleet.product.sell_price)
+
+    def test_purchase_and_restock(self):
+        self.buy()
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(StatProductDaily.objects.get().order_count, 1)
+        restock(self.fleet.staff, self.fleet.machine, self.fleet.product, 100)
+        self.assertEqual(self.stock(), 10)  # 不超过最大容量
+        self.assertEqual(StatProductDaily.objects.get().restock_quantity, 100)
+
+    def test_insufficient_stock(self):
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=0)
+        with self.assertRaises(PurchaseError):
+            self.buy()
+        self.assertEqual(LogTransaction.objects.count(), 0)
+        self.assertFalse(StatProductDaily.objects.exists())
+
+    def test_alerts_coalesce(self):
+        for _ in range(6):
+            self.buy()
+        alert = LogAlert.objects.get()
+        self.assertEqual((alert.alert_type, alert.product_id), ('low_stock', self.fleet.product.id))
+        self.assertEqual(alert.occurrence_count, 2)
+        self.assertIn('已售罄', alert.message)
+        self.assertFalse(EventOutbox.objects.exists())
+
+        machine = self.fleet.machine
+        machine.status = 'fault'
+        with self.captureOnCommitCallbacks(execute=True):
+            machine.save()
+        self.assertEqual(LogAlert.objects.filter(alert_type='fault', product=None).count(), 1)
+
+    def test_sharded_slot(self):
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=20, max_capacity=30)
+        shard([self.fleet.inventory.pk], 2)
+        for _ in range(13):
+            self.buy()
+        self.assertEqual(self.stock(), 7)
+        self.assertFalse(BizInventoryShard.objects.filter(stock__gt=0).exists())
+        for _ in range(3):
+            self.buy()
+        self.assertEqual(self.stock(), 4)
+        self.assertIn('库存仅剩 4', LogAlert.objects.get().message)
+
+    def test_bulk_purchase(self):
+        fleet = self.fleet
+        item = {'user': fleet.user.id, 'machine': fleet.machine.id, 'product': fleet.product.id, 'amount': Decimal('2')}
+        with self.captureOnCommitCallbacks(execute=True):
+            results = bulk_purchase([item] * 7)
+        self.assertEqual([r['status'] for r in results].count('accepted'), 6)
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(StatProductDaily.objects.get().order_count, 6)
+        self.assertEqual(LogAlert.objects.get().occurrence_count, 2)
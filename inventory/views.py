@@ -1,100 +1,112 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.db import transaction
-from django.db.models import Sum, Count
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+from vending_system.pagination import LogCursorPagination
+from vending_system.export import ExportMixin
 from .models import BizInventory, LogTransaction, LogRestock
-from .serializers import BizInventorySerializer, LogTransactionSerializer, LogRestockSerializer
+from .serializers import (
+    BizInventorySerializer, LogTransactionSerializer, LogRestockSerializer, BulkPurchaseItemSerializer
+)
+from .services import purchase, bulk_purchase, restock, publish_stock_changed
+from .sharding import collapse
+from .planner import plan_restock, DEFAULT_HORIZON_DAYS, DEFAULT_COVER_DAYS
+from .heatmap import build_heatmap
+from users.models import SysStaff, AppUser
+from users.ledger import credit, BalanceLimitExceeded
+from monitor.models import StatProductDaily
+from monitor.rollup import record_transactions, record_restocks
+
+# 单次批量购买请求允许的最大条目数
+MAX_BULK_ITEMS = 10000
 
 class BizInventoryViewSet(viewsets.ModelViewSet):
-    queryset = BizInventory.objects.all()
+    queryset = BizInventory.objects.with_total_stock().select_related('machine', 'product').order_by('id')
     serializer_class = BizInventorySerializer
 
-class LogTransactionViewSet(viewsets.ModelViewSet):
-    queryset = LogTransaction.objects.all()
+    @action(detail=False, methods=['get'])
+    def heatmap(self, request):
+        """
+        库存热力图 API（见 inventory/heatmap.py）
+        GET /api/inventories/heatmap/?region_code=A&cells=0
+        返回 机器 × 商品 填充率矩阵（数组编码）与区域汇总，供看板一次取得全部机队库存概况；cells=0 时只返回汇总
+        """
+        region = request.query_params.get('region_code') or None
+        with_cells = request.query_params.get('cells', '1') != '0'
+        return Response({
+            'generated_at': timezone.now(),
+            'region_code': region,
+            **build_heatmap(region, with_cells=with_cells),
+        })
+
+class LogTransactionViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = LogTransaction.objects.select_related('user', 'machine', 'product')
     serializer_class = LogTransactionSerializer
+    pagination_class = LogCursorPagination
+    export_name = 'transactions'
+    export_fields = [
+        ('created_at', 'created_at'),
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('machine_code', 'machine__machine_code'),
+        ('product_name', 'product__name'),
+        ('amount', 'amount'),
+        ('cost_price', 'cost_price'),
+    ]
 
     def perform_create(self, serializer):
         """
         创建交易记录时：
-        1. 检查库存是否充足
-        2. 自动记录成本价（用于利润计算）
-        3. 扣减用户余额
-        注意：库存扣减由数据库触发器 after_transaction_insert 自动完成
+        1. 条件扣减用户余额（余额不足则失败）
+        2. 插入交易记录并记录成本价，触发器 after_transaction_insert 条件扣减库存
+        商品/用户/机器已由序列化器校验取出，无需再次查询
         """
-        from users.models import AppUser
-        from resources.models import BizProduct
-        
-        with transaction.atomic():
-            # 获取商品的成本价
-            product_id = self.request.data.get('product')
-            machine_id = self.request.data.get('machine')
-            
-            try:
-                product = BizProduct.objects.get(pk=product_id)
-                cost_price = product.cost_price
-            except BizProduct.DoesNotExist:
-                cost_price = Decimal('0')
-            
-            # 检查库存是否充足（触发器会扣减，这里只检查）
-            try:
-                inventory = BizInventory.objects.get(
-                    machine_id=machine_id,
-                    product_id=product_id
-                )
-                if inventory.current_stock <= 0:
-                    raise Exception("Inventory not sufficient")
-            except BizInventory.DoesNotExist:
-                raise Exception("Inventory record not found")
-            
-            # 保存交易记录，包含成本价
-            # 触发器会自动扣减库存
-            instance = serializer.save(cost_price=cost_price)
-            
-            # 扣减用户余额
-            try:
-                user = AppUser.objects.select_for_update().get(pk=instance.user.id)
-                if user.balance < instance.amount:
-                    raise Exception("Insufficient balance")
-                user.balance -= instance.amount
-                user.save()
-            except AppUser.DoesNotExist:
-                raise Exception("User not found")
+        data = serializer.validated_data
+        serializer.instance = purchase(
+            user=data['user'],
+            machine=data['machine'],
+            product=data['product'],
+            amount=data['amount'],
+        )
 
     def perform_destroy(self, instance):
         """
         删除交易记录时（退货）：
-        1. 恢复用户余额
+        1. 恢复用户余额（追加退款流水，见 users/ledger.py）
         2. 恢复库存（需要手动，因为触发器只处理INSERT）
         """
-        from users.models import AppUser
-        
         with transaction.atomic():
-            # 1. 恢复用户余额
+            # 1. 恢复用户余额；先锁用户再锁库存，与批量购买的加锁顺序一致
             try:
-                user = AppUser.objects.select_for_update().get(pk=instance.user.id)
-                user.balance += instance.amount
-                user.save()
+                credit(instance.user_id, instance.amount, kind='refund', transaction_id=instance.id)
             except AppUser.DoesNotExist:
                 pass
+            except BalanceLimitExceeded:
+                raise ValidationError({"error": "退款后余额超出上限"})
             
-            # 2. 恢复库存（触发器不处理DELETE，需要手动）
+            # 2. 恢复库存（触发器不处理DELETE，需要手动），退回池中，分片货道按总库存封顶
             try:
-                inventory = BizInventory.objects.select_for_update().get(
+                inventory = BizInventory.objects.with_total_stock().select_for_update().get(
                     machine=instance.machine,
                     product=instance.product
                 )
+                shard_stock = inventory.total_stock - inventory.current_stock
+                old_stock = inventory.current_stock
                 inventory.current_stock += 1
-                if inventory.current_stock > inventory.max_capacity:
-                    inventory.current_stock = inventory.max_capacity
+                if inventory.current_stock > inventory.max_capacity - shard_stock:
+                    inventory.current_stock = inventory.max_capacity - shard_stock
                 inventory.save()
+                publish_stock_changed(inventory, old_stock)
             except BizInventory.DoesNotExist:
                 pass
             
-            # 3. 删除记录
+            # 3. 回滚日汇总并删除记录
+            record_transactions([instance], sign=-1)
             instance.delete()
 
     def create(self, request, *args, **kwargs):
@@ -103,6 +115,42 @@ class LogTransactionViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        批量购买 - 离线机器恢复联网后补传缓存的销售记录
+        POST /api/transactions/bulk/
+        Body: {"items": [{"user": 1, "machine": 1, "product": 1, "amount": "3.50"}, ...]}
+        按提交顺序逐条判定，返回每条的 accepted / rejected 结果
+        """
+        items = request.data.get('items') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            return Response({"error": "items 必须为数组"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BULK_ITEMS:
+            return Response({"error": f"单次最多提交 {MAX_BULK_ITEMS} 条"}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid_items = []
+        valid_indexes = []
+        results = [None] * len(items)
+        for index, item in enumerate(items):
+            item_serializer = BulkPurchaseItemSerializer(data=item)
+            if item_serializer.is_valid():
+                valid_items.append(item_serializer.validated_data)
+                valid_indexes.append(index)
+            else:
+                results[index] = {'index': index, 'status': 'rejected', 'error': item_serializer.errors}
+
+        for index, result in zip(valid_indexes, bulk_purchase(valid_items)):
+            result['index'] = index
+            results[index] = result
+
+        accepted = sum(1 for r in results if r['status'] == 'accepted')
+        return Response({
+            'accepted': accepted,
+            'rejected': len(results) - accepted,
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """
@@ -110,7 +158,7 @@ class LogTransactionViewSet(viewsets.ModelViewSet):
         支持 period 参数: today, week, month
         """
         period = request.query_params.get('period', 'today')
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         if period == 'today':
             start_date = today
@@ -121,12 +169,14 @@ class LogTransactionViewSet(viewsets.ModelViewSet):
         else:
             start_date = today
         
-        transactions = LogTransaction.objects.filter(created_at__date__gte=start_date)
-        
-        total_revenue = transactions.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-        total_cost = transactions.aggregate(Sum('cost_price'))['cost_price__sum'] or Decimal('0')
+        # 从商品日汇总读取，不扫描交易流水
+        totals = StatProductDaily.objects.filter(date__gte=start_date).aggregate(
+            revenue=Sum('revenue'), cost=Sum('cost'), orders=Sum('order_count')
+        )
+        total_revenue = totals['revenue'] or Decimal('0')
+        total_cost = totals['cost'] or Decimal('0')
         total_profit = total_revenue - total_cost
-        order_count = transactions.count()
+        order_count = totals['orders'] or 0
         
         return Response({
             'period': period,
@@ -137,77 +187,111 @@ class LogTransactionViewSet(viewsets.ModelViewSet):
         })
 
 
-class LogRestockViewSet(viewsets.ModelViewSet):
-    queryset = LogRestock.objects.all()
+class LogRestockViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = LogRestock.objects.select_related('staff', 'machine', 'product').with_total_cost()
     serializer_class = LogRestockSerializer
+    pagination_class = LogCursorPagination
+    export_name = 'restocks'
+    export_fields = [
+        ('created_at', 'created_at'),
+        ('id', 'id'),
+        ('staff', 'staff__name'),
+        ('machine_code', 'machine__machine_code'),
+        ('product_name', 'product__name'),
+        ('quantity', 'quantity'),
+        ('unit_cost', 'unit_cost'),
+        ('total_cost', 'total_cost'),
+    ]
 
     def perform_create(self, serializer):
         """
         创建补货记录时：
-        1. 自动计算成本
+        1. 自动记录单位成本（商品进价）
         注意：库存增加由数据库触发器 after_restock_insert 自动完成
         """
-        from resources.models import BizProduct
-        
-        with transaction.atomic():
-            # 获取商品进价
-            product_id = self.request.data.get('product')
-            quantity = int(self.request.data.get('quantity', 0))
-            
-            try:
-                product = BizProduct.objects.get(pk=product_id)
-                unit_cost = product.cost_price
-                total_cost = unit_cost * quantity
-            except BizProduct.DoesNotExist:
-                unit_cost = Decimal('0')
-                total_cost = Decimal('0')
-            
-            # 保存补货记录，包含单位成本信息
-            # 触发器会自动增加库存
-            # total_cost 通过 @property 自动计算，无需存储
-            serializer.save(unit_cost=unit_cost)
+        data = serializer.validated_data
+        serializer.instance = restock(
+            staff=data['staff'],
+            machine=data['machine'],
+            product=data['product'],
+            quantity=data['quantity'],
+        )
 
     def perform_destroy(self, instance):
         """
-        删除补货记录时：回滚库存（需要手动，因为触发器只处理INSERT）
+        删除补货记录时：回滚库存（需要手动，因为触发器只处理INSERT），分片货道先把分片库存并回池
         """
         with transaction.atomic():
             try:
+                collapse(BizInventory.objects.filter(machine=instance.machine, product=instance.product).values('pk'))
                 inventory = BizInventory.objects.select_for_update().get(
                     machine=instance.machine,
                     product=instance.product
                 )
+                old_stock = inventory.current_stock
                 inventory.current_stock -= instance.quantity
                 if inventory.current_stock < 0:
                     inventory.current_stock = 0
                 inventory.save()
+                publish_stock_changed(inventory, old_stock)
             except BizInventory.DoesNotExist:
                 pass
             
+            record_restocks([instance], sign=-1)
             instance.delete()
 
+    @action(detail=False, methods=['get'])
+    def plan(self, request):
+        """
+        补货计划 API（见 inventory/planner.py）
+        GET /api/restocks/plan/?region=A&staff=1&horizon=2&cover=7
+        staff 指定时取该运维人员负责的区域
+        """
+        params = request.query_params
+        try:
+            horizon = float(params.get('horizon', DEFAULT_HORIZON_DAYS))
+            cover = float(params.get('cover', DEFAULT_COVER_DAYS))
+        except ValueError:
+            return Response({"error": "horizon 与 cover 必须为数字"}, status=400)
+        if horizon < 0 or cover <= 0:
+            return Response({"error": "horizon 不能为负，cover 必须大于 0"}, status=400)
+
+        region = params.get('region') or None
+        staff_id = params.get('staff')
+        if staff_id:
+            try:
+                region = SysStaff.objects.get(pk=staff_id).region_code
+            except (SysStaff.DoesNotExist, ValueError):
+                return Response({"error": "Staff not found"}, status=404)
+
+        return Response({
+            'generated_at': timezone.now(),
+            'horizon_days': horizon,
+            'cover_days': cover,
+            'regions': plan_restock(region=region, horizon_days=horizon, cover_days=cover),
+        })
+
     @action(detail=False, methods=['get'])
     def cost_statistics(self, request):
         """
         补货成本统计 API
         """
         period = request.query_params.get('period', 'month')
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         if period == 'week':
             start_date = today - timedelta(days=7)
         else:
             start_date = today - timedelta(days=30)
         
-        restocks = LogRestock.objects.filter(created_at__date__gte=start_date)
-        
-        # 由于 total_cost 是计算属性，需要在 Python 中求和
-        total_cost = sum(r.total_cost for r in restocks)
-        total_quantity = restocks.aggregate(Sum('quantity'))['quantity__sum'] or 0
+        # 从商品日汇总读取，补货成本在写入时已累加
+        totals = StatProductDaily.objects.filter(date__gte=start_date).aggregate(
+            cost=Sum('restock_cost'), quantity=Sum('restock_quantity'), count=Sum('restock_count')
+        )
         
         return Response({
             'period': period,
-            'total_cost': float(total_cost),
-            'total_quantity': total_quantity,
-            'restock_count': restocks.count()
+            'total_cost': float(totals['cost'] or 0),
+            'total_quantity': totals['quantity'] or 0,
+            'restock_count': totals['count'] or 0
         })
@@ -1,14 +1,16 @@
 from django.contrib import admin
-from .models import LogAlert, StatDaily
+from .models import LogAlert, StatDaily, StatProductDaily
 
 
 @admin.register(LogAlert)
 class LogAlertAdmin(admin.ModelAdmin):
-    list_display = ['id', 'machine', 'alert_type', 'message', 'created_at']
+    list_display = ['id', 'machine', 'product', 'alert_type', 'message', 'occurrence_count', 'created_at', 'last_seen_at']
     search_fields = ['machine__machine_code', 'message']
     list_filter = ['alert_type', 'machine', 'created_at']
     date_hierarchy = 'created_at'
-    readonly_fields = ['machine', 'alert_type', 'message', 'created_at']  # 只读，由触发器自动生成
+    readonly_fields = [
+        'machine', 'product', 'alert_type', 'message', 'occurrence_count', 'created_at', 'last_seen_at',
+    ]  # 只读，由触发器自动生成
 
 
 @admin.register(StatDaily)
@@ -17,3 +19,14 @@ class StatDailyAdmin(admin.ModelAdmin):
     search_fields = ['machine__machine_code']
     list_filter = ['machine', 'date']
     date_hierarchy = 'date'
+
+
+@admin.register(StatProductDaily)
+class StatProductDailyAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date', 'machine', 'product', 'revenue', 'order_count', 'restock_quantity']
+    list_filter = ['machine', 'date']
+    date_hierarchy = 'date'
+    readonly_fields = [
+        'date', 'machine', 'product', 'revenue', 'cost', 'order_count',
+        'restock_quantity', 'restock_cost', 'restock_count',
+    ]  # 只读，由交易/补货写入路径维护
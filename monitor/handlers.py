@@ -0,0 +1,114 @@
+"""
+监控事件处理器
+
+- 日汇总：TransactionCreated / RestockCreated 在写入事务中按批累加（两种模式均生效，见 rollup.py）
+- 预警：事件模式 (INVENTORY_SIDE_EFFECTS=events) 下取代触发器 monitor_low_stock / monitor_empty_stock /
+  monitor_machine_fault，提交后按批写入；判定条件、消息与合并窗口与触发器一致
+- 合并窗口 settings.ALERT_COALESCE_MINUTES：新连接上设置会话变量供触发器读取（apply_alert_window）
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Case, CharField, F, IntegerField, Value, When
+from django.utils import timezone
+from events.bus import AFTER_COMMIT, bus
+from events.domain import MachineStatusChanged, RestockCreated, StockChanged, TransactionCreated
+from inventory.services import events_mode
+from resources.models import BizProduct
+from .models import LogAlert
+from .rollup import record_restocks, record_transactions
+
+# 各数据库设置合并窗口的语句，存储过程 record_alert 读取（见迁移 0008），未设置时按 30 分钟
+ALERT_WINDOW_SQL = {
+    'mysql': "SET @alert_coalesce_minutes = %s",
+    'postgresql': "SELECT set_config('vending.alert_coalesce_minutes', %s, false)",
+}
+
+
+def apply_alert_window(sender, connection, **kwargs):
+    """connection_created 信号：把合并窗口传给触发器；SQLite 为连接上注册的函数 alert_coalesce_minutes()"""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'alert_coalesce_minutes', 0, lambda: settings.ALERT_COALESCE_MINUTES,
+        )
+    elif connection.vendor in ALERT_WINDOW_SQL:
+        with connection.cursor() as cursor:
+            cursor.execute(ALERT_WINDOW_SQL[connection.vendor], [str(settings.ALERT_COALESCE_MINUTES)])
+
+
+def record_alerts(alerts):
+    """
+    按顺序写入预警，alerts: [(machine_id, product_id, alert_type, message)]
+    同一 (机器, 商品, 类型) 在窗口内已有记录时累加最近一条，否则新建；整批一次查询、一条分组更新、一次批量插入
+    """
+    if not alerts:
+        return
+    now = timezone.now()
+    keys = {(m, p, t) for m, p, t, _ in alerts}
+    latest = {}
+    for pk, m, p, t in (
+        LogAlert.objects.filter(
+            machine_id__in={m for m, _, _ in keys}, alert_type__in={t for _, _, t in keys},
+            last_seen_at__gte=now - timedelta(minutes=settings.ALERT_COALESCE_MINUTES),
+        ).order_by('last_seen_at', 'pk').values_list('pk', 'machine_id', 'product_id', 'alert_type')
+    ):
+        if (m, p, t) in keys:
+            latest[(m, p, t)] = pk
+
+    increments, messages, created = defaultdict(int), {}, {}
+    for m, p, t, message in alerts:
+        key = (m, p, t)
+        if key in latest:
+            increments[latest[key]] += 1
+            messages[latest[key]] = message
+        elif key in created:
+            created[key].occurrence_count += 1
+            created[key].message = message
+        else:
+            created[key] = LogAlert(
+                machine_id=m, product_id=p, alert_type=t, message=message, last_seen_at=now,
+            )
+
+    if increments:
+        LogAlert.objects.filter(pk__in=list(increments)).update(
+            occurrence_count=F('occurrence_count') + Case(
+                *[When(pk=pk, then=Value(n)) for pk, n in increments.items()], output_field=IntegerField(),
+            ),
+            message=Case(
+                *[When(pk=pk, then=Value(message)) for pk, message in messages.items()], output_field=CharField(),
+            ),
+            last_seen_at=now,
+        )
+    LogAlert.objects.bulk_create(created.values())
+
+
+def on_stock_changed(events):
+    """库存跌破缺货阈值时缺货预警，降为 0 时售罄预警"""
+    thresholds = dict(
+        BizProduct.objects.filter(pk__in={e.product_id for e in events}).values_list('pk', 'low_stock_threshold')
+    )
+    alerts = []
+    for e in events:
+        if e.new_stock >= e.old_stock:
+            continue
+        threshold = thresholds.get(e.product_id)
+        if threshold is not None and e.new_stock < threshold <= e.old_stock:
+            alerts.append((e.machine_id, e.product_id, 'low_stock',
+                           f'缺货预警: 商品ID {e.product_id} 库存仅剩 {e.new_stock}'))
+        if e.new_stock == 0:
+            alerts.append((e.machine_id, e.product_id, 'low_stock', f'紧急预警: 商品ID {e.product_id} 已售罄!'))
+    record_alerts(alerts)
+
+
+def on_machine_status_changed(events):
+    """机器由正常变为故障时故障预警"""
+    record_alerts([
+        (e.machine_id, None, 'fault', f'故障预警: 机器 {e.machine_code} 发生故障')
+        for e in events if e.old_status == 'normal' and e.new_status == 'fault'
+    ])
+
+
+bus.subscribe(TransactionCreated, record_transactions)
+bus.subscribe(RestockCreated, record_restocks)
+bus.subscribe(StockChanged, on_stock_changed, phase=AFTER_COMMIT, when=events_mode)
+bus.subscribe(MachineStatusChanged, on_machine_status_changed, phase=AFTER_COMMIT, when=events_mode)
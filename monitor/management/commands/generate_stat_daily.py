@@ -0,0 +1,26 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from monitor.services import generate_daily_stats
+
+
+class Command(BaseCommand):
+    help = '生成日结统计 (stat_daily)，可指定日期区间用于每日定时任务或历史回填'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='起始日期 YYYY-MM-DD（含），默认今天')
+        parser.add_argument('--end', help='结束日期 YYYY-MM-DD（含），默认同起始日期')
+
+    def handle(self, *args, **options):
+        try:
+            start = (datetime.strptime(options['start'], '%Y-%m-%d').date()
+                     if options['start'] else timezone.localdate())
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start
+        except ValueError:
+            raise CommandError('日期格式错误，应为 YYYY-MM-DD')
+        if end < start:
+            raise CommandError('结束日期不能早于开始日期')
+        machine_count, created_count = generate_daily_stats(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f'已生成 {start} ~ {end} 的日结统计：机器 {machine_count} 台，新增 {created_count} 条'
+        ))
@@ -0,0 +1,20 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from monitor.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = '从交易/补货日志重建商品日汇总 (stat_product_daily)，用于首次回填或校正'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='起始日期 YYYY-MM-DD（含），默认不限')
+        parser.add_argument('--end', help='结束日期 YYYY-MM-DD（含），默认不限')
+
+    def handle(self, *args, **options):
+        try:
+            start = options['start'] and datetime.strptime(options['start'], '%Y-%m-%d').date()
+            end = options['end'] and datetime.strptime(options['end'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('日期格式错误，应为 YYYY-MM-DD')
+        count = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 条商品日汇总'))
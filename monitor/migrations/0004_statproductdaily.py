@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_remove_statdaily_total_profit'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatProductDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='营收')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='销售成本')),
+                ('order_count', models.IntegerField(default=0, verbose_name='订单数')),
+                ('restock_quantity', models.IntegerField(default=0, verbose_name='补货数量')),
+                ('restock_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='补货成本')),
+                ('restock_count', models.IntegerField(default=0, verbose_name='补货次数')),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_stats', to='resources.bizmachine', verbose_name='机器')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='resources.bizproduct', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': '商品日汇总',
+                'verbose_name_plural': '商品日汇总',
+                'db_table': 'stat_product_daily',
+                'unique_together': {('date', 'machine', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_statproductdaily'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logalert',
+            index=models.Index(fields=['created_at'], name='log_alert_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logalert',
+            index=models.Index(fields=['machine', 'created_at'], name='log_alert_mach_created_idx'),
+        ),
+    ]
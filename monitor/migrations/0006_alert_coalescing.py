@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:43
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from vending_system.db.operations import VendorRunSQL
+
+# 同一 (机器, 商品, 类型) 距上次发生不超过该分钟数时合并为一条
+ALERT_COALESCE_MINUTES = 30
+
+RECORD_ALERT_PROCEDURE = f"""
+CREATE PROCEDURE record_alert(
+    IN p_machine BIGINT, IN p_product BIGINT, IN p_type VARCHAR(20), IN p_message VARCHAR(500)
+)
+BEGIN
+    UPDATE log_alert
+    SET occurrence_count = occurrence_count + 1, last_seen_at = NOW(), message = p_message
+    WHERE machine_id = p_machine AND product_id <=> p_product AND alert_type = p_type
+      AND last_seen_at >= NOW() - INTERVAL {ALERT_COALESCE_MINUTES} MINUTE
+    ORDER BY last_seen_at DESC
+    LIMIT 1;
+    IF ROW_COUNT() = 0 THEN
+        INSERT INTO log_alert (machine_id, product_id, alert_type, message, occurrence_count, created_at, last_seen_at)
+        VALUES (p_machine, p_product, p_type, p_message, 1, NOW(), NOW());
+    END IF;
+END;
+"""
+
+# 只在库存下降时读取商品阈值，补货等其他更新不多做查询
+LOW_STOCK_TRIGGER = """
+CREATE TRIGGER monitor_low_stock
+AFTER UPDATE ON biz_inventory
+FOR EACH ROW
+BEGIN
+    DECLARE threshold INT;
+    IF @skip_inventory_trigger IS NULL AND NEW.current_stock < OLD.current_stock THEN
+        SELECT low_stock_threshold INTO threshold FROM biz_product WHERE id = NEW.product_id;
+        IF NEW.current_stock < threshold AND OLD.current_stock >= threshold THEN
+            CALL record_alert(NEW.machine_id, NEW.product_id, 'low_stock',
+                CONCAT('缺货预警: 商品ID ', NEW.product_id, ' 库存仅剩 ', NEW.current_stock));
+        END IF;
+    END IF;
+END;
+"""
+
+EMPTY_STOCK_TRIGGER = """
+CREATE TRIGGER monitor_empty_stock
+AFTER UPDATE ON biz_inventory
+FOR EACH ROW
+BEGIN
+    IF @skip_inventory_trigger IS NULL AND NEW.current_stock = 0 AND OLD.current_stock > 0 THEN
+        CALL record_alert(NEW.machine_id, NEW.product_id, 'low_stock',
+            CONCAT('紧急预警: 商品ID ', NEW.product_id, ' 已售罄!'));
+    END IF;
+END;
+"""
+
+MACHINE_FAULT_TRIGGER = """
+CREATE TRIGGER monitor_machine_fault
+AFTER UPDATE ON biz_machine
+FOR EACH ROW
+BEGIN
+    IF NEW.status = 'fault' AND OLD.status = 'normal' THEN
+        CALL record_alert(NEW.id, NULL, 'fault', CONCAT('故障预警: 机器 ', NEW.machine_code, ' 发生故障'));
+    END IF;
+END;
+"""
+
+# 回滚时恢复上一版触发器定义
+_previous = importlib.import_module('inventory.migrations.0008_inventory_triggers_skip_flag')
+
+PREVIOUS_MACHINE_FAULT_TRIGGER = """
+CREATE TRIGGER monitor_machine_fault
+AFTER UPDATE ON biz_machine
+FOR EACH ROW
+BEGIN
+    IF NEW.status = 'fault' AND OLD.status = 'normal' THEN
+        INSERT INTO log_alert (machine_id, alert_type, message, created_at)
+        VALUES (NEW.id, 'fault',
+                CONCAT('故障预警: 机器 ', NEW.machine_code, ' 发生故障'),
+                NOW());
+    END IF;
+END;
+"""
+
+
+def backfill_last_seen(apps, schema_editor):
+    LogAlert = apps.get_model('monitor', 'LogAlert')
+    LogAlert.objects.filter(last_seen_at__isnull=True).update(last_seen_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_log_time_indexes'),
+        ('resources', '0003_bizproduct_low_stock_threshold'),
+        ('inventory', '0010_inventory_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logalert',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最后发生时间'),
+        ),
+        migrations.AddField(
+            model_name='logalert',
+            name='occurrence_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='发生次数'),
+        ),
+        migrations.AddField(
+            model_name='logalert',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='resources.bizproduct', verbose_name='商品'),
+        ),
+        migrations.AddIndex(
+            model_name='logalert',
+            index=models.Index(fields=['machine', 'product', 'alert_type', 'last_seen_at'], name='log_alert_coalesce_idx'),
+        ),
+        migrations.RunPython(backfill_last_seen, migrations.RunPython.noop),
+        VendorRunSQL(
+            'mysql',
+            sql=[
+                "DROP PROCEDURE IF EXISTS record_alert;",
+                RECORD_ALERT_PROCEDURE,
+                "DROP TRIGGER IF EXISTS monitor_low_stock;",
+                LOW_STOCK_TRIGGER,
+                "DROP TRIGGER IF EXISTS monitor_empty_stock;",
+                EMPTY_STOCK_TRIGGER,
+                "DROP TRIGGER IF EXISTS monitor_machine_fault;",
+                MACHINE_FAULT_TRIGGER,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS monitor_low_stock;",
+                _previous.LOW_STOCK_TRIGGER.format(guard=_previous.GUARD),
+                "DROP TRIGGER IF EXISTS monitor_empty_stock;",
+                _previous.EMPTY_STOCK_TRIGGER.format(guard=_previous.GUARD),
+                "DROP TRIGGER IF EXISTS monitor_machine_fault;",
+                PREVIOUS_MACHINE_FAULT_TRIGGER,
+                "DROP PROCEDURE IF EXISTS record_alert;",
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+import importlib
+
+from django.db import migrations
+from vending_system.db.operations import VendorRunSQL
+
+_coalescing = importlib.import_module('monitor.migrations.0006_alert_coalescing')
+_portable = importlib.import_module('inventory.migrations.0011_portable_triggers')
+
+MACHINE_FAULT_TRIGGER = """
+CREATE TRIGGER monitor_machine_fault
+AFTER UPDATE ON biz_machine
+FOR EACH ROW
+BEGIN
+    IF @skip_inventory_trigger IS NULL AND NEW.status = 'fault' AND OLD.status = 'normal' THEN
+        CALL record_alert(NEW.id, NULL, 'fault', CONCAT('故障预警: 机器 ', NEW.machine_code, ' 发生故障'));
+    END IF;
+END;
+"""
+
+SQLITE_MACHINE_FAULT_TRIGGER = f"""
+CREATE TRIGGER monitor_machine_fault
+AFTER UPDATE OF status ON biz_machine
+FOR EACH ROW WHEN {_portable.SQLITE_NOT_SKIPPED} AND NEW.status = 'fault' AND OLD.status = 'normal'
+BEGIN
+    {_portable.sqlite_record_alert('NEW.id', 'NULL', 'fault',
+                                   "'故障预警: 机器 ' || NEW.machine_code || ' 发生故障'")}
+END;
+"""
+
+PG_MACHINE_FAULT_TRIGGER = _portable.pg_trigger('monitor_machine_fault', 'AFTER UPDATE', 'biz_machine', f"""
+    IF {_portable.PG_NOT_SKIPPED} AND NEW.status = 'fault' AND OLD.status = 'normal' THEN
+        PERFORM record_alert(NEW.id, NULL, 'fault', '故障预警: 机器 ' || NEW.machine_code || ' 发生故障');
+    END IF;
+    RETURN NULL;
+""")
+
+
+def _previous(statements, marker):
+    return [sql for sql in statements if marker in sql]
+
+
+class Migration(migrations.Migration):
+    """
+    故障预警触发器也受跳过标志控制：领域事件模式（INVENTORY_SIDE_EFFECTS=events）下
+    连接始终设置跳过标志，故障预警改由 MachineStatusChanged 事件的处理器产生，不再重复报警。
+    """
+
+    dependencies = [
+        ('monitor', '0006_alert_coalescing'),
+        ('inventory', '0012_inventory_shards'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'mysql',
+            sql=["DROP TRIGGER IF EXISTS monitor_machine_fault;", MACHINE_FAULT_TRIGGER],
+            reverse_sql=["DROP TRIGGER IF EXISTS monitor_machine_fault;", _coalescing.MACHINE_FAULT_TRIGGER],
+        ),
+        VendorRunSQL(
+            'sqlite',
+            sql=["DROP TRIGGER IF EXISTS monitor_machine_fault;", SQLITE_MACHINE_FAULT_TRIGGER],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS monitor_machine_fault;",
+                *_previous(_portable.SQLITE_TRIGGERS, 'CREATE TRIGGER monitor_machine_fault'),
+            ],
+        ),
+        VendorRunSQL(
+            'postgresql',
+            sql=PG_MACHINE_FAULT_TRIGGER,
+            reverse_sql=_previous(_portable.PG_TRIGGERS, 'CREATE OR REPLACE FUNCTION trg_monitor_machine_fault()'),
+        ),
+    ]
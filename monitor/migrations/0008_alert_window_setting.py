@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:36
+
+import importlib
+
+from django.db import migrations, models
+from vending_system.db.operations import VendorRunSQL
+
+_coalescing = importlib.import_module('monitor.migrations.0006_alert_coalescing')
+_fault = importlib.import_module('monitor.migrations.0007_machine_fault_skip_flag')
+_portable = importlib.import_module('inventory.migrations.0011_portable_triggers')
+
+# 连接上未设置合并窗口时（非 Django 客户端）的默认值
+DEFAULT_MINUTES = _coalescing.ALERT_COALESCE_MINUTES
+
+
+def _replace(sql, old, new):
+    assert old in sql, old
+    return sql.replace(old, new)
+
+
+RECORD_ALERT_PROCEDURE = _replace(
+    _coalescing.RECORD_ALERT_PROCEDURE,
+    f'INTERVAL {DEFAULT_MINUTES} MINUTE',
+    f'INTERVAL COALESCE(@alert_coalesce_minutes, {DEFAULT_MINUTES}) MINUTE',
+)
+
+PG_RECORD_ALERT = _replace(
+    _portable.PG_TRIGGERS[0],
+    f"INTERVAL '{DEFAULT_MINUTES} minutes'",
+    "make_interval(mins => COALESCE("
+    f"NULLIF(current_setting('vending.alert_coalesce_minutes', true), '')::int, {DEFAULT_MINUTES}))",
+)
+
+SQLITE_WINDOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || alert_coalesce_minutes() || ' minutes')"
+SQLITE_PREVIOUS_TRIGGERS = [
+    *[sql for sql in _portable.SQLITE_TRIGGERS
+      if 'CREATE TRIGGER monitor_low_stock' in sql or 'CREATE TRIGGER monitor_empty_stock' in sql],
+    _fault.SQLITE_MACHINE_FAULT_TRIGGER,
+]
+SQLITE_TRIGGERS = [_replace(sql, _portable.SQLITE_WINDOW, SQLITE_WINDOW) for sql in SQLITE_PREVIOUS_TRIGGERS]
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {name};" for name in ('monitor_low_stock', 'monitor_empty_stock', 'monitor_machine_fault')
+]
+
+
+class Migration(migrations.Migration):
+    """
+    报警合并窗口改由 settings.ALERT_COALESCE_MINUTES 配置：record_alert 读取连接上的设置
+    （MySQL @alert_coalesce_minutes、PostgreSQL vending.alert_coalesce_minutes、SQLite alert_coalesce_minutes()，
+    见 monitor/handlers.py apply_alert_window），未设置时按 30 分钟
+    """
+
+    dependencies = [
+        ('monitor', '0007_machine_fault_skip_flag'),
+        ('resources', '0003_bizproduct_low_stock_threshold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logalert',
+            index=models.Index(fields=['last_seen_at'], name='log_alert_last_seen_idx'),
+        ),
+        VendorRunSQL(
+            'mysql',
+            sql=["DROP PROCEDURE IF EXISTS record_alert;", RECORD_ALERT_PROCEDURE],
+            reverse_sql=["DROP PROCEDURE IF EXISTS record_alert;", _coalescing.RECORD_ALERT_PROCEDURE],
+        ),
+        VendorRunSQL(
+            'sqlite',
+            sql=SQLITE_DROP + SQLITE_TRIGGERS,
+            reverse_sql=SQLITE_DROP + SQLITE_PREVIOUS_TRIGGERS,
+        ),
+        VendorRunSQL('postgresql', sql=[PG_RECORD_ALERT], reverse_sql=[_portable.PG_TRIGGERS[0]]),
+    ]
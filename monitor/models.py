@@ -1,9 +1,12 @@
 from django.db import models
-from resources.models import BizMachine
+from resources.models import BizMachine, BizProduct
 
 
 class LogAlert(models.Model):
-    """报警日志 - 系统自动生成（由数据库触发器写入）"""
+    """
+    报警日志 - 系统自动生成（由数据库触发器经存储过程 record_alert 写入）
+    同一 (机器, 商品, 类型) 在合并窗口内重复发生时不新增记录，只累加 occurrence_count 并更新 last_seen_at
+    """
     ALERT_TYPE_CHOICES = [
         ('low_stock', '缺货'),
         ('fault', '故障'),
@@ -15,14 +18,32 @@ class LogAlert(models.Model):
         verbose_name='机器',
         related_name='alerts'
     )
+    product = models.ForeignKey(
+        BizProduct,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        verbose_name='商品',
+        related_name='alerts'
+    )  # 故障报警为空
     alert_type = models.CharField('类型', max_length=20, choices=ALERT_TYPE_CHOICES, default='low_stock')
     message = models.CharField('报警内容', max_length=500)
+    occurrence_count = models.PositiveIntegerField('发生次数', default=1)
     created_at = models.DateTimeField('报警时间', auto_now_add=True)
+    last_seen_at = models.DateTimeField('最后发生时间', null=True, blank=True)
 
     class Meta:
         db_table = 'log_alert'
         verbose_name = '报警日志'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['created_at'], name='log_alert_created_idx'),
+            models.Index(fields=['machine', 'created_at'], name='log_alert_mach_created_idx'),
+            # 合并时按 (机器, 商品, 类型) 查找窗口内最近一条
+            models.Index(fields=['machine', 'product', 'alert_type', 'last_seen_at'], name='log_alert_coalesce_idx'),
+            # 报警推送按 last_seen_at 读取重复发生的报警（见 monitor/stream.py）
+            models.Index(fields=['last_seen_at'], name='log_alert_last_seen_idx'),
+        ]
 
     def __str__(self):
         return f'{self.machine.machine_code} - {self.alert_type} - {self.message}'
@@ -56,3 +77,35 @@ class StatDaily(models.Model):
     def __str__(self):
         return f'{self.date} - {self.machine.machine_code}'
 
+
+
+class StatProductDaily(models.Model):
+    """按 日期 × 机器 × 商品 的增量汇总表，交易/补货写入时同步累加，供统计接口直接读取"""
+    date = models.DateField('日期')
+    machine = models.ForeignKey(
+        BizMachine,
+        on_delete=models.CASCADE,
+        verbose_name='机器',
+        related_name='product_daily_stats'
+    )
+    product = models.ForeignKey(
+        BizProduct,
+        on_delete=models.CASCADE,
+        verbose_name='商品',
+        related_name='daily_stats'
+    )
+    revenue = models.DecimalField('营收', max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField('销售成本', max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField('订单数', default=0)
+    restock_quantity = models.IntegerField('补货数量', default=0)
+    restock_cost = models.DecimalField('补货成本', max_digits=14, decimal_places=2, default=0)
+    restock_count = models.IntegerField('补货次数', default=0)
+
+    class Meta:
+        db_table = 'stat_product_daily'
+        verbose_name = '商品日汇总'
+        verbose_name_plural = verbose_name
+        unique_together = ['date', 'machine', 'product']
+
+    def __str__(self):
+        return f'{self.date} - {self.machine_id} - {self.product_id}'
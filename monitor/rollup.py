@@ -0,0 +1,145 @@
+"""
+商品日汇总 (stat_product_daily) 的增量维护
+
+交易 / 补货写入时由 TransactionCreated / RestockCreated 事件的处理器（见 handlers.py）、
+删除时由删除路径在同一事务内调用 record_transactions / record_restocks，
+按 (本地日期, 机器, 商品) 聚合后累加到汇总行；统计接口只读汇总表，不再扫描日志表。
+rebuild 用于首次回填或校正历史数据。
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import StatProductDaily
+
+SALE_FIELDS = ('revenue', 'cost', 'order_count')
+RESTOCK_FIELDS = ('restock_quantity', 'restock_cost', 'restock_count')
+ROLLUP_FIELDS = SALE_FIELDS + RESTOCK_FIELDS
+
+
+def _zero():
+    return {'revenue': Decimal('0'), 'cost': Decimal('0'), 'order_count': 0,
+            'restock_quantity': 0, 'restock_cost': Decimal('0'), 'restock_count': 0}
+
+
+def record_transactions(transactions, sign=1):
+    """累加交易（sign=-1 表示退货回滚）"""
+    deltas = defaultdict(_zero)
+    for t in transactions:
+        delta = deltas[(timezone.localdate(t.created_at), t.machine_id, t.product_id)]
+        delta['revenue'] += sign * t.amount
+        delta['cost'] += sign * t.cost_price
+        delta['order_count'] += sign
+    apply_deltas(deltas)
+
+
+def record_restocks(restocks, sign=1):
+    """累加补货（sign=-1 表示删除补货记录）"""
+    deltas = defaultdict(_zero)
+    for r in restocks:
+        delta = deltas[(timezone.localdate(r.created_at), r.machine_id, r.product_id)]
+        delta['restock_quantity'] += sign * r.quantity
+        delta['restock_cost'] += sign * r.total_cost
+        delta['restock_count'] += sign
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """deltas: {(date, machine_id, product_id): {字段: 增量}}，不存在的汇总行自动创建"""
+    if not deltas:
+        return
+    if connection.vendor == 'mysql':
+        _apply_mysql(deltas)
+    else:
+        _apply_generic(deltas)
+
+
+def _apply_mysql(deltas):
+    """单条 INSERT ... ON DUPLICATE KEY UPDATE 完成全部累加"""
+    table = StatProductDaily._meta.db_table
+    columns = ('date', 'machine_id', 'product_id') + ROLLUP_FIELDS
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        + ', '.join([row_sql] * len(deltas))
+        + " ON DUPLICATE KEY UPDATE "
+        + ', '.join(f'{f} = {f} + VALUES({f})' for f in ROLLUP_FIELDS)
+    )
+    params = []
+    for key, delta in deltas.items():
+        params.extend(key)
+        params.extend(delta[f] for f in ROLLUP_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _apply_generic(deltas):
+    """先条件累加，不存在则创建；并发创建冲突时回退为累加"""
+    for (date, machine_id, product_id), delta in deltas.items():
+        rows = StatProductDaily.objects.filter(date=date, machine_id=machine_id, product_id=product_id)
+        changes = {f: F(f) + v for f, v in delta.items() if v}
+        if rows.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                StatProductDaily.objects.create(
+                    date=date, machine_id=machine_id, product_id=product_id, **delta
+                )
+        except IntegrityError:
+            rows.update(**changes)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    从交易（含归档）/补货日志重新计算 [start_date, end_date] 的汇总（GROUP BY 查询 + 批量写入）
+    返回写入的汇总行数
+    """
+    from inventory.models import LogTransaction, LogTransactionArchive, LogRestock, RESTOCK_TOTAL_COST
+
+    def in_range(qs):
+        # 半开时间区间过滤，可走 created_at 索引
+        if start_date:
+            qs = qs.filter(created_at__gte=_day_start(start_date))
+        if end_date:
+            qs = qs.filter(created_at__lt=_day_start(end_date + timedelta(days=1)))
+        return qs.annotate(date=TruncDate('created_at')).values('date', 'machine_id', 'product_id')
+
+    deltas = defaultdict(_zero)
+    # 已归档月份的交易在归档表中，两张表合并计算
+    for source in (LogTransaction.objects, LogTransactionArchive.objects):
+        sales = in_range(source).annotate(
+            s_revenue=Sum('amount'), s_cost=Sum('cost_price'), s_orders=Count('id'),
+        )
+        for row in sales:
+            delta = deltas[(row['date'], row['machine_id'], row['product_id'])]
+            delta['revenue'] += row['s_revenue']
+            delta['cost'] += row['s_cost']
+            delta['order_count'] += row['s_orders']
+    restocks = in_range(LogRestock.objects).annotate(
+        s_quantity=Sum('quantity'), s_cost=Sum(RESTOCK_TOTAL_COST), s_count=Count('id'),
+    )
+    for row in restocks:
+        delta = deltas[(row['date'], row['machine_id'], row['product_id'])]
+        delta.update(restock_quantity=row['s_quantity'], restock_cost=row['s_cost'],
+                     restock_count=row['s_count'])
+
+    with transaction.atomic():
+        existing = StatProductDaily.objects.all()
+        if start_date:
+            existing = existing.filter(date__gte=start_date)
+        if end_date:
+            existing = existing.filter(date__lte=end_date)
+        existing.delete()
+        StatProductDaily.objects.bulk_create(
+            [StatProductDaily(date=date, machine_id=machine_id, product_id=product_id, **delta)
+             for (date, machine_id, product_id), delta in deltas.items()],
+            batch_size=1000,
+        )
+    return len(deltas)
@@ -1,16 +1,18 @@
 from rest_framework import serializers
+from vending_system.serializers import SparseModelSerializer
 from .models import LogAlert, StatDaily
 
 
-class LogAlertSerializer(serializers.ModelSerializer):
+class LogAlertSerializer(SparseModelSerializer):
     machine_code = serializers.CharField(source='machine.machine_code', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True, default=None)
 
     class Meta:
         model = LogAlert
         fields = '__all__'
 
 
-class StatDailySerializer(serializers.ModelSerializer):
+class StatDailySerializer(SparseModelSerializer):
     machine_code = serializers.CharField(source='machine.machine_code', read_only=True)
     total_profit = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
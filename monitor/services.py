@@ -0,0 +1,84 @@
+"""
+日结统计生成
+
+按日期区间集合式生成 stat_daily：交易（热表、归档表）与报警分别一条 GROUP BY (日期, 机器) 查询，
+再一次性批量 upsert，查询次数与机器数、天数无关。
+"""
+from datetime import datetime, timedelta
+from django.db import connection
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from resources.models import BizMachine
+from inventory.models import LogTransaction, LogTransactionArchive
+from .models import LogAlert, StatDaily
+
+STAT_FIELDS = ['total_revenue', 'total_cost', 'order_count', 'alert_count']
+
+
+def _day_range(start_date, end_date):
+    """[start_date, end_date] 对应的半开时间区间 [start_dt, end_dt)"""
+    start_dt = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    end_dt = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return start_dt, end_dt
+
+
+def generate_daily_stats(start_date, end_date=None):
+    """
+    生成 [start_date, end_date] 每天每台机器的日结统计（已存在则覆盖）
+    返回 (处理的机器数, 新增记录数)
+    """
+    end_date = end_date or start_date
+    start_dt, end_dt = _day_range(start_date, end_date)
+
+    # 已归档月份的交易在归档表中，两张表合并计算
+    sales_map = {}
+    for source in (LogTransaction.objects, LogTransactionArchive.objects):
+        sales = (
+            source.filter(created_at__gte=start_dt, created_at__lt=end_dt)
+            .annotate(date=TruncDate('created_at'))
+            .values('date', 'machine_id')
+            .annotate(revenue=Sum('amount'), cost=Sum('cost_price'), orders=Count('id'))
+        )
+        for row in sales:
+            total = sales_map.setdefault((row['date'], row['machine_id']), {'revenue': 0, 'cost': 0, 'orders': 0})
+            for field in total:
+                total[field] += row[field]
+    alerts = (
+        LogAlert.objects.filter(created_at__gte=start_dt, created_at__lt=end_dt)
+        .annotate(date=TruncDate('created_at'))
+        .values('date', 'machine_id')
+        .annotate(alerts=Sum('occurrence_count'))  # 合并的报警按发生次数计
+    )
+    alert_map = {(row['date'], row['machine_id']): row['alerts'] for row in alerts}
+
+    machine_ids = list(BizMachine.objects.values_list('id', flat=True))
+    existing = StatDaily.objects.filter(date__gte=start_date, date__lte=end_date).count()
+
+    stats = []
+    day = start_date
+    while day <= end_date:
+        for machine_id in machine_ids:
+            sale = sales_map.get((day, machine_id), {})
+            stats.append(StatDaily(
+                date=day,
+                machine_id=machine_id,
+                total_revenue=sale.get('revenue') or 0,
+                total_cost=sale.get('cost') or 0,
+                order_count=sale.get('orders') or 0,
+                alert_count=alert_map.get((day, machine_id), 0),
+            ))
+        day += timedelta(days=1)
+
+    # MySQL 的 ON DUPLICATE KEY UPDATE 不能指定冲突列
+    unique_fields = (
+        ['date', 'machine'] if connection.features.supports_update_conflicts_with_target else None
+    )
+    StatDaily.objects.bulk_create(
+        stats,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=STAT_FIELDS,
+    )
+    return len(machine_ids), len(stats) - existing
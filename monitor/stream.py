@@ -0,0 +1,261 @@
+"""
+报警实时推送 (Server-Sent Events)
+
+每个进程只有一个后台轮询线程，按 id 高水位读取新报警并分发给所有已连接的客户端，
+查询次数与连接数无关，没有客户端时不查询。
+报警由触发器在业务事务中写入，自增 id 的提交顺序可能与大小顺序不一致，
+因此每次回看高水位之前 ALERT_GAP_WINDOW 个 id，并按已推送的 id 去重，避免漏推。
+
+合并窗口内重复发生的报警不新增记录，只累加 occurrence_count 并更新 last_seen_at：
+轮询同时按 last_seen_at 高水位（回看 ALERT_UPDATE_LOOKBACK 秒）读取发生次数变化的报警，
+以 alert_update 事件推送，按 (id, 发生次数) 去重。
+
+GET /api/alerts/stream/?region=A&machine=1&type=low_stock
+    event: alert         新报警，带 id；断线重连时浏览器自动带上 Last-Event-ID，先补发其后的新报警
+    event: alert_update  已推送报警的重复发生，不带 id，不推进 Last-Event-ID，断线期间的更新不补发
+"""
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from django.db import close_old_connections
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from .models import LogAlert
+
+ALERT_POLL_INTERVAL = 1.0   # 秒
+ALERT_GAP_WINDOW = 200      # 回看的 id 个数
+ALERT_BATCH_SIZE = 500      # 每次轮询 / 补发的最大条数
+ALERT_UPDATE_LOOKBACK = 5   # 秒，last_seen_at 写入到事务提交之间的时差
+KEEPALIVE_INTERVAL = 15     # 秒，防止代理断开空闲连接
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+ALERT_FIELDS = (
+    'id', 'machine_id', 'machine__machine_code', 'machine__region_code', 'product_id',
+    'alert_type', 'message', 'occurrence_count', 'created_at', 'last_seen_at',
+)
+
+
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'machine': row['machine_id'],
+        'machine_code': row['machine__machine_code'],
+        'region_code': row['machine__region_code'],
+        'product': row['product_id'],
+        'alert_type': row['alert_type'],
+        'message': row['message'],
+        'occurrence_count': row['occurrence_count'],
+        'created_at': row['created_at'].isoformat(),
+        'last_seen_at': row['last_seen_at'].isoformat() if row['last_seen_at'] else None,
+    }
+
+
+class Subscriber:
+    """一个 SSE 连接：过滤条件 + 所在事件循环中的队列"""
+
+    def __init__(self, loop, region=None, machine=None, alert_type=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.region = region
+        self.machine = machine
+        self.alert_type = alert_type
+        self.overflowed = False
+
+    def matches(self, alert):
+        return (
+            (self.region is None or alert['region_code'] == self.region)
+            and (self.machine is None or alert['machine'] == self.machine)
+            and (self.alert_type is None or alert['alert_type'] == self.alert_type)
+        )
+
+    def offer(self, item):
+        """在订阅者的事件循环中执行，item 为 (事件名, 报警)；客户端跟不上时标记溢出，由连接结束后重连补发"""
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class AlertBroadcaster:
+    """进程内共享的报警轮询与分发"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._high_water = None
+        self._seen = set()
+        self._seen_at = None
+        self._occurrences = {}
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='alert-broadcaster', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # 没有连接时不查询，高水位在下次有连接时重新初始化
+                self._high_water = None
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            try:
+                self.poll()
+            except Exception:
+                # 数据库暂时不可用时下个周期重试
+                pass
+            finally:
+                close_old_connections()
+            self._wakeup.wait(ALERT_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def poll(self):
+        """读取高水位之后的新报警与重复发生的报警并分发，返回分发的条数"""
+        if self._high_water is None:
+            water = LogAlert.objects.aggregate(last=Max('id'), seen_at=Max('last_seen_at'))
+            self._high_water = water['last'] or 0
+            self._seen_at = water['seen_at']
+            # 窗口内已有的报警视为已推送
+            self._seen = set(
+                LogAlert.objects.filter(id__gt=self._high_water - ALERT_GAP_WINDOW).values_list('id', flat=True)
+            )
+            self._occurrences = {}
+            if self._seen_at is not None:
+                self._occurrences = dict(
+                    LogAlert.objects.filter(last_seen_at__gte=self._seen_at - timedelta(seconds=ALERT_UPDATE_LOOKBACK))
+                    .values_list('id', 'occurrence_count')
+                )
+            return 0
+
+        floor = self._high_water - ALERT_GAP_WINDOW
+        rows = list(
+            LogAlert.objects.filter(id__gt=floor).order_by('id').values(*ALERT_FIELDS)[:ALERT_BATCH_SIZE]
+        )
+        alerts = [_serialize(row) for row in rows if row['id'] not in self._seen]
+        for alert in alerts:
+            self._seen.add(alert['id'])
+        if rows:
+            self._high_water = max(self._high_water, rows[-1]['id'])
+        floor = self._high_water - ALERT_GAP_WINDOW
+        self._seen = {i for i in self._seen if i > floor}
+
+        items = [('alert', alert) for alert in alerts]
+        items += [('alert_update', alert) for alert in self._poll_updates(alerts)]
+        if items:
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                for item in items:
+                    if subscriber.matches(item[1]):
+                        try:
+                            subscriber.loop.call_soon_threadsafe(subscriber.offer, item)
+                        except RuntimeError:
+                            # 事件循环已关闭（连接异常结束）
+                            self.unsubscribe(subscriber)
+                            break
+        return len(items)
+
+    def _poll_updates(self, new_alerts):
+        """
+        读取 last_seen_at 高水位附近发生次数变化的报警，new_alerts 为本次作为新报警推送的，不再重复推送；
+        回看窗口内 id 尚未推送的报警留给新报警的读取
+        """
+        rows = LogAlert.objects.filter(occurrence_count__gt=1)
+        if self._seen_at is not None:
+            rows = rows.filter(last_seen_at__gte=self._seen_at - timedelta(seconds=ALERT_UPDATE_LOOKBACK))
+        rows = list(rows.order_by('last_seen_at', 'id').values(*ALERT_FIELDS)[:ALERT_BATCH_SIZE])
+        pushed = {alert['id']: alert['occurrence_count'] for alert in new_alerts}
+        floor = self._high_water - ALERT_GAP_WINDOW
+        updates = [
+            _serialize(row) for row in rows
+            if row['id'] not in pushed and (row['id'] in self._seen or row['id'] <= floor)
+            and self._occurrences.get(row['id']) != row['occurrence_count']
+        ]
+        if rows:
+            self._seen_at = rows[-1]['last_seen_at']
+        # 回看范围内的报警每次都会读到，只需记住本次读到的发生次数
+        self._occurrences = {row['id']: row['occurrence_count'] for row in rows}
+        self._occurrences.update(pushed)
+        return updates
+
+
+broadcaster = AlertBroadcaster()
+
+
+def _event(alert, event='alert'):
+    data = json.dumps(alert, ensure_ascii=False)
+    if event == 'alert':
+        return f"id: {alert['id']}\nevent: alert\ndata: {data}\n\n"
+    # 更新不带 id，不推进客户端的 Last-Event-ID
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _events(subscriber, last_id):
+    try:
+        # 先订阅再补发，补发与实时推送之间不会有空档；重复的按 id 跳过
+        broadcaster.subscribe(subscriber)
+        replayed = set()
+        if last_id is not None:
+            backlog = LogAlert.objects.filter(id__gt=last_id).order_by('id')
+            if subscriber.region is not None:
+                backlog = backlog.filter(machine__region_code=subscriber.region)
+            if subscriber.machine is not None:
+                backlog = backlog.filter(machine_id=subscriber.machine)
+            if subscriber.alert_type is not None:
+                backlog = backlog.filter(alert_type=subscriber.alert_type)
+            async for row in backlog.values(*ALERT_FIELDS)[:ALERT_BATCH_SIZE]:
+                yield _event(_serialize(row))
+                replayed.add(row['id'])
+
+        yield 'retry: 3000\n\n'
+        while not subscriber.overflowed:
+            try:
+                event, alert = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if event != 'alert' or alert['id'] not in replayed:
+                yield _event(alert, event)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@require_GET
+async def alert_stream(request):
+    """报警 SSE 流，支持 region / machine / type 过滤"""
+    params = request.GET
+    machine = params.get('machine')
+    last_id = request.headers.get('Last-Event-ID') or params.get('last_id')
+    if (machine and not machine.isdigit()) or (last_id and not last_id.isdigit()):
+        return JsonResponse({"error": "machine 与 last_id 必须为整数"}, status=400)
+    alert_type = params.get('type')
+    if alert_type and alert_type not in dict(LogAlert.ALERT_TYPE_CHOICES):
+        return JsonResponse({"error": "type 不合法"}, status=400)
+
+    subscriber = Subscriber(
+        asyncio.get_running_loop(),
+        region=params.get('region') or None,
+        machine=int(machine) if machine else None,
+        alert_type=alert_type or None,
+    )
+    response = StreamingHttpResponse(
+        _events(subscriber, int(last_id) if last_id else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭 nginx 缓冲
+    return response
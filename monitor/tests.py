@@ -1,3 +1,183 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from vending_system.testing import make_fleet, QueryBudgetMixin, ExplainMixin
+from resources.models import BizMachine
+from inventory.models import LogTransaction
+from .models import LogAlert, StatDaily, StatProductDaily
+from .rollup import rebuild
+from .services import generate_daily_stats
+from .stream import AlertBroadcaster, Subscriber, _event, _events
 
-# Create your tests here.
+
+class ListQueryCountTests(QueryBudgetMixin, TestCase):
+    """报警 / 日结列表的查询次数不随行数增长"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.next_day = timezone.now().date()
+
+    def add_alerts(self, n=20):
+        for i in range(n):
+            machine = BizMachine.objects.create(
+                machine_code=f'VM-ALERT-{LogAlert.objects.count()}', location='测试楼', region_code='A'
+            )
+            LogAlert.objects.create(machine=machine, alert_type='fault', message=f'报警 {i}')
+
+    def add_stats(self, n=20):
+        for _ in range(n):
+            self.next_day -= timedelta(days=1)
+            StatDaily.objects.create(date=self.next_day, machine=self.fleet.machine)
+
+    def test_alert_list(self):
+        self.add_alerts(1)
+        self.assertQueryBudget('/api/alerts/', self.add_alerts, max_queries=1)
+
+    def test_stat_daily_list(self):
+        self.add_stats(1)
+        # 页码分页额外一次 COUNT
+        self.assertQueryBudget('/api/stat-daily/', self.add_stats, max_queries=2)
+
+
+class RollupTests(TestCase):
+    """交易/补货写入时增量维护的日汇总应与从日志重建的结果一致"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.client = APIClient()
+
+    def snapshot(self):
+        return list(StatProductDaily.objects.order_by('date', 'machine', 'product').values(
+            'date', 'machine', 'product', 'revenue', 'cost', 'order_count',
+            'restock_quantity', 'restock_cost', 'restock_count',
+        ))
+
+    def test_incremental_matches_rebuild(self):
+        sale = {'user': self.fleet.user.id, 'machine': self.fleet.machine.id,
+                'product': self.fleet.product.id, 'amount': '2.00'}
+        for _ in range(3):
+            self.assertEqual(self.client.post('/api/transactions/', sale, format='json').status_code, 201)
+        self.client.post('/api/transactions/bulk/', {'items': [sale, sale]}, format='json')
+        refund = LogTransaction.objects.order_by('id').first()
+        self.client.delete(f'/api/transactions/{refund.id}/')
+        self.client.post('/api/restocks/', {
+            'staff': self.fleet.staff.id, 'machine': self.fleet.machine.id,
+            'product': self.fleet.product.id, 'quantity': 5,
+        }, format='json')
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental[0]['order_count'], 4)
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class StatisticsPlanTests(ExplainMixin, TestCase):
+    """日结生成与汇总按时间范围查询日志表，必须可走索引"""
+
+    def setUp(self):
+        make_fleet()
+
+    def test_generate(self):
+        self.assertNoFullScan('/api/stat-daily/generate/', ['log_transaction', 'log_alert'],
+                              method='post', data={'date': '2025-12-15'})
+
+    def test_summary(self):
+        self.assertNoFullScan('/api/stat-daily/summary/?period=week', ['stat_product_daily', 'log_alert'])
+
+    def test_generate_bad_dates(self):
+        client = APIClient()
+        for data in ({'start_date': 20251215}, {'date': '2025/12/15'}, {'start_date': '2025-12-01', 'end_date': 1}):
+            response = client.post('/api/stat-daily/generate/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+
+
+class AlertCountTests(TestCase):
+    """合并的报警按发生次数统计"""
+
+    def test_occurrences_counted(self):
+        fleet = make_fleet()
+        LogAlert.objects.create(machine=fleet.machine, message='缺货', occurrence_count=3)
+        response = APIClient().get('/api/stat-daily/summary/?period=today')
+        self.assertEqual(response.json()['summary']['total_alerts'], 3)
+        generate_daily_stats(timezone.localdate())
+        self.assertEqual(StatDaily.objects.get(machine=fleet.machine).alert_count, 3)
+
+
+class AlertStreamTests(TestCase):
+    """报警推送：共享轮询按高水位分发、过滤、回看窗口去重，重连补发"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def drain(self, subscriber):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        items = []
+        while not subscriber.queue.empty():
+            items.append(subscriber.queue.get_nowait())
+        return items
+
+    def alert(self, alert_type='low_stock'):
+        return LogAlert.objects.create(machine=self.fleet.machine, alert_type=alert_type, message='测试')
+
+    def test_poll_dispatch(self):
+        self.alert()
+        broadcaster = AlertBroadcaster()
+        everyone = Subscriber(self.loop)
+        faults = Subscriber(self.loop, alert_type='fault')
+        other_region = Subscriber(self.loop, region='Z')
+        for subscriber in (everyone, faults, other_region):
+            broadcaster._subscribers.add(subscriber)
+
+        broadcaster.poll()  # 初始化高水位，已有报警不推送
+        low = self.alert()
+        # 留出一个 id 空位，模拟先分配、后提交的报警
+        fault = LogAlert.objects.create(id=low.id + 2, machine=self.fleet.machine, alert_type='fault', message='故障')
+        self.assertEqual(broadcaster.poll(), 2)
+        self.assertEqual([a['id'] for _, a in self.drain(everyone)], [low.id, fault.id])
+        self.assertEqual([a['id'] for _, a in self.drain(faults)], [fault.id])
+        self.assertEqual(self.drain(other_region), [])
+
+        # 再次轮询不重复推送；id 较小但晚提交的报警仍在回看窗口内
+        self.assertEqual(broadcaster.poll(), 0)
+        late = LogAlert.objects.create(id=low.id + 1, machine=self.fleet.machine, message='晚提交')
+        self.assertEqual(broadcaster.poll(), 1)
+        self.assertEqual([a['id'] for _, a in self.drain(everyone)], [late.id])
+
+    def test_repeat_occurrence_pushed_as_update(self):
+        first = LogAlert.objects.create(
+            machine=self.fleet.machine, product=self.fleet.product, message='1', last_seen_at=timezone.now(),
+        )
+        broadcaster = AlertBroadcaster()
+        subscriber = Subscriber(self.loop)
+        broadcaster._subscribers.add(subscriber)
+        broadcaster.poll()
+
+        # 合并窗口内重复发生：只累加已有记录
+        LogAlert.objects.filter(pk=first.pk).update(occurrence_count=2, last_seen_at=timezone.now(), message='2')
+        self.assertEqual(broadcaster.poll(), 1)
+        [(event, alert)] = self.drain(subscriber)
+        self.assertEqual(event, 'alert_update')
+        self.assertEqual((alert['id'], alert['product'], alert['occurrence_count'], alert['message']),
+                         (first.id, self.fleet.product.id, 2, '2'))
+        self.assertEqual(broadcaster.poll(), 0)
+        # 更新不带 id，不推进 Last-Event-ID
+        self.assertFalse(_event(alert, event).startswith('id:'))
+
+    async def test_replay_from_last_event_id(self):
+        first = await LogAlert.objects.acreate(machine=self.fleet.machine, message='1')
+        second = await LogAlert.objects.acreate(machine=self.fleet.machine, message='2')
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with patch('monitor.stream.broadcaster'):
+            events = _events(subscriber, first.id)
+            chunk = await anext(events)
+            await events.aclose()
+        self.assertTrue(chunk.startswith(f'id: {second.id}\n'))
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get('/api/alerts/stream/?machine=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/alerts/stream/?type=x').status_code, 400)
@@ -1,124 +1,119 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta, datetime
-from .models import LogAlert, StatDaily
+from vending_system.pagination import LogCursorPagination
+from vending_system.export import ExportMixin
+from .models import LogAlert, StatDaily, StatProductDaily
 from .serializers import LogAlertSerializer, StatDailySerializer
-from resources.models import BizMachine
-from inventory.models import LogTransaction
+from .services import generate_daily_stats
 
+# 通过 API 单次生成日结的最大天数
+MAX_GENERATE_DAYS = 366
 
-class LogAlertViewSet(viewsets.ModelViewSet):
-    queryset = LogAlert.objects.all().order_by('-created_at')
+
+class LogAlertViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = LogAlert.objects.select_related('machine', 'product').order_by('-created_at')
     serializer_class = LogAlertSerializer
+    pagination_class = LogCursorPagination
+    export_name = 'alerts'
+    export_filters = ('machine',)
+    export_fields = [
+        ('created_at', 'created_at'),
+        ('id', 'id'),
+        ('machine_code', 'machine__machine_code'),
+        ('product_name', 'product__name'),
+        ('alert_type', 'alert_type'),
+        ('message', 'message'),
+        ('occurrence_count', 'occurrence_count'),
+        ('last_seen_at', 'last_seen_at'),
+    ]
 
 
 class StatDailyViewSet(viewsets.ModelViewSet):
-    queryset = StatDaily.objects.all().order_by('-date')
+    queryset = StatDaily.objects.select_related('machine').order_by('-date', 'id')
     serializer_class = StatDailySerializer
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
         """
-        生成指定日期的日结统计
+        生成指定日期（或日期区间）的日结统计
         POST /api/stat-daily/generate/
         Body: {"date": "2025-12-15"} (可选，默认为今天)
+          或 {"start_date": "2025-12-01", "end_date": "2025-12-15"} 批量生成/回填
         """
-        date_str = request.data.get('date')
-        if date_str:
-            try:
-                target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
-                return Response({"error": "日期格式错误，应为 YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            target_date = timezone.now().date()
-        
-        # 使用时间范围查询而非 __date
-        start_dt = timezone.make_aware(datetime.combine(target_date, datetime.min.time()))
-        end_dt = start_dt + timedelta(days=1)
-        
-        transactions = LogTransaction.objects.filter(created_at__gte=start_dt, created_at__lt=end_dt)
+        try:
+            if request.data.get('start_date'):
+                start_date = datetime.strptime(request.data['start_date'], '%Y-%m-%d').date()
+                end_date = datetime.strptime(request.data.get('end_date') or request.data['start_date'], '%Y-%m-%d').date()
+            elif request.data.get('date'):
+                start_date = end_date = datetime.strptime(request.data['date'], '%Y-%m-%d').date()
+            else:
+                start_date = end_date = timezone.localdate()
+        except (TypeError, ValueError):
+            # 日期不是字符串（如 JSON 数字）时 strptime 抛出 TypeError
+            return Response({"error": "日期格式错误，应为 YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
         
-        machines = BizMachine.objects.all()
-        created_count = 0
+        if end_date < start_date:
+            return Response({"error": "结束日期不能早于开始日期"}, status=status.HTTP_400_BAD_REQUEST)
+        if (end_date - start_date).days >= MAX_GENERATE_DAYS:
+            return Response({"error": f"单次最多生成 {MAX_GENERATE_DAYS} 天，更长区间请使用 manage.py generate_stat_daily"},
+                            status=status.HTTP_400_BAD_REQUEST)
         
-        for machine in machines:
-            machine_trans = transactions.filter(machine=machine)
-            machine_alerts = LogAlert.objects.filter(machine=machine, created_at__gte=start_dt, created_at__lt=end_dt)
-            
-            total_revenue = machine_trans.aggregate(Sum('amount'))['amount__sum'] or 0
-            total_cost = machine_trans.aggregate(Sum('cost_price'))['cost_price__sum'] or 0
-            total_profit = float(total_revenue) - float(total_cost)
-            order_count = machine_trans.count()
-            alert_count = machine_alerts.count()
-            
-            stat, created = StatDaily.objects.update_or_create(
-                date=target_date,
-                machine=machine,
-                defaults={
-                    'total_revenue': total_revenue,
-                    'total_cost': total_cost,
-                    'order_count': order_count,
-                    'alert_count': alert_count
-                }
-            )
-
-            if created:
-                created_count += 1
+        machine_count, created_count = generate_daily_stats(start_date, end_date)
         
+        label = str(start_date) if start_date == end_date else f"{start_date} ~ {end_date}"
         return Response({
-            "message": f"已生成 {target_date} 的日结统计",
-            "machines_processed": machines.count(),
+            "message": f"已生成 {label} 的日结统计",
+            "machines_processed": machine_count,
             "new_records": created_count
         })
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """
-        获取财务汇总统计 - 实时从交易记录计算
+        获取财务汇总统计 - 读取商品日汇总 (stat_product_daily)，按自然日统计
         GET /api/stat-daily/summary/?period=week|month|today|all
         """
         period = request.query_params.get('period', 'week')
-        now = timezone.now()
+        today = timezone.localdate()
         
         if period == 'today':
-            # 今天开始时间（本地时区）
-            start_dt = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            start_date = today
         elif period == 'week':
-            start_dt = now - timedelta(days=7)
+            start_date = today - timedelta(days=7)
         elif period == 'month':
-            start_dt = now - timedelta(days=30)
+            start_date = today - timedelta(days=30)
         elif period == 'all':
-            start_dt = None  # 所有数据
+            start_date = None  # 所有数据
         else:
-            start_dt = now - timedelta(days=7)
+            start_date = today - timedelta(days=7)
         
-        # 直接从交易记录实时计算
-        if start_dt:
-            transactions = LogTransaction.objects.filter(created_at__gte=start_dt)
-            alerts = LogAlert.objects.filter(created_at__gte=start_dt)
-        else:
-            transactions = LogTransaction.objects.all()
-            alerts = LogAlert.objects.all()
+        rollups = StatProductDaily.objects.all()
+        alerts = LogAlert.objects.all()
+        if start_date:
+            rollups = rollups.filter(date__gte=start_date)
+            alerts = alerts.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+            )
         
         # 汇总
-        total_revenue = transactions.aggregate(Sum('amount'))['amount__sum'] or 0
-        total_cost = transactions.aggregate(Sum('cost_price'))['cost_price__sum'] or 0
+        totals = rollups.aggregate(revenue=Sum('revenue'), cost=Sum('cost'), orders=Sum('order_count'))
+        total_revenue = totals['revenue'] or 0
+        total_cost = totals['cost'] or 0
         total_profit = float(total_revenue) - float(total_cost)
-        total_orders = transactions.count()
-        total_alerts = alerts.count()
+        total_orders = totals['orders'] or 0
+        # 合并的报警按发生次数计
+        total_alerts = alerts.aggregate(n=Sum('occurrence_count'))['n'] or 0
         
         # 按日期分组
-        daily = transactions.annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate(
-            revenue=Sum('amount'),
-            cost=Sum('cost_price'),
-            orders=Count('id')
-        ).order_by('date')
+        daily = rollups.values('date').annotate(
+            revenue=Sum('revenue'),
+            cost=Sum('cost'),
+            orders=Sum('order_count')
+        ).filter(orders__gt=0).order_by('date')
         
         daily_list = []
         for d in daily:
@@ -131,11 +126,11 @@ class StatDailyViewSet(viewsets.ModelViewSet):
             })
         
         # 按机器分组
-        by_machine = transactions.values('machine__machine_code').annotate(
-            revenue=Sum('amount'),
-            cost=Sum('cost_price'),
-            orders=Count('id')
-        ).order_by('-revenue')[:10]
+        by_machine = rollups.values('machine__machine_code').annotate(
+            revenue=Sum('revenue'),
+            cost=Sum('cost'),
+            orders=Sum('order_count')
+        ).filter(orders__gt=0).order_by('-revenue')[:10]
         
         machine_list = []
         for m in by_machine:
@@ -148,8 +143,8 @@ class StatDailyViewSet(viewsets.ModelViewSet):
         
         return Response({
             'period': period,
-            'start_date': str(start_dt.date()) if start_dt else 'all',
-            'end_date': str(now.date()),
+            'start_date': str(start_date) if start_date else 'all',
+            'end_date': str(today),
             'summary': {
                 'total_revenue': float(total_revenue),
                 'total_cost': float(total_cost),
@@ -17,6 +17,6 @@ class BizMachineAdmin(admin.ModelAdmin):
 
 @admin.register(BizProduct)
 class BizProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'cost_price', 'sell_price', 'supplier', 'created_at']
+    list_display = ['id', 'name', 'cost_price', 'sell_price', 'low_stock_threshold', 'supplier', 'created_at']
     search_fields = ['name']
     list_filter = ['supplier']
@@ -0,0 +1,52 @@
+"""
+参考数据缓存 - 机器 / 商品 / 供应商
+
+- 读穿透：按主键读取先查缓存，未命中再查库并回填
+- 失效：保存 / 删除时由信号（resources/signals.py）删除对应条目并更新模型版本号
+- 版本号：每个模型最后一次变更的时间戳，视图集据此生成 ETag / Last-Modified
+
+缓存后端由 settings.CACHES[REFERENCE_CACHE_ALIAS] 配置，默认为进程内 LocMemCache；
+多进程部署时失效只作用于当前进程，应换成 Redis / Memcached 等共享后端。
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def _key(model, pk):
+    return f'ref:{model._meta.label_lower}:{pk}'
+
+
+def _version_key(model):
+    return f'ref:{model._meta.label_lower}:version'
+
+
+def get_cached(model, pk):
+    """按主键读取，未命中时查库并回填；不存在时抛出 model.DoesNotExist"""
+    key = _key(model, pk)
+    obj = _cache().get(key)
+    if obj is None:
+        obj = model.objects.get(pk=pk)
+        _cache().set(key, obj, settings.REFERENCE_CACHE_TIMEOUT)
+    return obj
+
+
+def model_version(model):
+    """模型最后变更时间戳；缓存中没有时以当前时间初始化"""
+    cache = _cache()
+    version = cache.get(_version_key(model))
+    if version is None:
+        cache.add(_version_key(model), time.time(), settings.REFERENCE_CACHE_TIMEOUT)
+        version = cache.get(_version_key(model)) or time.time()
+    return version
+
+
+def invalidate(model, pk):
+    """删除单条缓存并推进模型版本号"""
+    cache = _cache()
+    cache.delete(_key(model, pk))
+    cache.set(_version_key(model), time.time(), settings.REFERENCE_CACHE_TIMEOUT)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bizmachine',
+            name='last_heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最后心跳'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0002_bizmachine_last_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bizproduct',
+            name='low_stock_threshold',
+            field=models.IntegerField(default=5, verbose_name='缺货预警阈值'),
+        ),
+    ]
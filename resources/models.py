@@ -27,6 +27,7 @@ class BizMachine(models.Model):
     location = models.CharField('位置', max_length=200)
     status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='normal')
     region_code = models.CharField('所属区域', max_length=20)
+    last_heartbeat = models.DateTimeField('最后心跳', null=True, blank=True)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
 
     class Meta:
@@ -43,6 +44,7 @@ class BizProduct(models.Model):
     name = models.CharField('名称', max_length=100)
     cost_price = models.DecimalField('进价', max_digits=10, decimal_places=2)
     sell_price = models.DecimalField('售价', max_digits=10, decimal_places=2)
+    low_stock_threshold = models.IntegerField('缺货预警阈值', default=5)  # 库存从不低于阈值降到低于阈值时预警
     supplier = models.ForeignKey(
         BizSupplier,
         on_delete=models.CASCADE,
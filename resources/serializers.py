@@ -1,17 +1,36 @@
 from rest_framework import serializers
+from vending_system.serializers import SparseModelSerializer
+from .cache import get_cached
 from .models import BizSupplier, BizMachine, BizProduct
 
-class BizSupplierSerializer(serializers.ModelSerializer):
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """通过参考数据缓存解析主键，写入交易 / 库存时不再逐条查询机器与商品"""
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return get_cached(model, int(data))
+        except model.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BizSupplierSerializer(SparseModelSerializer):
     class Meta:
         model = BizSupplier
         fields = '__all__'
 
-class BizMachineSerializer(serializers.ModelSerializer):
+class BizMachineSerializer(SparseModelSerializer):
     class Meta:
         model = BizMachine
-        fields = '__all__'
+        # 心跳不推进缓存版本号，不能出现在带 ETag 的响应中，见 /api/machines/heartbeats/
+        exclude = ['last_heartbeat']
 
-class BizProductSerializer(serializers.ModelSerializer):
+class BizProductSerializer(SparseModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     
     class Meta:
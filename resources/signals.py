@@ -0,0 +1,36 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from events.bus import bus
+from events.domain import MachineStatusChanged
+from inventory.services import events_mode
+from .cache import invalidate
+from .models import BizSupplier, BizMachine, BizProduct
+
+
+def invalidate_reference_cache(sender, instance, **kwargs):
+    """参考数据保存 / 删除后失效缓存"""
+    invalidate(sender, instance.pk)
+
+
+def remember_machine_status(sender, instance, update_fields=None, **kwargs):
+    """
+    机器保存前记下库中的状态，保存后比较
+    事件只在事件模式下有处理器（触发器模式下故障预警由 monitor_machine_fault 产生），其他情况不额外查询
+    """
+    instance._previous_status = None
+    if not events_mode() or instance._state.adding or (update_fields is not None and 'status' not in update_fields):
+        return
+    instance._previous_status = BizMachine.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+def publish_machine_status(sender, instance, created, **kwargs):
+    """机器状态变化时发布 MachineStatusChanged（事件模式下由其处理器产生故障预警）"""
+    previous = getattr(instance, '_previous_status', None)
+    if previous is not None and previous != instance.status:
+        bus.publish([MachineStatusChanged(instance.pk, instance.machine_code, previous, instance.status)])
+
+
+for model in (BizSupplier, BizMachine, BizProduct):
+    post_save.connect(invalidate_reference_cache, sender=model)
+    post_delete.connect(invalidate_reference_cache, sender=model)
+pre_save.connect(remember_machine_status, sender=BizMachine)
+post_save.connect(publish_machine_status, sender=BizMachine)
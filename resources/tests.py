@@ -1,3 +1,98 @@
+from django.core.cache import caches
+from django.conf import settings
 from django.test import TestCase
+from rest_framework.test import APIClient
+from vending_system.testing import make_fleet
+from inventory.models import BizInventory, BizInventoryShard, BizInventoryVersion
 
-# Create your tests here.
+
+class ConditionalGetTests(TestCase):
+    """参考数据接口的 ETag 在数据未变时返回 304，保存后失效"""
+
+    def setUp(self):
+        caches[settings.REFERENCE_CACHE_ALIAS].clear()
+        self.fleet = make_fleet()
+        self.client = APIClient()
+
+    def test_not_modified_until_saved(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # 查询参数不同，响应不同
+        self.assertEqual(self.client.get('/api/products/?fields=id', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # 商品响应包含供应商名称，供应商变更也应失效
+        self.fleet.supplier.name = '新供应商'
+        self.fleet.supplier.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['supplier_name'], '新供应商')
+
+    def test_machine_save_single_query(self):
+        # 触发器模式下保存机器不预先查询原状态
+        machine = self.fleet.machine
+        machine.status = 'fault'
+        with self.assertNumQueries(1):
+            machine.save()
+
+    def test_heartbeat_not_behind_etag(self):
+        first = self.client.get('/api/machines/')
+        self.assertNotIn('last_heartbeat', first.json()['results'][0])
+        # 心跳不推进版本号，机器列表仍为 304，在线状态由 heartbeats 接口返回
+        self.client.post(f'/api/machine-api/{self.fleet.machine.id}/heartbeat/', {}, format='json')
+        self.assertEqual(self.client.get('/api/machines/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        response = self.client.get('/api/machines/heartbeats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertIsNotNone(response.json()[0]['last_heartbeat'])
+
+
+class MachineInventorySyncTests(TestCase):
+    """单机库存接口：全量、按版本增量、删除货道后全量"""
+
+    def setUp(self):
+        caches[settings.REFERENCE_CACHE_ALIAS].clear()
+        self.fleet = make_fleet()
+        self.client = APIClient()
+        self.url = f'/api/machines/{self.fleet.machine.id}/inventory/'
+        # 版本号由触发器维护，这里直接写入触发器的效果（未安装触发器时同样成立）
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(version=1)
+        self.version, _ = BizInventoryVersion.objects.update_or_create(
+            machine=self.fleet.machine, defaults={'version': 1}
+        )
+
+    def test_full_and_delta(self):
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['full'])
+        self.assertEqual(data['version'], 1)
+        self.assertEqual([item['product'] for item in data['items']], [self.fleet.product.id])
+
+        data = self.client.get(f'{self.url}?since=1').json()
+        self.assertFalse(data['full'])
+        self.assertEqual(data['items'], [])
+
+        BizInventory.objects.filter(pk=self.fleet.inventory.pk).update(current_stock=3, version=2)
+        BizInventoryVersion.objects.filter(pk=self.version.pk).update(version=2)
+        data = self.client.get(f'{self.url}?since=1').json()
+        self.assertEqual(data['version'], 2)
+        self.assertEqual([item['current_stock'] for item in data['items']], [3])
+
+    def test_sharded_slot_in_delta(self):
+        # 从分片售出不递增版本号，增量结果仍需带上分片货道的最新库存
+        BizInventoryShard.objects.create(inventory=self.fleet.inventory, shard_no=0, stock=5)
+        BizInventoryShard.objects.filter(inventory=self.fleet.inventory).update(stock=2)
+        data = self.client.get(f'{self.url}?since=1').json()
+        self.assertEqual(data['version'], 1)
+        self.assertEqual([item['current_stock'] for item in data['items']], [self.fleet.inventory.current_stock + 2])
+
+    def test_full_after_reset(self):
+        BizInventoryVersion.objects.filter(pk=self.version.pk).update(version=3, reset_version=3)
+        data = self.client.get(f'{self.url}?since=2').json()
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['items']), 1)
+
+    def test_bad_params(self):
+        self.assertEqual(self.client.get(f'{self.url}?since=-1').status_code, 400)
+        self.assertEqual(self.client.get('/api/machines/0/inventory/').status_code, 404)
@@ -1,15 +1,115 @@
-from rest_framework import viewsets
+import hashlib
+from django.db.models import Exists, OuterRef, Q
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .cache import get_cached, model_version
 from .models import BizSupplier, BizMachine, BizProduct
 from .serializers import BizSupplierSerializer, BizMachineSerializer, BizProductSerializer
 
-class BizSupplierViewSet(viewsets.ModelViewSet):
-    queryset = BizSupplier.objects.all()
+
+class ConditionalGetMixin:
+    """
+    列表 / 详情支持 ETag 与 Last-Modified 条件请求，数据未变更时返回 304
+    cache_models 列出响应所依赖的模型，任一模型变更都会使校验值失效
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        versions = [model_version(model) for model in self.cache_models]
+        # 分页、字段选择等查询参数不同，响应内容不同，ETag 需包含完整路径
+        digest = hashlib.md5(f'{request.get_full_path()}|{versions}'.encode()).hexdigest()
+        etag = f'"{digest}"'
+        last_modified = int(max(versions))
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True)
+        return response
+
+
+class BizSupplierViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = BizSupplier.objects.all().order_by('id')
     serializer_class = BizSupplierSerializer
+    cache_models = (BizSupplier,)
 
-class BizMachineViewSet(viewsets.ModelViewSet):
-    queryset = BizMachine.objects.all()
+class BizMachineViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = BizMachine.objects.all().order_by('id')
     serializer_class = BizMachineSerializer
+    cache_models = (BizMachine,)
+
+    @action(detail=False, methods=['get'])
+    def heartbeats(self, request):
+        """
+        机器在线状态，不做条件请求：心跳频繁更新，不计入缓存版本号
+        GET /api/machines/heartbeats/?region=<区域编号>
+        """
+        machines = BizMachine.objects.order_by('id')
+        region = request.query_params.get('region')
+        if region:
+            machines = machines.filter(region_code=region)
+        return Response(list(machines.values('id', 'machine_code', 'status', 'last_heartbeat')))
+
+    @action(detail=True, methods=['get'])
+    def inventory(self, request, pk=None):
+        """
+        单台机器的货道库存，支持按版本号增量同步
+        GET /api/machines/{id}/inventory/              全量
+        GET /api/machines/{id}/inventory/?since=<版本号> 只返回此后变更的货道（分片货道每次都返回）
+        响应中的 version 作为下次请求的 since；full 为 true 时客户端应以 items 替换本地全部货道
+        """
+        from inventory.models import BizInventory, BizInventoryShard, BizInventoryVersion
+
+        since = request.query_params.get('since')
+        if since is not None and not since.isdigit():
+            return Response({"error": "since 必须为非负整数"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            get_cached(BizMachine, int(pk))
+        except (ValueError, BizMachine.DoesNotExist):
+            return Response({"error": "Machine not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # 先读版本号再读货道：版本号不大于它的变更均已提交，随后的查询一定能读到
+        version, reset_version = (
+            BizInventoryVersion.objects.filter(machine_id=pk)
+            .values_list('version', 'reset_version').first() or (0, 0)
+        )
+        # 客户端版本早于最近一次删除货道，或大于当前版本（如数据库恢复）时全量返回
+        full = since is None or int(since) < reset_version or int(since) > version
+        rows = BizInventory.objects.with_total_stock().filter(machine_id=pk)
+        if not full:
+            # 分片货道从分片售出时不递增版本号，增量结果总是包含分片货道
+            sharded = Exists(BizInventoryShard.objects.filter(inventory=OuterRef('pk')))
+            rows = rows.filter(Q(version__gt=int(since)) | sharded)
+        items = [
+            {
+                'id': row['id'],
+                'product': row['product_id'],
+                'product_name': row['product__name'],
+                'sell_price': row['product__sell_price'],
+                'current_stock': row['total_stock'],
+                'max_capacity': row['max_capacity'],
+                'version': row['version'],
+            }
+            for row in rows.order_by('product_id').values(
+                'id', 'product_id', 'product__name', 'product__sell_price',
+                'total_stock', 'max_capacity', 'version',
+            )
+        ]
+        return Response({'machine': int(pk), 'version': version, 'full': full, 'items': items})
 
-class BizProductViewSet(viewsets.ModelViewSet):
-    queryset = BizProduct.objects.all()
+class BizProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = BizProduct.objects.select_related('supplier').order_by('id')
     serializer_class = BizProductSerializer
+    cache_models = (BizProduct, BizSupplier)
@@ -0,0 +1,452 @@
+"""
+购买 / 补货吞吐量压测脚本
+在 simulate_purchase.py 的基础上，以 N 个并发模拟用户持续购买与补货，统计：
+- 吞吐量（每秒操作数）与 p50 / p95 / p99 延迟
+- 死锁 / 锁等待超时次数与重试次数
+- 超卖检查（最终库存与 初始库存 + 补货 - 售出 不守恒、库存或余额为负）
+
+运行方式:
+    python scripts/benchmark_purchase.py --workers 32 --duration 30
+    python scripts/benchmark_purchase.py --target http --base-url http://127.0.0.1:8000/api/ --mode process
+    python scripts/benchmark_purchase.py --compare bench_results/a.json bench_results/b.json
+    python scripts/benchmark_purchase.py --machines 1 --shards 4   # 热点货道分片前后对比
+
+参数说明见 --help。数据来自现有库（先运行 scripts/init_data.py），结果保存为 JSON 便于跨提交对比。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import threading
+import multiprocessing
+import urllib.request
+import urllib.error
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+import django
+
+# 设置 Django 环境
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vending_system.settings')
+django.setup()
+
+from django.db import connection, connections, transaction, DatabaseError
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from users.models import AppUser, SysStaff
+from users.ledger import compact, with_current_balance
+from resources.models import BizMachine, BizProduct
+from resources.cache import get_cached
+from inventory.models import BizInventory
+from inventory.services import purchase, restock, PurchaseError
+from inventory.sharding import collapse, rebalance, shard
+
+# MySQL 死锁 / 锁等待超时错误码
+MYSQL_DEADLOCK = 1213
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+# SQLite（vending_system.settings_local）等待写锁超时
+SQLITE_LOCKED = 'database is locked'
+
+# 业务拒绝（不算错误）
+REJECT_MESSAGES = ('Insufficient balance', 'Inventory not sufficient')
+
+
+def load_workload(user_limit, machine_limit):
+    """读取压测使用的 用户 / 运维 / (机器, 商品, 售价) 列表"""
+    machine_ids = list(BizMachine.objects.filter(status='normal').order_by('id')
+                       .values_list('id', flat=True)[:machine_limit])
+    slots = list(
+        BizInventory.objects.filter(machine_id__in=machine_ids)
+        .values_list('machine_id', 'product_id', 'product__sell_price')
+    )
+    return {
+        'users': list(AppUser.objects.order_by('id').values_list('id', flat=True)[:user_limit]),
+        'staffs': list(SysStaff.objects.values_list('id', flat=True)),
+        'slots': [(m, p, str(price)) for m, p, price in slots],
+    }
+
+
+def percentile(sorted_values, pct):
+    """最近秩法百分位"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# ---------------------------------------------------------------------------
+# 单次操作
+# ---------------------------------------------------------------------------
+
+def orm_purchase(user_id, machine_id, product_id, amount):
+    purchase(
+        user=AppUser(pk=user_id),
+        machine=get_cached(BizMachine, machine_id),
+        product=get_cached(BizProduct, product_id),
+        amount=Decimal(amount),
+    )
+
+
+def orm_restock(staff_id, machine_id, product_id, quantity):
+    restock(
+        staff=SysStaff(pk=staff_id),
+        machine=get_cached(BizMachine, machine_id),
+        product=get_cached(BizProduct, product_id),
+        quantity=quantity,
+    )
+
+
+def http_post(base_url, path, payload):
+    """返回 (HTTP 状态码, 响应体)"""
+    request = urllib.request.Request(
+        base_url + path,
+        data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def run_orm_op(op, args, max_retries):
+    """执行一次 ORM 操作，返回 (结果, 重试次数, 死锁次数)"""
+    retries = deadlocks = 0
+    while True:
+        try:
+            if op == 'purchase':
+                orm_purchase(*args)
+            else:
+                orm_restock(*args)
+            return 'ok', retries, deadlocks
+        except PurchaseError:
+            return 'rejected', retries, deadlocks
+        except DatabaseError as e:
+            code = e.args[0] if e.args else None
+            if code not in (MYSQL_DEADLOCK, MYSQL_LOCK_WAIT_TIMEOUT) and SQLITE_LOCKED not in str(e):
+                return 'error', retries, deadlocks
+            deadlocks += 1
+            if retries >= max_retries:
+                return 'error', retries, deadlocks
+            retries += 1
+            time.sleep(random.uniform(0, 0.01 * retries))
+
+
+def run_http_op(op, args, base_url):
+    """执行一次 HTTP 操作；服务端死锁表现为 5xx，无法区分重试"""
+    if op == 'purchase':
+        user_id, machine_id, product_id, amount = args
+        status, body = http_post(base_url, 'transactions/', {
+            'user': user_id, 'machine': machine_id, 'product': product_id, 'amount': amount,
+        })
+    else:
+        staff_id, machine_id, product_id, quantity = args
+        status, body = http_post(base_url, 'restocks/', {
+            'staff': staff_id, 'machine': machine_id, 'product': product_id, 'quantity': quantity,
+        })
+    if status in (200, 201):
+        return 'ok', 0, 0
+    if status == 400 and any(msg in body for msg in REJECT_MESSAGES):
+        return 'rejected', 0, 0
+    return 'error', 0, 0
+
+
+# ---------------------------------------------------------------------------
+# 工作线程 / 进程
+# ---------------------------------------------------------------------------
+
+def worker(worker_id, config, workload):
+    """
+    在截止时间前循环执行随机操作，返回原始样本：
+    {'samples': [(op, 结果, 延迟秒)], 'retries', 'deadlocks', 'sold': {(m, p): n}, 'restocked': {(m, p): 请求补货量}}
+    """
+    rng = random.Random(config['seed'] + worker_id)
+    deadline = time.time() + config['duration']
+    samples = []
+    retries = deadlocks = 0
+    sold = defaultdict(int)
+    restocked = defaultdict(int)
+
+    ops_done = 0
+    while time.time() < deadline and (not config['ops'] or ops_done < config['ops']):
+        machine_id, product_id, price = rng.choice(workload['slots'])
+        if workload['staffs'] and rng.random() < config['restock_ratio']:
+            op = 'restock'
+            args = (rng.choice(workload['staffs']), machine_id, product_id, config['restock_quantity'])
+        else:
+            op = 'purchase'
+            args = (rng.choice(workload['users']), machine_id, product_id, price)
+
+        started = time.perf_counter()
+        if config['target'] == 'orm':
+            result, op_retries, op_deadlocks = run_orm_op(op, args, config['max_retries'])
+        else:
+            result, op_retries, op_deadlocks = run_http_op(op, args, config['base_url'])
+        samples.append((op, result, time.perf_counter() - started))
+        retries += op_retries
+        deadlocks += op_deadlocks
+        if result == 'ok':
+            if op == 'purchase':
+                sold[(machine_id, product_id)] += 1
+            else:
+                restocked[(machine_id, product_id)] += config['restock_quantity']
+        ops_done += 1
+
+    if config['target'] == 'orm':
+        connection.close()
+    return {
+        'samples': samples,
+        'retries': retries,
+        'deadlocks': deadlocks,
+        'sold': dict(sold),
+        'restocked': dict(restocked),
+    }
+
+
+def process_worker(args):
+    return worker(*args)
+
+
+def run_workers(config, workload):
+    if config['mode'] == 'thread':
+        results = [None] * config['workers']
+
+        def target(i):
+            results[i] = worker(i, config, workload)
+
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(config['workers'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    # 子进程各自建立数据库连接，fork 前关闭父进程连接
+    connections.close_all()
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(config['workers']) as pool:
+        return pool.map(process_worker, [(i, config, workload) for i in range(config['workers'])])
+
+
+# ---------------------------------------------------------------------------
+# 统计与报告
+# ---------------------------------------------------------------------------
+
+def total_stocks(machine_ids):
+    """{(机器, 商品): 总库存（池 + 分片）}"""
+    return {
+        (m, p): stock for m, p, stock in
+        BizInventory.objects.with_total_stock().filter(machine_id__in=machine_ids)
+        .values_list('machine_id', 'product_id', 'total_stock')
+    }
+
+
+def check_oversell(initial_stock, final_stock, sold, restocked):
+    """
+    按库存守恒检查：最终库存 = 初始库存 + 实际补进 - 售出
+    补货按最大容量封顶，实际补进量由最终库存反推，应在 [0, 请求补货量] 内：
+    超出说明有成功售出未扣减库存（超卖），为负说明库存多扣；库存与余额不应为负
+    """
+    violations = []
+    for key, initial in initial_stock.items():
+        applied = final_stock.get(key, 0) - initial + sold.get(key, 0)
+        requested = restocked.get(key, 0)
+        if not 0 <= applied <= requested:
+            violations.append({
+                'machine': key[0], 'product': key[1], 'initial': initial, 'final': final_stock.get(key, 0),
+                'sold': sold.get(key, 0), 'restock_requested': requested, 'restock_applied': applied,
+            })
+    return {
+        'violations': violations,
+        'negative_stock_rows': BizInventory.objects.filter(current_stock__lt=0).count(),
+        'negative_balance_users': with_current_balance(AppUser.objects.all()).filter(current_balance__lt=0).count(),
+    }
+
+
+def summarize(config, results, elapsed, initial_stock):
+    by_op = defaultdict(list)
+    sold = defaultdict(int)
+    restocked = defaultdict(int)
+    for r in results:
+        for op, result, latency in r['samples']:
+            by_op[op].append((result, latency))
+        for key, n in r['sold'].items():
+            sold[key] += n
+        for key, n in r['restocked'].items():
+            restocked[key] += n
+
+    ops = {}
+    for op, samples in by_op.items():
+        latencies = sorted(latency * 1000 for _, latency in samples)
+        counts = defaultdict(int)
+        for result, _ in samples:
+            counts[result] += 1
+        ops[op] = {
+            'count': len(samples),
+            'ok': counts['ok'],
+            'rejected': counts['rejected'],
+            'errors': counts['error'],
+            'throughput': round(counts['ok'] / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(latencies[-1], 3) if latencies else 0.0,
+            },
+        }
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+
+    return {
+        'commit': commit,
+        'started_at': config['started_at'],
+        'database': connection.vendor,
+        'config': {k: v for k, v in config.items() if k != 'started_at'},
+        'elapsed_s': round(elapsed, 3),
+        'total_throughput': round(sum(o['ok'] for o in ops.values()) / elapsed, 2),
+        'ops': ops,
+        'retries': sum(r['retries'] for r in results),
+        'deadlocks': sum(r['deadlocks'] for r in results),
+        'oversell': check_oversell(
+            initial_stock, total_stocks({m for m, _ in initial_stock}), sold, restocked,
+        ),
+    }
+
+
+def print_report(report):
+    print(f"\n{'='*60}")
+    print(f"压测结果  commit={report['commit']}  db={report['database']}  "
+          f"{report['config']['target']}/{report['config']['mode']} x{report['config']['workers']}")
+    print('='*60)
+    for op, stats in report['ops'].items():
+        lat = stats['latency_ms']
+        print(f"{op:<9} 成功 {stats['ok']:>7}  拒绝 {stats['rejected']:>6}  错误 {stats['errors']:>5}  "
+              f"{stats['throughput']:>9.2f} ops/s  "
+              f"p50 {lat['p50']:.1f}ms  p95 {lat['p95']:.1f}ms  p99 {lat['p99']:.1f}ms")
+    print(f"总吞吐: {report['total_throughput']} ops/s  用时 {report['elapsed_s']}s")
+    print(f"死锁/锁超时: {report['deadlocks']}  重试: {report['retries']}")
+    oversell = report['oversell']
+    ok = not (oversell['violations'] or oversell['negative_stock_rows'] or oversell['negative_balance_users'])
+    print(f"超卖检查: {'通过' if ok else '失败'}  "
+          f"(库存不守恒槽位 {len(oversell['violations'])}, 负库存 {oversell['negative_stock_rows']}, "
+          f"负余额 {oversell['negative_balance_users']})")
+
+
+def compare(old_path, new_path):
+    """对比两次压测结果的吞吐量与延迟"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"对比: {old['commit']} ({old_path}) → {new['commit']} ({new_path})")
+
+    def delta(a, b):
+        return f"{a} → {b} ({(b - a) / a * 100:+.1f}%)" if a else f"{a} → {b}"
+
+    print(f"总吞吐 ops/s: {delta(old['total_throughput'], new['total_throughput'])}")
+    for op in sorted(set(old['ops']) | set(new['ops'])):
+        if op not in old['ops'] or op not in new['ops']:
+            continue
+        o, n = old['ops'][op], new['ops'][op]
+        print(f"[{op}] 吞吐 {delta(o['throughput'], n['throughput'])}")
+        for pct in ('p50', 'p95', 'p99'):
+            print(f"[{op}] {pct} ms {delta(o['latency_ms'][pct], n['latency_ms'][pct])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='购买 / 补货吞吐量压测')
+    parser.add_argument('--target', choices=['orm', 'http'], default='orm', help='直接调用服务层或请求 HTTP 接口')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/', help='HTTP 模式的 API 根地址')
+    parser.add_argument('--mode', choices=['thread', 'process'], default='thread', help='并发方式')
+    parser.add_argument('--workers', type=int, default=8, help='并发模拟用户数')
+    parser.add_argument('--duration', type=float, default=10, help='压测时长（秒）')
+    parser.add_argument('--ops', type=int, default=0, help='每个并发单元最多执行的操作数，0 表示不限')
+    parser.add_argument('--users', type=int, default=1000, help='参与压测的用户数上限')
+    parser.add_argument('--machines', type=int, default=1000, help='参与压测的机器数上限')
+    parser.add_argument('--restock-ratio', type=float, default=0.05, help='补货操作占比')
+    parser.add_argument('--restock-quantity', type=int, default=10, help='每次补货数量')
+    parser.add_argument('--max-retries', type=int, default=3, help='ORM 模式死锁重试次数')
+    parser.add_argument('--reset-stock', type=int, help='压测前将所选机器的库存统一设为该值（不超过最大容量）')
+    parser.add_argument('--topup', type=str, help='压测前将所选用户余额统一设为该值')
+    parser.add_argument('--shards', type=int, help='压测前将所选货道设为该分片数（0 取消分片，见 inventory/sharding.py）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 bench_results/benchmark-<commit>-<时间>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='对比两个结果文件后退出')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workload = load_workload(args.users, args.machines)
+    if not workload['users'] or not workload['slots']:
+        print("错误: 没有可用的用户或库存，请先运行 scripts/init_data.py")
+        sys.exit(1)
+
+    machine_ids = {m for m, _, _ in workload['slots']}
+    slot_ids = list(BizInventory.objects.filter(machine_id__in=machine_ids).values_list('pk', flat=True))
+    if args.reset_stock is not None:
+        # 先并回分片库存，设置的值即为总库存（不超过最大容量，否则补货触发器封顶时反而减少库存）；之后按原分片数重新分配
+        with transaction.atomic():
+            collapse(slot_ids)
+            BizInventory.objects.filter(pk__in=slot_ids).update(
+                current_stock=Least(Value(args.reset_stock), F('max_capacity'))
+            )
+        rebalance(slot_ids)
+    if args.shards is not None:
+        shard(slot_ids, args.shards)
+    if args.topup is not None:
+        # 先合并流水再覆盖余额快照，之前的流水不再计入当前余额
+        compact(workload['users'])
+        AppUser.objects.filter(pk__in=workload['users']).update(balance=Decimal(args.topup))
+    initial_stock = total_stocks(machine_ids)
+
+    config = {
+        'target': args.target,
+        'base_url': args.base_url,
+        'mode': args.mode,
+        'workers': args.workers,
+        'duration': args.duration,
+        'ops': args.ops,
+        'restock_ratio': args.restock_ratio,
+        'restock_quantity': args.restock_quantity,
+        'max_retries': args.max_retries,
+        'shards': args.shards,
+        'seed': args.seed,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    print(f"开始压测: {len(workload['users'])} 用户, {len(machine_ids)} 台机器, "
+          f"{len(workload['slots'])} 个货道, {args.workers} 个{args.mode}, {args.duration}s")
+
+    started = time.perf_counter()
+    results = run_workers(config, workload)
+    elapsed = time.perf_counter() - started
+
+    report = summarize(config, results, elapsed, initial_stock)
+    print_report(report)
+
+    output = args.output or os.path.join(
+        BASE_DIR, 'bench_results',
+        f"benchmark-{report['commit']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
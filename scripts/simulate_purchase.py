@@ -12,8 +12,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vending_system.settings')
 django.setup()
 
 from users.models import AppUser
+from users.ledger import current_balance
 from resources.models import BizMachine, BizProduct
 from inventory.models import BizInventory, LogTransaction
+from inventory.services import purchase as purchase_service, PurchaseError
 from monitor.models import LogAlert
 
 
@@ -22,8 +24,7 @@ def purchase(user_username: str, machine_code: str, product_name: str):
     模拟购买操作
     1. 验证用户余额
     2. 验证库存
-    3. 创建交易记录（触发器会自动扣减库存）
-    4. 扣减用户余额
+    3. 扣款并创建交易记录（触发器会自动扣减库存，见 inventory/services.py）
     """
     print(f"\n{'='*50}")
     print(f"购买操作: 用户={user_username}, 机器={machine_code}, 商品={product_name}")
@@ -68,33 +69,29 @@ def purchase(user_username: str, machine_code: str, product_name: str):
         return False
 
     # 检查余额
-    if user.balance < product.sell_price:
-        print(f"错误: 余额不足 (需要 {product.sell_price}, 当前 {user.balance})")
+    balance = current_balance(user.pk)
+    if balance < product.sell_price:
+        print(f"错误: 余额不足 (需要 {product.sell_price}, 当前 {balance})")
         return False
 
     print(f"购买前库存: {inventory.current_stock}")
-    print(f"用户余额: {user.balance}")
+    print(f"用户余额: {balance}")
 
     # 获取当前报警数量
     alert_count_before = LogAlert.objects.count()
 
-    # 创建交易记录（触发器会自动扣减库存）
-    transaction = LogTransaction.objects.create(
-        user=user,
-        machine=machine,
-        product=product,
-        amount=product.sell_price
-    )
+    # 扣款并创建交易记录（触发器会自动扣减库存）
+    try:
+        transaction = purchase_service(user, machine, product, product.sell_price)
+    except PurchaseError as e:
+        print(f"错误: {e}")
+        return False
     print(f"交易创建成功: ID={transaction.id}")
 
-    # 扣减用户余额
-    user.balance -= product.sell_price
-    user.save()
-
     # 刷新库存数据
     inventory.refresh_from_db()
     print(f"购买后库存: {inventory.current_stock}")
-    print(f"用户余额: {user.balance}")
+    print(f"用户余额: {current_balance(user.pk)}")
 
     # 检查是否触发了报警
     alert_count_after = LogAlert.objects.count()
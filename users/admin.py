@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SysAdmin, SysStaff, AppUser
+from .models import SysAdmin, SysStaff, AppUser, AppUserLedger
 
 
 @admin.register(SysAdmin)
@@ -17,5 +17,18 @@ class SysStaffAdmin(admin.ModelAdmin):
 
 @admin.register(AppUser)
 class AppUserAdmin(admin.ModelAdmin):
-    list_display = ['id', 'username', 'balance', 'created_at']
+    list_display = ['id', 'username', 'balance', 'ledger_id', 'created_at']
     search_fields = ['username']
+
+    def get_readonly_fields(self, request, obj=None):
+        # 新建时可设初始余额；之后余额快照由合并任务维护，变动通过流水
+        return ['ledger_id'] if obj is None else ['balance', 'ledger_id']
+
+
+@admin.register(AppUserLedger)
+class AppUserLedgerAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'amount', 'kind', 'transaction_id', 'created_at']
+    search_fields = ['user__username']
+    list_filter = ['kind', 'created_at']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['id', 'user', 'amount', 'kind', 'transaction_id', 'created_at']  # 只追加，不在后台修改
@@ -0,0 +1,225 @@
+"""
+余额流水 (app_user_ledger)
+
+余额变动只追加流水，不改写 app_user 行：
+- 入账（充值、退款、调整）：对用户行加共享锁后插入流水，同一用户的多笔入账互不阻塞
+- 扣款（消费）：对用户行加排他锁，当前余额足够时插入负数流水并立即提交，锁只持有到这一次检查与插入；
+  PostgreSQL 上为 FOR NO KEY UPDATE，不与写入交易时外键检查的 FOR KEY SHARE 冲突
+- 购买（见 inventory/services.py）：reserve() 先提交预扣流水，再在另一个事务中写入交易并 link() 关联交易号，
+  交易失败时 release() 冲正；用户行的锁不再持有到交易提交，入账与进行中的购买互不阻塞。
+  进程在两步之间退出时遗留的预扣由 release_stale() 在 RESERVATION_TIMEOUT 后冲正（compact_balances 命令）。
+  取舍：MySQL 写入交易的外键检查对用户行加共享锁直到交易提交，同一用户的下一次预扣仍需等待该交易提交
+- 合并 compact()：定期把未合并流水累加进 app_user.balance 并推进 ledger_id，控制未合并流水的条数；
+  余额与流水金额同为 DECIMAL(12, 2)，入账不得使当前余额超过 MAX_BALANCE，合并不会溢出
+
+当前余额 = balance + 流水号大于 ledger_id 的流水合计。
+流水插入前都已持有用户行的锁，合并持排他锁读取流水时不会有更小流水号的流水尚未提交，
+因此推进 ledger_id 不会漏掉流水。扣款与当前余额都要读取全部未合并流水，
+compact_balances 应以 --loop 常驻或定时执行（见 README），使每个用户的未合并流水保持在少量条数。
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import AppUser, AppUserLedger
+
+COMPACT_BATCH_SIZE = 500
+CENT = Decimal('0.01')
+# app_user.balance 为 DECIMAL(12, 2) 所能保存的最大值
+MAX_BALANCE = Decimal('9999999999.99')
+# 预扣超过该时长仍未关联交易时视为遗留，由 release_stale() 冲正
+RESERVATION_TIMEOUT = timedelta(minutes=10)
+
+
+class InsufficientBalance(Exception):
+    """余额不足"""
+
+
+class BalanceLimitExceeded(Exception):
+    """入账后当前余额超过 MAX_BALANCE"""
+
+
+class ReservationReleased(Exception):
+    """预扣已被冲正，不能再关联交易"""
+
+
+def _amount_field():
+    return DecimalField(max_digits=12, decimal_places=2)
+
+
+def pending_subquery():
+    """用户未合并流水合计的子查询，用于注解当前余额"""
+    totals = (
+        AppUserLedger.objects.filter(user=OuterRef('pk'), id__gt=OuterRef('ledger_id'))
+        .order_by().values('user').annotate(total=Sum('amount')).values('total')
+    )
+    return Coalesce(Subquery(totals), Value(Decimal('0')), output_field=_amount_field())
+
+
+def with_current_balance(queryset):
+    """为 AppUser 查询集注解 current_balance"""
+    return queryset.annotate(current_balance=F('balance') + pending_subquery())
+
+
+def _lock_users(user_ids, shared=False):
+    """按主键顺序锁定用户行，返回 {user_id: (balance, ledger_id)}"""
+    users = AppUser.objects.filter(pk__in=user_ids).order_by('pk')
+    if not shared:
+        no_key = connection.features.has_select_for_no_key_update
+        return {pk: (balance, ledger_id) for pk, balance, ledger_id in
+                users.select_for_update(no_key=no_key).values_list('pk', 'balance', 'ledger_id')}
+    # Django 没有共享锁接口；SQLite 的写事务本身串行，不需要行锁
+    rows = users.values_list('pk', 'balance', 'ledger_id')
+    if connection.vendor in ('mysql', 'postgresql'):
+        sql, params = rows.query.sql_with_params()
+        suffix = ' LOCK IN SHARE MODE' if connection.vendor == 'mysql' else ' FOR SHARE'
+        with connection.cursor() as cursor:
+            cursor.execute(sql + suffix, params)
+            rows = cursor.fetchall()
+    return {pk: (balance, ledger_id) for pk, balance, ledger_id in rows}
+
+
+def _pending(locked):
+    """{user_id: (未合并流水合计, 最大流水号)}，locked 为 _lock_users 的结果"""
+    pending = defaultdict(lambda: (Decimal('0'), 0))
+    if not locked:
+        return pending
+    floor = min(ledger_id for _, ledger_id in locked.values())
+    # MySQL 可重复读下普通读取可能看到加锁之前的快照，改用锁定读读取最新已提交的流水
+    rows = AppUserLedger.objects.filter(user_id__in=list(locked), id__gt=floor).values_list('user_id', 'id', 'amount')
+    if connection.vendor == 'mysql':
+        sql, params = rows.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' LOCK IN SHARE MODE', params)
+            rows = cursor.fetchall()
+    for user_id, entry_id, amount in rows:
+        if entry_id > locked[user_id][1]:
+            total, last = pending[user_id]
+            pending[user_id] = (total + amount, max(last, entry_id))
+    return pending
+
+
+def current_balance(user_id):
+    """当前余额（不加锁，用于展示）"""
+    user = with_current_balance(AppUser.objects.filter(pk=user_id)).values_list('current_balance', flat=True)
+    return Decimal(user.get()).quantize(CENT)
+
+
+def credit(user_id, amount, kind='topup', transaction_id=None):
+    """入账，返回新流水；入账后当前余额超过 MAX_BALANCE 时抛出 BalanceLimitExceeded"""
+    if amount <= 0:
+        raise ValueError('入账金额必须为正')
+    with transaction.atomic():
+        locked = _lock_users([user_id], shared=True)
+        if not locked:
+            raise AppUser.DoesNotExist(f'AppUser {user_id} not found')
+        balance, _ = locked[user_id]
+        if balance + _pending(locked)[user_id][0] + amount > MAX_BALANCE:
+            raise BalanceLimitExceeded('Balance limit exceeded')
+        return AppUserLedger.objects.create(
+            user_id=user_id, amount=amount, kind=kind, transaction_id=transaction_id,
+        )
+
+
+def debit(user_id, amount, kind='purchase', transaction_id=None):
+    """扣款：当前余额不足时抛出 InsufficientBalance，返回新流水"""
+    with transaction.atomic():
+        locked = _lock_users([user_id])
+        if not locked:
+            raise AppUser.DoesNotExist(f'AppUser {user_id} not found')
+        balance, _ = locked[user_id]
+        if balance + _pending(locked)[user_id][0] < amount:
+            raise InsufficientBalance('Insufficient balance')
+        return AppUserLedger.objects.create(
+            user_id=user_id, amount=-amount, kind=kind, transaction_id=transaction_id,
+        )
+
+
+def reserve(user_id, amount):
+    """预扣：在自己的短事务中扣款，返回交易号为空的消费流水；应在事务外调用，提交后即释放用户行的锁"""
+    return debit(user_id, amount)
+
+
+def link(entry_id, transaction_id):
+    """为预扣关联交易号，须与写入交易在同一事务中；预扣已被冲正时抛出 ReservationReleased"""
+    linked = AppUserLedger.objects.filter(pk=entry_id, transaction_id__isnull=True).update(
+        transaction_id=transaction_id,
+    )
+    if not linked:
+        raise ReservationReleased(f'Ledger entry {entry_id} released')
+
+
+def release(entry_id):
+    """
+    冲正未关联交易的预扣：交易号记为 RELEASED_TRANSACTION_ID 并追加等额冲正流水，返回冲正流水；
+    已关联或已冲正时返回 None。与 link() 都以交易号为空为条件更新同一行，两者只有一个生效
+    """
+    row = AppUserLedger.objects.filter(pk=entry_id).values_list('user_id', 'amount').first()
+    if row is None:
+        return None
+    user_id, amount = row
+    with transaction.atomic():
+        _lock_users([user_id], shared=True)
+        released = AppUserLedger.objects.filter(pk=entry_id, transaction_id__isnull=True).update(
+            transaction_id=AppUserLedger.RELEASED_TRANSACTION_ID,
+        )
+        if not released:
+            return None
+        return AppUserLedger.objects.create(user_id=user_id, amount=-amount, kind='reversal')
+
+
+def release_stale(older_than=RESERVATION_TIMEOUT):
+    """冲正超过 older_than 仍未关联交易的预扣（进程在预扣与写入交易之间退出），返回冲正条数"""
+    stale = AppUserLedger.objects.filter(
+        kind='purchase', transaction_id__isnull=True, created_at__lt=timezone.now() - older_than,
+    ).values_list('pk', flat=True)
+    return sum(release(pk) is not None for pk in list(stale))
+
+
+def adjust_to(user_id, target):
+    """管理端修改余额：把当前余额调整为 target，差额记为调整流水，返回新流水（无差额时为 None）"""
+    with transaction.atomic():
+        locked = _lock_users([user_id])
+        if not locked:
+            raise AppUser.DoesNotExist(f'AppUser {user_id} not found')
+        balance, _ = locked[user_id]
+        delta = target - (balance + _pending(locked)[user_id][0])
+        if not delta:
+            return None
+        return AppUserLedger.objects.create(user_id=user_id, amount=delta, kind='adjust')
+
+
+def lock_balances(user_ids):
+    """批量扣款前锁定用户并返回 {user_id: 当前余额}，须在事务中调用"""
+    locked = _lock_users(user_ids)
+    pending = _pending(locked)
+    return {pk: balance + pending[pk][0] for pk, (balance, _) in locked.items()}
+
+
+def compact(user_ids=None, batch_size=COMPACT_BATCH_SIZE):
+    """把未合并流水累加进余额快照，返回处理的用户数"""
+    candidates = AppUser.objects.filter(ledger_entries__id__gt=F('ledger_id'))
+    if user_ids is not None:
+        candidates = candidates.filter(pk__in=user_ids)
+    ids = sorted(set(candidates.values_list('pk', flat=True)))
+
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        with transaction.atomic():
+            pending = _pending(_lock_users(chunk))
+            if not pending:
+                continue
+            AppUser.objects.filter(pk__in=list(pending)).update(
+                balance=F('balance') + Case(
+                    *[When(pk=pk, then=Value(total)) for pk, (total, _) in pending.items()],
+                    output_field=_amount_field(),
+                ),
+                ledger_id=Case(
+                    *[When(pk=pk, then=Value(last)) for pk, (_, last) in pending.items()],
+                    output_field=BigIntegerField(),
+                ),
+            )
+    return len(ids)
@@ -0,0 +1,34 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from users.ledger import compact, release_stale, COMPACT_BATCH_SIZE
+
+logger = logging.getLogger('vending.ledger')
+
+
+class Command(BaseCommand):
+    help = '冲正遗留的预扣，并把余额流水合并进用户余额快照 (app_user.balance)；以 --loop 常驻或定时执行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE,
+                            help=f'每个事务合并的用户数，默认 {COMPACT_BATCH_SIZE}')
+        parser.add_argument('--loop', action='store_true', help='持续运行，每 --interval 秒合并一次')
+        parser.add_argument('--interval', type=float, default=60.0, help='合并间隔（秒），默认 60')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['interval'] <= 0:
+            raise CommandError('--batch-size 与 --interval 必须大于 0')
+        while True:
+            try:
+                released = release_stale()
+                count = compact(batch_size=options['batch_size'])
+            except Exception:
+                # 常驻时数据库断开等错误只记录日志，下一轮重试
+                if not options['loop']:
+                    raise
+                logger.exception('合并余额流水失败，%s 秒后重试', options['interval'])
+            else:
+                self.stdout.write(self.style.SUCCESS(f'已冲正 {released} 笔遗留预扣，已合并 {count} 个用户的余额流水'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='ledger_id',
+            field=models.BigIntegerField(default=0, verbose_name='已合并流水号'),
+        ),
+        migrations.CreateModel(
+            name='AppUserLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='金额')),
+                ('kind', models.CharField(choices=[('topup', '充值'), ('purchase', '消费'), ('refund', '退款'), ('adjust', '调整')], max_length=20, verbose_name='类型')),
+                ('transaction_id', models.BigIntegerField(blank=True, null=True, verbose_name='交易ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='users.appuser', verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '余额流水',
+                'verbose_name_plural': '余额流水',
+                'db_table': 'app_user_ledger',
+                'indexes': [models.Index(fields=['user', 'id'], name='app_user_ledger_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_balance_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appuser',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='余额'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_balance_precision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appuserledger',
+            name='kind',
+            field=models.CharField(choices=[('topup', '充值'), ('purchase', '消费'), ('refund', '退款'), ('adjust', '调整'), ('reversal', '冲正')], max_length=20, verbose_name='类型'),
+        ),
+        migrations.AddIndex(
+            model_name='appuserledger',
+            index=models.Index(fields=['kind', 'transaction_id', 'created_at'], name='app_user_ledger_hold_idx'),
+        ),
+    ]
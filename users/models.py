@@ -35,9 +35,15 @@ class SysStaff(models.Model):
 
 
 class AppUser(models.Model):
-    """学生用户"""
+    """
+    学生用户
+    余额变动只追加到流水 AppUserLedger；balance 是合并到 ledger_id 号流水为止的余额快照，
+    当前余额 = balance + 之后的流水合计（见 users/ledger.py）
+    """
     username = models.CharField('用户名', max_length=50, unique=True)
-    balance = models.DecimalField('余额', max_digits=10, decimal_places=2, default=0)
+    # 与流水金额精度一致，合并时快照不会溢出；当前余额上限见 ledger.MAX_BALANCE
+    balance = models.DecimalField('余额', max_digits=12, decimal_places=2, default=0)
+    ledger_id = models.BigIntegerField('已合并流水号', default=0)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
 
     class Meta:
@@ -47,3 +53,45 @@ class AppUser(models.Model):
 
     def __str__(self):
         return self.username
+
+
+class AppUserLedger(models.Model):
+    """
+    余额流水 - 只追加不修改金额，金额为正表示入账、为负表示扣款
+    消费流水先作为预扣提交（交易号为空），写入交易后再关联交易号；
+    交易失败时交易号记为 0（RELEASED_TRANSACTION_ID）并追加一条冲正流水退回金额（见 users/ledger.py）
+    """
+    KIND_CHOICES = [
+        ('topup', '充值'),
+        ('purchase', '消费'),
+        ('refund', '退款'),
+        ('adjust', '调整'),
+        ('reversal', '冲正'),
+    ]
+    RELEASED_TRANSACTION_ID = 0
+
+    user = models.ForeignKey(
+        AppUser,
+        on_delete=models.CASCADE,
+        verbose_name='用户',
+        related_name='ledger_entries'
+    )
+    amount = models.DecimalField('金额', max_digits=12, decimal_places=2)
+    kind = models.CharField('类型', max_length=20, choices=KIND_CHOICES)
+    # 交易可能被归档或删除，不建外键
+    transaction_id = models.BigIntegerField('交易ID', null=True, blank=True)
+    created_at = models.DateTimeField('时间', auto_now_add=True)
+
+    class Meta:
+        db_table = 'app_user_ledger'
+        verbose_name = '余额流水'
+        verbose_name_plural = verbose_name
+        indexes = [
+            # 按用户读取未合并流水 (id > ledger_id)
+            models.Index(fields=['user', 'id'], name='app_user_ledger_user_idx'),
+            # 查找遗留的预扣 (kind='purchase' AND transaction_id IS NULL)
+            models.Index(fields=['kind', 'transaction_id', 'created_at'], name='app_user_ledger_hold_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.kind} {self.amount}'
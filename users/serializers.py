@@ -1,17 +1,51 @@
 from rest_framework import serializers
-from .models import SysAdmin, SysStaff, AppUser
+from vending_system.serializers import SparseModelSerializer
+from .models import SysAdmin, SysStaff, AppUser, AppUserLedger
+from . import ledger
 
-class SysAdminSerializer(serializers.ModelSerializer):
+class SysAdminSerializer(SparseModelSerializer):
     class Meta:
         model = SysAdmin
         fields = '__all__'
 
-class SysStaffSerializer(serializers.ModelSerializer):
+class SysStaffSerializer(SparseModelSerializer):
     class Meta:
         model = SysStaff
         fields = '__all__'
 
-class AppUserSerializer(serializers.ModelSerializer):
+class AppUserSerializer(SparseModelSerializer):
+    """balance 输出当前余额（快照 + 未合并流水）；写入 balance 时记一条调整流水"""
+
     class Meta:
         model = AppUser
         fields = '__all__'
+        read_only_fields = ['ledger_id']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        current = getattr(instance, 'current_balance', None)
+        if current is not None and 'balance' in data:
+            data['balance'] = self.fields['balance'].to_representation(current)
+        return data
+
+    def create(self, validated_data):
+        instance = super().create(validated_data)
+        instance.current_balance = instance.balance
+        return instance
+
+    def update(self, instance, validated_data):
+        balance = validated_data.pop('balance', None)
+        # 只写入修改的列，不覆盖合并任务写入的余额快照
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        if balance is not None:
+            ledger.adjust_to(instance.pk, balance)
+        instance.current_balance = ledger.current_balance(instance.pk)
+        return instance
+
+class AppUserLedgerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AppUserLedger
+        fields = ['id', 'amount', 'kind', 'transaction_id', 'created_at']
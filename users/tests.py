@@ -1,3 +1,144 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from events.bus import EventBus
+from events.domain import TransactionCreated
+from inventory.services import purchase
+from vending_system.testing import make_fleet
+from .models import AppUser, AppUserLedger
+from . import ledger
 
-# Create your tests here.
+
+class LedgerTests(TestCase):
+    """余额流水：入账 / 扣款 / 合并后当前余额不变"""
+
+    def setUp(self):
+        self.user = AppUser.objects.create(username='ledger', balance=Decimal('10.00'))
+
+    def test_credit_debit(self):
+        ledger.credit(self.user.pk, Decimal('5.00'))
+        ledger.debit(self.user.pk, Decimal('12.00'))
+        self.assertEqual(ledger.current_balance(self.user.pk), Decimal('3.00'))
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.debit(self.user.pk, Decimal('3.01'))
+        with self.assertRaises(ValueError):
+            ledger.credit(self.user.pk, Decimal('0'))
+        # 用户行未被改写
+        self.assertEqual(AppUser.objects.get(pk=self.user.pk).balance, Decimal('10.00'))
+
+    def test_balance_limit(self):
+        ledger.credit(self.user.pk, ledger.MAX_BALANCE - Decimal('10.00'))
+        with self.assertRaises(ledger.BalanceLimitExceeded):
+            ledger.credit(self.user.pk, Decimal('0.01'))
+        # 快照与流水同精度，合并到上限不溢出
+        ledger.compact()
+        self.assertEqual(AppUser.objects.get(pk=self.user.pk).balance, ledger.MAX_BALANCE)
+
+    def test_compact(self):
+        ledger.credit(self.user.pk, Decimal('5.00'))
+        last = ledger.debit(self.user.pk, Decimal('2.50'))
+        self.assertEqual(ledger.compact(), 1)
+        user = AppUser.objects.get(pk=self.user.pk)
+        self.assertEqual((user.balance, user.ledger_id), (Decimal('12.50'), last.id))
+        self.assertEqual(ledger.current_balance(self.user.pk), Decimal('12.50'))
+        # 没有新流水时不再处理
+        self.assertEqual(ledger.compact(), 0)
+
+    def test_reservation(self):
+        entry = ledger.reserve(self.user.pk, Decimal('4.00'))
+        self.assertIsNone(entry.transaction_id)
+        ledger.link(entry.pk, 7)
+        # 已关联交易的预扣不能冲正
+        self.assertIsNone(ledger.release(entry.pk))
+
+        entry = ledger.reserve(self.user.pk, Decimal('4.00'))
+        self.assertEqual(ledger.current_balance(self.user.pk), Decimal('2.00'))
+        reversal = ledger.release(entry.pk)
+        self.assertEqual((reversal.kind, reversal.amount), ('reversal', Decimal('4.00')))
+        self.assertEqual(ledger.current_balance(self.user.pk), Decimal('6.00'))
+        # 冲正后不能再关联，也不会重复冲正
+        with self.assertRaises(ledger.ReservationReleased):
+            ledger.link(entry.pk, 8)
+        self.assertIsNone(ledger.release(entry.pk))
+
+    def test_release_stale(self):
+        fresh = ledger.reserve(self.user.pk, Decimal('1.00'))
+        stale = ledger.reserve(self.user.pk, Decimal('2.00'))
+        AppUserLedger.objects.filter(pk=stale.pk).update(
+            created_at=stale.created_at - ledger.RESERVATION_TIMEOUT - timedelta(seconds=1),
+        )
+        self.assertEqual(ledger.release_stale(), 1)
+        self.assertIsNone(AppUserLedger.objects.get(pk=fresh.pk).transaction_id)
+        self.assertEqual(ledger.current_balance(self.user.pk), Decimal('9.00'))
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    """购买写入交易期间用户行未被锁定，另一连接上的充值不必等待购买提交"""
+
+    def test_top_up_during_purchase(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite 写事务串行，无法验证行锁')
+        fleet = make_fleet()
+        inside, finish = threading.Event(), threading.Event()
+
+        def hold(events):
+            inside.set()
+            finish.wait(10)
+
+        bus = EventBus()
+        bus.subscribe(TransactionCreated, hold)
+
+        def buy():
+            try:
+                purchase(fleet.user, fleet.machine, fleet.product, fleet.product.sell_price)
+            finally:
+                connections.close_all()
+
+        with patch('inventory.services.bus', bus):
+            buyer = threading.Thread(target=buy)
+            buyer.start()
+            try:
+                self.assertTrue(inside.wait(10))
+                started = time.monotonic()
+                ledger.credit(fleet.user.pk, Decimal('5.00'))
+                elapsed = time.monotonic() - started
+            finally:
+                finish.set()
+                buyer.join()
+        self.assertLess(elapsed, 5)
+        self.assertEqual(ledger.current_balance(fleet.user.pk), Decimal('10003.00'))
+
+
+class AppUserApiTests(TestCase):
+    """用户接口：余额为当前余额，充值与修改余额都记流水"""
+
+    def setUp(self):
+        self.fleet = make_fleet()
+        self.client = APIClient()
+        self.url = f'/api/app-users/{self.fleet.user.id}/'
+
+    def test_top_up(self):
+        response = self.client.post(f'{self.url}top-up/', {'amount': '50.00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['balance'], '10050.00')
+        self.assertEqual(self.client.get(self.url).json()['balance'], '10050.00')
+        self.assertEqual(self.client.get(f'{self.url}ledger/').json()['results'][0]['kind'], 'topup')
+
+        self.assertEqual(self.client.post(f'{self.url}top-up/', {'amount': '-1'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(f'{self.url}top-up/', {'amount': 'x'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/app-users/0/top-up/', {'amount': '1'}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(f'{self.url}top-up/', {'amount': '1e10'}, format='json').status_code, 400)
+
+    def test_update_balance(self):
+        response = self.client.put(self.url, {'username': 'renamed', 'balance': '20.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['balance'], '20.00')
+        entry = AppUserLedger.objects.get()
+        self.assertEqual((entry.kind, entry.amount), ('adjust', Decimal('-9980.00')))
+        user = AppUser.objects.get(pk=self.fleet.user.pk)
+        self.assertEqual((user.username, user.balance), ('renamed', Decimal('10000.00')))
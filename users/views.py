@@ -1,15 +1,54 @@
-from rest_framework import viewsets
+from decimal import Decimal, InvalidOperation
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from vending_system.pagination import LogCursorPagination
 from .models import SysAdmin, SysStaff, AppUser
-from .serializers import SysAdminSerializer, SysStaffSerializer, AppUserSerializer
+from .serializers import SysAdminSerializer, SysStaffSerializer, AppUserSerializer, AppUserLedgerSerializer
+from .ledger import with_current_balance, credit, current_balance, BalanceLimitExceeded
 
 class SysAdminViewSet(viewsets.ModelViewSet):
-    queryset = SysAdmin.objects.all()
+    queryset = SysAdmin.objects.all().order_by('id')
     serializer_class = SysAdminSerializer
 
 class SysStaffViewSet(viewsets.ModelViewSet):
-    queryset = SysStaff.objects.all()
+    queryset = SysStaff.objects.all().order_by('id')
     serializer_class = SysStaffSerializer
 
 class AppUserViewSet(viewsets.ModelViewSet):
-    queryset = AppUser.objects.all()
+    queryset = with_current_balance(AppUser.objects.all()).order_by('id')
     serializer_class = AppUserSerializer
+
+    @action(detail=True, methods=['post'], url_path='top-up')
+    def top_up(self, request, pk=None):
+        """
+        充值 API（追加充值流水，不改写用户行，见 users/ledger.py）
+        POST /api/app-users/{id}/top-up/  {"amount": "50.00"}
+        """
+        try:
+            amount = Decimal(str(request.data.get('amount')))
+        except (InvalidOperation, ValueError):
+            return Response({"error": "amount 必须为数字"}, status=status.HTTP_400_BAD_REQUEST)
+        if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+            return Response({"error": "amount 必须为正数且最多两位小数"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            entry = credit(int(pk), amount)
+        except BalanceLimitExceeded:
+            return Response({"error": "充值后余额超出上限"}, status=status.HTTP_400_BAD_REQUEST)
+        except (AppUser.DoesNotExist, ValueError):
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'entry': AppUserLedgerSerializer(entry).data,
+            'balance': str(current_balance(entry.user_id)),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def ledger(self, request, pk=None):
+        """
+        余额流水 API（游标分页，按时间倒序）
+        GET /api/app-users/{id}/ledger/
+        """
+        user = self.get_object()
+        paginator = LogCursorPagination()
+        page = paginator.paginate_queryset(user.ledger_entries.all(), request, view=self)
+        return paginator.get_paginated_response(AppUserLedgerSerializer(page, many=True).data)
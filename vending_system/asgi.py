@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+机器端异步接口 (inventory/async_views.py) 需以 ASGI 方式部署才能发挥作用，例如:
+    uvicorn vending_system.asgi:application --workers 4
 """
 
 import os
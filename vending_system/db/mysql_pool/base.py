@@ -0,0 +1,37 @@
+"""
+带进程内连接池的 MySQL 后端
+
+ENGINE 设为 'vending_system.db.mysql_pool'，池参数写在 DATABASES[alias]['POOL']（见 vending_system/db/pool.py）。
+Django 关闭连接时归还到池中而不是断开；事务中途关闭的连接状态不确定，直接丢弃。
+需配合 CONN_MAX_AGE = 0 使用，使每个请求结束时归还连接。
+"""
+from django.db.backends.mysql import base as mysql_base
+from vending_system.db.pool import get_pool, PoolTimeout
+
+Database = mysql_base.Database
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL'))
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        try:
+            return self.pool.acquire(lambda: connect(conn_params))
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reusable = not self.in_atomic_block
+        if reusable:
+            try:
+                # 归还前结束可能残留的事务，下一个使用者拿到的是干净的连接
+                self.connection.rollback()
+            except Database.Error:
+                reusable = False
+        self.pool.release(self.connection, reusable)
@@ -0,0 +1,31 @@
+"""
+迁移操作
+
+触发器、存储过程等 DDL 依赖数据库方言，VendorRunSQL 只在指定后端（connection.vendor）上执行，
+其他后端跳过；同一迁移中可为 mysql / sqlite / postgresql 各写一份。
+"""
+from django.db import migrations
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """只在 vendor 后端上执行的 RunSQL"""
+
+    def __init__(self, vendor, sql, reverse_sql=None, **kwargs):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        kwargs['vendor'] = self.vendor
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f'Raw SQL operation ({self.vendor})'
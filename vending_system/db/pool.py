@@ -0,0 +1,150 @@
+"""
+进程内数据库连接池（与具体数据库驱动无关）
+
+- SIZE: 常驻的空闲连接上限；MAX_OVERFLOW: 高峰时可额外打开的连接数，归还时直接关闭
+- TIMEOUT: 连接数已满时等待归还的最长秒数，超时抛出 PoolTimeout
+- RECYCLE: 连接存活超过该秒数后不再复用，避免被服务端 wait_timeout 断开
+- PING_AFTER: 空闲超过该秒数的连接复用前先 ping 检查
+统计信息由 pool_stats() 汇总，供监控接口读取。
+"""
+import threading
+import time
+from collections import deque
+
+DEFAULT_POOL = {
+    'SIZE': 10,
+    'MAX_OVERFLOW': 10,
+    'TIMEOUT': 5,
+    'RECYCLE': 3600,
+    'PING_AFTER': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    def __init__(self, size, max_overflow, timeout, recycle, ping_after):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = deque()  # (连接, 创建时间, 归还时间)
+        self._born = {}       # id(连接) -> 创建时间
+        self._open = 0
+        self._cond = threading.Condition()
+        self.counters = {'created': 0, 'reused': 0, 'discarded': 0, 'waits': 0, 'timeouts': 0}
+
+    def acquire(self, connect):
+        """取出一条可用连接；没有空闲连接且未达上限时调用 connect() 新建"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._idle:
+                    entry = self._idle.pop()  # 后进先出，优先复用最近用过的连接
+                elif self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    entry = None
+                else:
+                    self.counters['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(f'等待数据库连接超过 {self.timeout} 秒')
+                    continue
+
+            if entry is None:
+                try:
+                    conn = connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._born[id(conn)] = time.monotonic()
+                    self.counters['created'] += 1
+                return conn
+
+            conn, born, released = entry
+            if self._healthy(conn, born, released):
+                with self._cond:
+                    self._born[id(conn)] = born
+                    self.counters['reused'] += 1
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, reusable=True):
+        """归还连接；不可复用、超出常驻数量或已过期的连接直接关闭"""
+        with self._cond:
+            born = self._born.pop(id(conn), None)
+            keep = (
+                reusable and born is not None
+                and self._open <= self.size
+                and time.monotonic() - born < self.recycle
+            )
+            if keep:
+                self._idle.append((conn, born, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def _healthy(self, conn, born, released):
+        now = time.monotonic()
+        if now - born >= self.recycle:
+            return False
+        if now - released >= self.ping_after:
+            try:
+                conn.ping()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self.counters['discarded'] += 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                **self.counters,
+            }
+
+
+def get_pool(alias, config=None):
+    """按数据库别名取得（首次调用时创建）进程内连接池"""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = {**DEFAULT_POOL, **(config or {})}
+            pool = _pools[alias] = ConnectionPool(
+                size=options['SIZE'],
+                max_overflow=options['MAX_OVERFLOW'],
+                timeout=options['TIMEOUT'],
+                recycle=options['RECYCLE'],
+                ping_after=options['PING_AFTER'],
+            )
+        return pool
+
+
+def pool_stats():
+    """{数据库别名: 统计信息}，未启用连接池时为空"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
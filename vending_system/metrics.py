@@ -0,0 +1,233 @@
+"""
+请求级性能指标
+
+MetricsMiddleware 记录每个请求的总耗时、SQL 条数、数据库耗时与响应渲染（序列化为 JSON）耗时，
+按视图名聚合为进程内直方图，由 GET /metrics 以 Prometheus 文本格式输出。
+请求耗时超过 METRICS_SLOW_REQUEST_MS 且 METRICS_LOG_SLOW_SQL 开启时，把该请求执行的 SQL 写入日志。
+
+- 指标只统计当前进程，多进程部署时由 Prometheus 分别抓取各进程
+- SQL 统计通过 connection.execute_wrapper 实现。WSGI 下包住整个请求；
+  ASGI 下中间件链异步执行，同步视图、渲染与异步 ORM 都在本请求专用的同步线程中执行
+  （thread_sensitive 的 sync_to_async），由 process_view 在该线程的连接上安装、请求结束时卸载，
+  视图之前其他中间件的查询（如会话读取）不计入
+- 流式响应（导出、SSE）只统计到响应开始返回为止
+"""
+import logging
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from vending_system.db.pool import pool_stats
+
+logger = logging.getLogger('vending.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# 慢请求日志中最多记录的 SQL 条数
+SLOW_SQL_LIMIT = 100
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    """进程内指标：{指标名: {标签元组: Histogram | 计数}}"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def observe(self, name, labels, value, buckets, help_text):
+        with self._lock:
+            self._help[name] = ('histogram', help_text)
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, help_text):
+        with self._lock:
+            self._help[name] = ('counter', help_text)
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = self._help[name]
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{name}{_labels(labels)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                kind, help_text = self._help[name]
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.total}')
+                    lines.append(f'{name}_sum{_labels(labels)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.total}')
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """execute_wrapper：累计 SQL 条数与耗时，需要时保留 SQL 文本"""
+
+    def __init__(self, capture_sql):
+        self.count = 0
+        self.duration = 0.0
+        self.capture_sql = capture_sql
+        self.statements = []
+        # ASGI 下安装了本统计的连接（见 MetricsMiddleware.process_view）
+        self.installed = []
+
+    def uninstall(self):
+        for connection in self.installed:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if self.capture_sql and len(self.statements) < SLOW_SQL_LIMIT:
+                self.statements.append((elapsed, sql))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        recorder = QueryRecorder(capture_sql=settings.METRICS_LOG_SLOW_SQL)
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = request._metrics_recorder = QueryRecorder(capture_sql=settings.METRICS_LOG_SLOW_SQL)
+        try:
+            response = await self.get_response(request)
+        finally:
+            # 视图已执行完毕，直接从安装时记下的连接上卸载
+            recorder.uninstall()
+        self._record(request, response, time.perf_counter() - start, recorder if recorder.installed else None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """ASGI 下 Django 在本请求的同步线程中调用本方法（同步方法经 sync_to_async 适配），在此安装 SQL 统计"""
+        recorder = getattr(request, '_metrics_recorder', None)
+        if recorder is not None and not recorder.installed:
+            for alias in connections:
+                connection = connections[alias]
+                connection.execute_wrappers.append(recorder)
+                recorder.installed.append(connection)
+        return None
+
+    def process_template_response(self, request, response):
+        """DRF Response 在此之后渲染，用渲染回调计时"""
+        render_start = time.perf_counter()
+
+        def finished(rendered):
+            request._metrics_render_time = time.perf_counter() - render_start
+
+        response.add_post_render_callback(finished)
+        return response
+
+    def _record(self, request, response, elapsed, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        labels = (('view', view), ('method', request.method))
+
+        registry.inc('vending_http_requests_total', labels + (('status', response.status_code),),
+                     '请求数')
+        registry.observe('vending_http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS,
+                         '请求总耗时（秒）')
+        render_time = getattr(request, '_metrics_render_time', None)
+        if render_time is not None:
+            registry.observe('vending_http_render_duration_seconds', labels, render_time, LATENCY_BUCKETS,
+                             '响应渲染耗时（秒）')
+        if recorder is not None:
+            registry.observe('vending_db_queries_per_request', labels, recorder.count, QUERY_COUNT_BUCKETS,
+                             '单个请求的 SQL 条数')
+            registry.observe('vending_db_duration_seconds', labels, recorder.duration, LATENCY_BUCKETS,
+                             '单个请求的数据库耗时（秒）')
+
+        if recorder is not None and recorder.capture_sql and elapsed * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+            logger.warning(
+                '慢请求 %s %s (%s) 耗时 %.0fms，SQL %d 条 / %.0fms\n%s',
+                request.method, request.get_full_path(), view, elapsed * 1000,
+                recorder.count, recorder.duration * 1000,
+                '\n'.join(f'  [{t * 1000:.1f}ms] {sql}' for t, sql in recorder.statements),
+            )
+
+
+@require_GET
+def metrics_view(request):
+    """GET /metrics - Prometheus 文本格式"""
+    lines = registry.render()
+    for alias, stats in pool_stats().items():
+        for key, value in stats.items():
+            name = f'vending_db_pool_{key}'
+            lines.append(f'{name}{_labels((("alias", alias),))} {value}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
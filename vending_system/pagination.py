@@ -0,0 +1,99 @@
+"""
+分页配置
+
+- 参考数据表（机器、商品、用户等）数据量小，使用页码分页
+- 日志表（交易、补货、报警）数据量持续增长，使用基于 (created_at, id) 的游标分页，
+  翻页代价与页码无关，避免 OFFSET 深翻页扫描
+"""
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """页码分页: ?page=2&page_size=50"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def _reverse(ordering):
+    return tuple(order[1:] if order.startswith('-') else '-' + order for order in ordering)
+
+
+class LogCursorPagination(CursorPagination):
+    """
+    游标分页: 按时间倒序，?cursor=<由 next/previous 链接给出>
+
+    游标记录翻页处一行的全部排序字段 (created_at, id)，下一页按元组比较取严格在其之后的行。
+    DRF 默认只按第一个排序字段定位、同一时刻的多行靠 OFFSET 区分，翻页期间插入新行会使后续页重复或遗漏
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-created_at', '-id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip('-')
+            values.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(values)
+
+    def _after(self, model, ordering, position):
+        """按 ordering 排序时严格位于 position 之后的行：(a, b) < (x, y) 展开为 a < x OR (a = x AND b < y)"""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            values = [model._meta.get_field(o.lstrip('-')).to_python(v) for o, v in zip(ordering, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = None
+        for order, value in reversed(list(zip(ordering, values))):
+            name = order.lstrip('-')
+            strict = Q(**{f"{name}__{'lt' if order.startswith('-') else 'gt'}": value})
+            condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # 与 CursorPagination.paginate_queryset 相同，只是定位条件覆盖全部排序字段；位置唯一，offset 恒为 0
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, current_position))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+
+class SparseFieldsMixin:
+    """
+    稀疏字段集：GET 请求可通过 ?fields=id,amount,created_at 只返回指定字段，
+    列表页只为实际展示的列付出序列化开销
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields = request.query_params.get('fields')
+        if not fields:
+            return
+        allowed = {name.strip() for name in fields.split(',') if name.strip()}
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+
+
+class SparseModelSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """支持 ?fields= 的 ModelSerializer"""
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,9 +45,11 @@ INSTALLED_APPS = [
     'resources',
     'inventory',
     'monitor',
+    'events',
 ]
 
 MIDDLEWARE = [
+    'vending_system.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -97,6 +100,28 @@ DATABASES = {
     }
 }
 
+# 数据库连接复用，按部署环境通过环境变量 VENDING_DB_CONNECTION 选择:
+#   none       - 每个请求新建连接并在结束时断开
+#   persistent - 线程内持久连接，最长保留 CONN_MAX_AGE 秒，复用前做健康检查（默认，适合 WSGI 多线程/多进程）
+#   pool       - 进程内连接池（vending_system/db/mysql_pool），适合 ASGI：
+#                异步视图的数据库调用在按请求创建的线程中执行，线程级持久连接无法跨请求复用
+# 连接池状态见 GET /api/health/db-pool/
+DB_CONNECTION_MODE = os.environ.get('VENDING_DB_CONNECTION', 'persistent')
+
+if DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('VENDING_DB_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['ENGINE'] = 'vending_system.db.mysql_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # 请求结束即归还到池
+    DATABASES['default']['POOL'] = {
+        'SIZE': int(os.environ.get('VENDING_DB_POOL_SIZE', 10)),
+        'MAX_OVERFLOW': int(os.environ.get('VENDING_DB_POOL_OVERFLOW', 10)),
+        'TIMEOUT': 5,
+        'RECYCLE': 3600,
+        'PING_AFTER': 30,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,3 +163,59 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Django REST Framework
+# 默认页码分页；日志类视图集单独使用游标分页（见 vending_system/pagination.py）
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'vending_system.pagination.StandardPagination',
+    'PAGE_SIZE': 100,
+}
+
+
+# Cache
+# 参考数据（机器、商品、供应商）读穿透缓存，见 resources/cache.py
+# 默认进程内缓存；多进程部署请换成共享后端，例如
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vending-reference',
+    }
+}
+
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = 300  # 秒
+
+
+# Machine API
+# 机器端异步接口（inventory/async_views.py）同时访问数据库的请求上限，
+# 应不超过数据库为本进程预留的连接数
+
+MACHINE_API_DB_CONCURRENCY = 20
+
+
+# Metrics
+# 请求耗时 / SQL 条数 / 数据库耗时 / 渲染耗时直方图，GET /metrics 输出（vending_system/metrics.py）
+# METRICS_LOG_SLOW_SQL 开启后，耗时超过 METRICS_SLOW_REQUEST_MS 的请求把执行的 SQL 写入 vending.metrics 日志
+
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('VENDING_SLOW_REQUEST_MS', 500))
+METRICS_LOG_SLOW_SQL = os.environ.get('VENDING_LOG_SLOW_SQL', '0') == '1'
+
+
+# Domain events
+# 库存副作用（交易扣库存、补货加库存、缺货/售罄/故障预警）的执行方式：
+#   trigger - 数据库触发器（默认）
+#   events  - 应用层领域事件（events/），本进程的连接跳过上述触发器，由事件处理器执行
+# 交易 / 补货的日汇总两种方式下均由事件处理器维护。
+# EVENT_DISPATCH 为发件箱的投递方式：on_commit 在事务提交后立即投递；
+# relay 只写入发件箱，由 python manage.py dispatch_events --loop 批量投递
+
+INVENTORY_SIDE_EFFECTS = os.environ.get('VENDING_SIDE_EFFECTS', 'trigger')
+EVENT_DISPATCH = os.environ.get('VENDING_EVENT_DISPATCH', 'on_commit')
+
+# 同一 (机器, 商品, 类型) 的报警距上次发生不超过该分钟数时合并为一条；
+# 触发器经连接上的会话变量读取（见 monitor/handlers.py），其他客户端的连接按 30 分钟
+ALERT_COALESCE_MINUTES = int(os.environ.get('VENDING_ALERT_COALESCE_MINUTES', '30'))
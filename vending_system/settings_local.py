@@ -0,0 +1,33 @@
+"""
+本地 / 压测用配置：SQLite 数据库，无需 MySQL
+
+    DJANGO_SETTINGS_MODULE=vending_system.settings_local python manage.py migrate
+    DJANGO_SETTINGS_MODULE=vending_system.settings_local python scripts/benchmark_purchase.py
+
+VENDING_SQLITE_NAME 指定数据库文件（默认项目目录下的 local.sqlite3）；
+设为 :memory: 时使用进程内共享的内存数据库（同一进程内各线程可见，进程退出即丢失，
+需在同一进程中先 migrate，适合测试）。
+触发器的 SQLite 版本见 inventory/migrations/0011_portable_triggers.py。
+"""
+import os
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+_name = os.environ.get('VENDING_SQLITE_NAME', str(BASE_DIR / 'local.sqlite3'))
+if _name == ':memory:':
+    _name = 'file:vending_local?mode=memory&cache=shared'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _name,
+        'OPTIONS': {
+            # 写事务开始即取得写锁，避免并发时读锁升级失败；WAL 下读写互不阻塞
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+    }
+}
+
+DB_CONNECTION_MODE = 'persistent'
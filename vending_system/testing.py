@@ -0,0 +1,163 @@
+"""
+测试工具 - 各应用 tests.py 共用的数据构造、查询预算与执行计划断言
+"""
+import re
+import unittest
+from decimal import Decimal
+from types import SimpleNamespace
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+
+def make_fleet():
+    """构造一套最小的 用户 / 运维 / 供应商 / 机器 / 商品 / 库存 数据"""
+    from users.models import AppUser, SysStaff
+    from resources.models import BizSupplier, BizMachine, BizProduct
+    from inventory.models import BizInventory
+
+    supplier = BizSupplier.objects.create(name='测试供应商', contact='010-00000000')
+    machine = BizMachine.objects.create(machine_code='VM-T001', location='测试楼', region_code='A')
+    product = BizProduct.objects.create(
+        name='测试商品', cost_price=Decimal('1.00'), sell_price=Decimal('2.00'), supplier=supplier
+    )
+    user = AppUser.objects.create(username='tester', balance=Decimal('10000.00'))
+    staff = SysStaff.objects.create(staff_id='T001', name='测试运维', phone='13800000000', region_code='A')
+    inventory = BizInventory.objects.create(
+        machine=machine, product=product, current_stock=10000, max_capacity=100000
+    )
+    return SimpleNamespace(
+        supplier=supplier, machine=machine, product=product,
+        user=user, staff=staff, inventory=inventory,
+    )
+
+
+class QueryBudgetMixin:
+    """断言列表接口的查询次数有上界，且不随行数增长（N+1 回归检测）"""
+
+    def assertQueryBudget(self, url, add_rows, max_queries):
+        """
+        先请求一次 url，调用 add_rows() 追加数据后再请求一次，
+        要求两次查询数相同且都不超过 max_queries
+        """
+        client = APIClient()
+        with CaptureQueriesContext(connection) as before:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        add_rows()
+        with CaptureQueriesContext(connection) as after:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        sql = '\n'.join(q['sql'] for q in after.captured_queries)
+        self.assertEqual(len(before), len(after), f'{url} 查询数随行数增长:\n{sql}')
+        self.assertLessEqual(len(after), max_queries, f'{url} 查询数超出预算:\n{sql}')
+
+
+def full_scans(sql, tables):
+    """EXPLAIN 一条 SELECT，返回其中被全表扫描的表名（仅支持 MySQL / SQLite）"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            # 小表上优化器可能仍选择全表扫描，这里只要求存在可用索引（条件可走索引）
+            return [row['table'] for row in rows
+                    if row['table'] in tables and row['type'] == 'ALL' and not row['possible_keys']]
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            # SCAN（含 USING INDEX 的整索引扫描）都视为全表扫描，范围查询应为 SEARCH
+            scans = []
+            for row in cursor.fetchall():
+                match = re.match(r'SCAN (\w+)', row[3])
+                if match and match.group(1) in tables:
+                    scans.append(match.group(1))
+            return scans
+    raise unittest.SkipTest(f'不支持 {connection.vendor} 的执行计划检查')
+
+
+def used_indexes(sql, table):
+    """EXPLAIN 一条 SELECT，返回 table 上的可用索引名（MySQL: key 与 possible_keys；SQLite: 实际使用的索引）"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [col[0] for col in cursor.description]
+            indexes = set()
+            for row in (dict(zip(columns, row)) for row in cursor.fetchall()):
+                if row['table'] == table:
+                    indexes.update(filter(None, (row['possible_keys'] or '').split(',') + [row['key']]))
+            return indexes
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return {
+                match.group(1) for match in (
+                    re.match(rf'(?:SCAN|SEARCH) {table} USING (?:COVERING )?INDEX (\w+)', row[3])
+                    for row in cursor.fetchall()
+                ) if match
+            }
+    raise unittest.SkipTest(f'不支持 {connection.vendor} 的执行计划检查')
+
+
+class ExplainMixin:
+    """对接口实际执行的 SELECT 做 EXPLAIN，断言日志/汇总表的时间范围查询不退化为全表扫描"""
+
+    def assertNoFullScan(self, url, tables, method='get', data=None):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or not any(t in sql for t in tables):
+                continue
+            checked += 1
+            self.assertEqual(full_scans(sql, tables), [], f'{url} 存在全表扫描:\n{sql}')
+        self.assertGreater(checked, 0, f'{url} 未查询 {tables}')
+
+    def assertUsesIndex(self, queries, table, index):
+        """queries（captured_queries）中每条查询 table 的 SELECT 都可走 index"""
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or f'FROM "{table}"' not in sql.replace('`', '"'):
+                continue
+            checked += 1
+            self.assertIn(index, used_indexes(sql, table), f'未使用索引 {index}:\n{sql}')
+        self.assertGreater(checked, 0, f'未查询 {table}')
+
+
+def has_trigger(name):
+    """数据库中是否已安装该触发器（测试库未执行迁移时没有触发器）"""
+    sql = {
+        'mysql': "SELECT 1 FROM information_schema.triggers WHERE trigger_schema = DATABASE() AND trigger_name = %s",
+        'sqlite': "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s",
+        'postgresql': "SELECT 1 FROM pg_trigger WHERE tgname = %s",
+    }.get(connection.vendor)
+    if sql is None:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [name])
+        return cursor.fetchone() is not None
+
+
+class EventSideEffectsMixin:
+    """以事件模式 (INVENTORY_SIDE_EFFECTS=events) 运行：测试连接跳过库存触发器，结束后恢复"""
+
+    def setUp(self):
+        from inventory.services import SKIP_FLAG_SQL, skip_triggers_in_events_mode
+        settings_override = override_settings(INVENTORY_SIDE_EFFECTS='events')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # 测试连接在切换模式前已建立，手动设置跳过标志
+        skip_triggers_in_events_mode(None, connection)
+        if connection.vendor == 'sqlite':
+            self.addCleanup(setattr, connection, 'skip_inventory_trigger', False)
+        elif connection.vendor in SKIP_FLAG_SQL:
+            def restore():
+                with connection.cursor() as cursor:
+                    cursor.execute(SKIP_FLAG_SQL[connection.vendor][1])
+            self.addCleanup(restore)
+        super().setUp()
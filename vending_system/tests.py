@@ -0,0 +1,104 @@
+import threading
+from django.test import SimpleTestCase, TestCase, override_settings
+from resources.models import BizMachine
+from vending_system.db.pool import ConnectionPool, PoolTimeout
+from vending_system.metrics import registry
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def ping(self):
+        if not self.alive:
+            raise ConnectionError('gone')
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """连接池：复用、溢出、超时与健康检查"""
+
+    def make_pool(self, **kwargs):
+        options = dict(size=1, max_overflow=1, timeout=0.05, recycle=3600, ping_after=30)
+        options.update(kwargs)
+        return ConnectionPool(**options)
+
+    def test_reuse(self):
+        pool = self.make_pool()
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertIs(pool.acquire(FakeConnection), conn)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_overflow_closed_on_release(self):
+        pool = self.make_pool()
+        first, second = pool.acquire(FakeConnection), pool.acquire(FakeConnection)
+        pool.release(first)
+        pool.release(second)
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(pool.stats()['open'], 1)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_timeout_and_wakeup(self):
+        pool = self.make_pool(max_overflow=0)
+        conn = pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, [conn]).start()
+        self.assertIs(pool.acquire(FakeConnection), conn)
+
+    def test_unhealthy_connection_replaced(self):
+        pool = self.make_pool(ping_after=0)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        conn.alive = False
+        fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+
+    def test_not_reusable_discarded(self):
+        pool = self.make_pool()
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn, reusable=False)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+
+class MetricsTests(TestCase):
+    """请求指标中间件与 /metrics"""
+
+    def setUp(self):
+        registry.reset()
+        BizMachine.objects.create(machine_code='VM001', location='图书馆', region_code='A')
+
+    def test_histograms_exposed(self):
+        self.assertEqual(self.client.get('/api/machines/').status_code, 200)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('vending_http_requests_total{view="bizmachine-list",method="GET",status="200"} 1', body)
+        self.assertIn('vending_http_request_duration_seconds_count{view="bizmachine-list",method="GET"} 1', body)
+        self.assertIn('vending_http_render_duration_seconds_count{view="bizmachine-list",method="GET"} 1', body)
+        # 列表查询 + 计数查询
+        self.assertIn('vending_db_queries_per_request_bucket{view="bizmachine-list",method="GET",le="1"} 0', body)
+        self.assertIn('vending_db_queries_per_request_bucket{view="bizmachine-list",method="GET",le="2"} 1', body)
+
+    async def test_asgi_records_queries(self):
+        # ASGI 下中间件链异步执行，同步视图的查询同样计入
+        response = await self.async_client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        body = (await self.async_client.get('/metrics')).content.decode()
+        self.assertIn('vending_db_queries_per_request_count{view="bizproduct-list",method="GET"} 1', body)
+        self.assertIn('vending_db_queries_per_request_bucket{view="bizproduct-list",method="GET",le="0"} 0', body)
+        self.assertIn('vending_db_duration_seconds_count{view="bizproduct-list",method="GET"} 1', body)
+
+    @override_settings(METRICS_LOG_SLOW_SQL=True, METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_request_sql_logged(self):
+        with self.assertLogs('vending.metrics', 'WARNING') as logs:
+            self.client.get('/api/machines/')
+        self.assertIn('biz_machine', logs.output[0])
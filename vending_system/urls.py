@@ -20,7 +20,11 @@ from rest_framework.routers import DefaultRouter
 from users.views import SysAdminViewSet, SysStaffViewSet, AppUserViewSet
 from resources.views import BizSupplierViewSet, BizMachineViewSet, BizProductViewSet
 from inventory.views import BizInventoryViewSet, LogTransactionViewSet, LogRestockViewSet
+from inventory.async_views import machine_purchase, machine_inventory, machine_heartbeat
 from monitor.views import LogAlertViewSet, StatDailyViewSet
+from monitor.stream import alert_stream
+from vending_system.views import db_pool_status
+from vending_system.metrics import metrics_view
 
 router = DefaultRouter()
 # Users
@@ -41,6 +45,14 @@ router.register(r'stat-daily', StatDailyViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # 须在路由器之前，否则 stream 会被当作报警主键
+    path('api/alerts/stream/', alert_stream),
     path('api/', include(router.urls)),
+    # 机器端异步接口（ASGI 部署）
+    path('api/machine-api/<int:machine_id>/purchase/', machine_purchase),
+    path('api/machine-api/<int:machine_id>/inventory/', machine_inventory),
+    path('api/machine-api/<int:machine_id>/heartbeat/', machine_heartbeat),
+    path('api/health/db-pool/', db_pool_status),
+    path('metrics', metrics_view),
 ]
 
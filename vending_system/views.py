@@ -0,0 +1,19 @@
+"""
+项目级运维接口
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from vending_system.db.pool import pool_stats
+
+
+@require_GET
+def db_pool_status(request):
+    """
+    数据库连接池状态（仅统计当前进程）
+    GET /api/health/db-pool/
+    """
+    return JsonResponse({
+        'mode': settings.DB_CONNECTION_MODE,
+        'pools': pool_stats(),
+    })